@@ -14,7 +14,9 @@
 """Batch table row insert/delete support.
 """
 
+from cStringIO import StringIO
 import re
+import struct
 
 
 class RowBatcher(object):
@@ -114,12 +116,163 @@ class RowBatcher(object):
                     self.cursor.execute(stmt, tuple(row))
 
 
+# The header and trailer of the PostgreSQL binary COPY format.
+postgresql_copy_header = 'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+postgresql_copy_trailer = struct.pack('!h', -1)
+
+
 class PostgreSQLRowBatcher(RowBatcher):
+    """PostgreSQL-specific row batcher.
+
+    On PostgreSQL 9.4 and later, single-column deletes and the
+    inserts made by copy_into() send whole columns as array parameters,
+    so the statement text does not depend on the number of rows.
+    copy_into() switches to COPY once a transaction stages many rows.
+    """
+
+    # copy_threshold: the number of rows added with copy_into() after
+    # which rows are sent with COPY rather than DELETE and INSERT.
+    copy_threshold = 1000
+
+    # copy_size_limit: the number of bytes to buffer for COPY
+    # before sending them.
+    copy_size_limit = 16<<20
 
     def __init__(self, cursor, version_detector, row_limit=None):
         super(PostgreSQLRowBatcher, self).__init__(cursor, row_limit)
-        self.support_batch_insert = (
-            version_detector.get_version(cursor) >= (8, 2))
+        version = version_detector.get_version(cursor)
+        self.support_batch_insert = version >= (8, 2)
+        # unnest() with several arguments requires PostgreSQL 9.4.
+        self.support_array_ops = version >= (9, 4)
+        self.array_ops = {}  # {operation: {rowkey: row}}
+        self.copy_rows_seen = 0
+        self.copy_size_added = 0
+        self.copies = {}  # {(table, columns, types): {key: row}}
+
+    def add_array_op(self, operation, row, rowkey, size):
+        """Add a row to an operation that accepts one array per column.
+
+        operation contains a %s parameter for each column.
+        """
+        rows = self.array_ops.get(operation)
+        if rows is None:
+            self.array_ops[operation] = rows = {}
+        rows[rowkey] = row  # note that this may replace a row
+        self.rows_added += 1
+        self.size_added += size
+        if (self.rows_added >= self.row_limit
+            or self.size_added >= self.size_limit):
+            self.flush()
+
+    def copy_into(self, table, columns, types, row, size, insert_row=None):
+        """Add a row that replaces earlier rows with the same key.
+
+        The first column is the key.  types lists the SQL type of
+        each column; only the bigint type is sent as an integer by
+        COPY.  The rows of small transactions are sent with DELETE
+        and INSERT, using insert_row (or row) as the INSERT
+        parameters.  Once copy_threshold rows have been added, rows
+        are sent with binary COPY.
+        """
+        key = row[0]
+        self.copy_rows_seen += 1
+        if self.copy_rows_seen <= self.copy_threshold:
+            if insert_row is None:
+                insert_row = row
+            self.delete_from(table, **{columns[0]: key})
+            if self.support_array_ops:
+                operation = "INSERT INTO %s (%s) SELECT * FROM unnest(%s)" % (
+                    table, ', '.join(columns),
+                    ', '.join('%%s::%s[]' % t for t in types))
+                self.add_array_op(operation, insert_row, rowkey=key, size=size)
+            else:
+                self.insert_into(
+                    "%s (%s)" % (table, ', '.join(columns)),
+                    ', '.join(['%s'] * len(columns)),
+                    insert_row,
+                    rowkey=key,
+                    size=size,
+                )
+            return
+
+        k = (table, columns, types)
+        rows = self.copies.get(k)
+        if rows is None:
+            self.copies[k] = rows = {}
+        rows[key] = row  # note that this may replace a row
+        self.copy_size_added += size
+        if self.copy_size_added >= self.copy_size_limit:
+            self.flush()
+
+    def flush(self):
+        super(PostgreSQLRowBatcher, self).flush()
+        if self.array_ops:
+            self._do_array_ops()
+            self.array_ops.clear()
+        if self.copies:
+            self._do_copies()
+            self.copies.clear()
+        self.copy_size_added = 0
+
+    def _do_deletes(self):
+        if not self.support_array_ops:
+            super(PostgreSQLRowBatcher, self)._do_deletes()
+            return
+        for (table, columns), rows in sorted(self.deletes.items()):
+            if len(columns) == 1:
+                # All single-column deletes in RelStorage are
+                # by integer ID.
+                values = [long(v) for (v,) in rows]
+                values.sort()
+                stmt = "DELETE FROM %s WHERE %s = ANY(%%s)" % (
+                    table, columns[0])
+                self.cursor.execute(stmt, (values,))
+            else:
+                lines = []
+                for row in sorted(rows):
+                    line = []
+                    for i, column in enumerate(columns):
+                        line.append("%s = %s" % (column, row[i]))
+                    lines.append(" AND ".join(line))
+                stmt = "DELETE FROM %s WHERE %s" % (
+                    table, " OR ".join(lines))
+                self.cursor.execute(stmt)
+
+    def _do_array_ops(self):
+        for operation, rows in sorted(self.array_ops.items()):
+            keys = rows.keys()
+            keys.sort()
+            params = [list(column) for column in zip(*[rows[k] for k in keys])]
+            self.cursor.execute(operation, tuple(params))
+
+    def _do_copies(self):
+        pack = struct.pack
+        for (table, columns, types), rows in sorted(self.copies.items()):
+            keys = rows.keys()
+            keys.sort()
+            # Replace rows sent earlier in the transaction.
+            stmt = "DELETE FROM %s WHERE %s = ANY(%%s)" % (table, columns[0])
+            self.cursor.execute(stmt, (keys,))
+
+            buf = StringIO()
+            buf.write(postgresql_copy_header)
+            field_count = pack('!h', len(columns))
+            for key in keys:
+                buf.write(field_count)
+                for t, value in zip(types, rows[key]):
+                    if value is None:
+                        buf.write(pack('!i', -1))
+                    elif t == 'bigint':
+                        buf.write(pack('!iq', 8, value))
+                    else:
+                        value = str(value)
+                        buf.write(pack('!i', len(value)))
+                        buf.write(value)
+            buf.write(postgresql_copy_trailer)
+            buf.seek(0)
+            stmt = "COPY %s (%s) FROM STDIN WITH BINARY" % (
+                table, ', '.join(columns))
+            self.cursor.copy_expert(stmt, buf)
 
 
 class MySQLRowBatcher(RowBatcher):
@@ -37,6 +37,10 @@ class AbstractConnectionManager(object):
     # will be called whenever a store cursor is opened or rolled back.
     on_store_opened = None
 
+    # on_load_opened is either None or a callable that
+    # will be called whenever a load cursor is opened.
+    on_load_opened = None
+
     def __init__(self, options):
         # options is a relstorage.options.Options instance
         if options.replica_conf:
@@ -55,6 +59,10 @@ class AbstractConnectionManager(object):
         """Set the on_store_opened hook"""
         self.on_store_opened = f
 
+    def set_on_load_opened(self, f):
+        """Set the on_load_opened hook"""
+        self.on_load_opened = f
+
     def open(self):
         """Open a database connection and return (conn, cursor)."""
         raise NotImplementedError()
@@ -30,6 +30,7 @@ class IRelStorageAdapter(Interface):
     runner = Attribute("An IScriptRunner")
     schema = Attribute("An ISchemaInstaller")
     stats = Attribute("An IStats")
+    tidallocator = Attribute("An ITIDAllocator")
     txncontrol = Attribute("An ITransactionControl")
 
     def new_instance():
@@ -173,6 +174,29 @@ class ILocker(Interface):
     def release_commit_lock(cursor):
         """Release the commit lock"""
 
+    def lock_objects(cursor):
+        """Lock the current rows of the objects about to be committed.
+
+        Used before acquiring the commit lock when the
+        fine-grained-locking option is enabled.  The locks are released
+        at the end of the transaction or by release_objects().
+        """
+
+    def release_objects(cursor):
+        """Release the row locks taken by lock_objects().
+
+        Nothing else done in the transaction is undone.
+        """
+
+    def hold_commit_lock_after_objects(cursor, timeout):
+        """Try to acquire the commit lock after lock_objects().
+
+        Tries for up to timeout seconds without blocking.  Returns
+        True if the commit lock was acquired.  Otherwise releases the
+        row locks and returns False, so the caller can wait for the
+        commit lock without holding them.
+        """
+
     def hold_pack_lock(cursor):
         """Try to acquire the pack lock.
 
@@ -207,6 +231,15 @@ class IObjectMover(Interface):
         Returns (None, None) if no earlier state exists.
         """
 
+    def load_before_with_end(cursor, oid, tid):
+        """Returns the state of an object before transaction tid.
+
+        Returns (state, start_tid, end_tid), where end_tid is the tid
+        of the next change to the object, or None if there is no later
+        change.  Returns (None, None, None) if no earlier state exists,
+        or None if the object does not exist.
+        """
+
     def get_object_tid_after(cursor, oid, tid):
         """Returns the tid of the next change after an object revision.
 
@@ -216,6 +249,38 @@ class IObjectMover(Interface):
     def current_object_tids(cursor, oids):
         """Returns the current {oid: tid} for specified object ids."""
 
+    def load_current_multi(cursor, oids):
+        """Iterate over the current states of the specified objects.
+
+        Yields (oid, state, tid) for each object that exists, in no
+        particular order.  Large oid lists are fetched in chunks.
+        The cursor must not be used for anything else until the
+        iteration is finished.
+        """
+
+    def load_revisions(cursor, revisions):
+        """Iterate over specific revisions of objects.
+
+        revisions is a list of (oid, tid).  Yields (oid, tid, state)
+        for each revision that exists, in no particular order.
+        The cursor must not be used for anything else until the
+        iteration is finished.
+        """
+
+    def load_recent(cursor, limit):
+        """Iterate over the current states of recently changed objects.
+
+        Yields (oid, state, tid) for at most limit objects, newest first.
+        Used for warming the cache.
+        """
+
+    def on_load_opened(cursor, restart=False):
+        """Initialize a load connection, such as by preparing statements.
+
+        This method may be None, meaning no load connection
+        initialization is required.
+        """
+
     def on_store_opened(cursor, restart=False):
         """Create the temporary table for storing objects.
 
@@ -251,18 +316,51 @@ class IObjectMover(Interface):
         attempted_data).  If there is no conflict, returns None.
         """
 
+    def detect_conflicts(cursor, locked=True):
+        """Find all conflicts in the data about to be committed.
+
+        Returns a list of (oid, prev_tid, attempted_prev_tid,
+        attempted_data).  Set locked to False when the commit lock
+        is not held, so that the query does not take locks that a
+        committing transaction would wait for.
+        """
+
     def replace_temp(cursor, oid, prev_tid, data):
         """Replace an object in the temporary table.
 
         This happens after conflict resolution.
         """
 
+    def replace_temps(cursor, rows):
+        """Replace objects in the temporary table in one statement.
+
+        rows is a list of (oid, prev_tid, data).  This happens after
+        conflict resolution.
+        """
+
     def move_from_temp(cursor, tid, txn_has_blobs):
         """Moved the temporarily stored objects to permanent storage.
 
         Returns the list of oids stored.
         """
 
+    def vote(cursor, tid_min, username, description, extension,
+            txn_has_blobs):
+        """Commit the stored objects in a stored procedure.
+
+        Acquires the commit lock, detects conflicts, chooses a tid no
+        lower than tid_min, adds the transaction, moves the objects
+        from the temporary table and updates the current object
+        pointers, all in one database call.  Returns (tid, oids,
+        conflicts).
+
+        If conflicts is not empty, it is a list like the one returned
+        by detect_conflicts(), tid is None, nothing has been moved, and
+        the commit lock is still held; after resolving the conflicts
+        with replace_temps(), call this method again.  Otherwise oids
+        is the list of oids stored.
+        """
+
     def update_current(cursor, tid):
         """Update the current object pointers.
 
@@ -285,13 +383,31 @@ class IObjectMover(Interface):
 class IOIDAllocator(Interface):
     """Allocate OIDs and control future allocation"""
 
-    def new_oids(cursor):
-        """Return a sequence of new, unused OIDs."""
+    def new_oids(cursor, blocks=1):
+        """Return a sequence of new, unused OIDs.
+
+        blocks is the number of 16-OID blocks to allocate in one
+        round trip.
+        """
 
     def set_min_oid(cursor, oid):
         """Ensure the next OID is at least the given OID."""
 
 
+class ITIDAllocator(Interface):
+    """Allocate transaction IDs and control future allocation"""
+
+    def new_tid(cursor, tid_min):
+        """Return a new tid greater than any existing tid.
+
+        The new tid is at least tid_min.  The caller must hold the
+        commit lock and must commit in the same database transaction.
+        """
+
+    def set_min_tid(cursor, tid):
+        """Ensure the next tid is greater than the given tid."""
+
+
 class IPackUndo(Interface):
     """Perform pack and undo operations"""
 
@@ -17,6 +17,7 @@
 from relstorage.adapters.interfaces import ILocker
 from ZODB.POSException import StorageError
 from zope.interface import implements
+import time
 
 
 class Locker(object):
@@ -27,6 +28,59 @@ class Locker(object):
         self.commit_lock_id = options.commit_lock_id
         self.lock_exceptions = lock_exceptions
 
+    def lock_objects(self, cursor):
+        """Lock the current rows of the objects in temp_store.
+
+        The rows are locked in OID order to avoid deadlocks.
+        """
+        # release_objects() rolls back to this savepoint.
+        cursor.execute("SAVEPOINT lock_objects")
+        if self.keep_history:
+            stmt = """
+            SELECT zoid
+            FROM current_object
+            WHERE zoid IN (SELECT zoid FROM temp_store)
+            ORDER BY zoid
+            FOR UPDATE
+            """
+        else:
+            stmt = """
+            SELECT zoid
+            FROM object_state
+            WHERE zoid IN (SELECT zoid FROM temp_store)
+            ORDER BY zoid
+            FOR UPDATE
+            """
+        cursor.execute(stmt)
+        cursor.fetchall()
+
+    def release_objects(self, cursor):
+        """Release the row locks taken by lock_objects()."""
+        # PostgreSQL and Oracle release the locks acquired after
+        # a savepoint when rolling back to it.
+        cursor.execute("ROLLBACK TO SAVEPOINT lock_objects")
+
+    def hold_commit_lock_after_objects(self, cursor, timeout):
+        """Try to acquire the commit lock after lock_objects().
+
+        Another transaction may hold the commit lock while waiting for
+        the locked rows, so don't wait on the commit lock; try for up
+        to timeout seconds instead.  If the commit lock can't be
+        acquired, release the row locks and return False.
+        """
+        deadline = time.time() + timeout
+        while True:
+            # A failed attempt aborts the transaction on PostgreSQL.
+            cursor.execute("SAVEPOINT commit_lock")
+            if self.hold_commit_lock(
+                    cursor, ensure_current=True, nowait=True):
+                return True
+            if time.time() >= deadline:
+                self.release_objects(cursor)
+                return False
+            cursor.execute("ROLLBACK TO SAVEPOINT commit_lock")
+            time.sleep(0.01)
+
 
 class PostgreSQLLocker(Locker):
     implements(ILocker)
@@ -103,6 +157,12 @@ class PostgreSQLLocker(Locker):
 class MySQLLocker(Locker):
     implements(ILocker)
 
+    def release_objects(self, cursor):
+        # InnoDB keeps row locks after ROLLBACK TO SAVEPOINT, so roll
+        # back the whole transaction.  Nothing else is lost, since
+        # the temporary tables and new_oid are MyISAM tables.
+        cursor.connection.rollback()
+
     def hold_commit_lock(self, cursor, ensure_current=False, nowait=False):
         timeout = not nowait and self.commit_lock_timeout or 0
         stmt = "SELECT GET_LOCK(CONCAT(DATABASE(), '.commit'), %s)"
@@ -14,12 +14,11 @@
 """History preserving IObjectMover implementation.
 """
 
-from base64 import decodestring
-from base64 import encodestring
 from relstorage.adapters.interfaces import IObjectMover
 from relstorage.adapters.batch import MySQLRowBatcher
 from relstorage.adapters.batch import OracleRowBatcher
 from relstorage.adapters.batch import PostgreSQLRowBatcher
+from ZODB.POSException import StorageError
 from zope.interface import implements
 import os
 import sys
@@ -38,6 +37,107 @@ def compute_md5sum(data):
         return None
 
 
+_postgresql_load_before = """
+        SELECT state, tid
+        FROM object_state
+        WHERE zoid = $1
+            AND tid < $2
+        ORDER BY tid DESC
+        LIMIT 1
+        """
+
+_postgresql_get_object_tid_after = """
+        SELECT tid
+        FROM object_state
+        WHERE zoid = $1
+            AND tid > $2
+        ORDER BY tid
+        LIMIT 1
+        """
+
+# postgresql_prepared_statements lists the statements PREPAREd on every
+# PostgreSQL load and store connection, so the server parses and plans
+# them only once per connection.  Each item is (name, parameter types,
+# history-preserving statement, history-free statement).  A statement
+# of None means the statement is not needed by that kind of database.
+postgresql_prepared_statements = (
+    ('load_current', 'BIGINT',
+        """
+        SELECT state, tid
+        FROM current_object
+            JOIN object_state USING(zoid, tid)
+        WHERE zoid = $1
+        """,
+        """
+        SELECT state, tid
+        FROM object_state
+        WHERE zoid = $1
+        """),
+    ('load_before', 'BIGINT, BIGINT',
+        _postgresql_load_before,
+        _postgresql_load_before),
+    ('load_before_with_end', 'BIGINT, BIGINT',
+        """
+        SELECT object_state.state, object_state.tid,
+            (
+                SELECT MIN(later.tid)
+                FROM object_state later
+                WHERE later.zoid = $1
+                    AND later.tid > object_state.tid
+            )
+        FROM current_object
+            LEFT JOIN object_state ON (
+                object_state.zoid = current_object.zoid
+                AND object_state.tid = (
+                    SELECT MAX(tid)
+                    FROM object_state
+                    WHERE zoid = $1
+                        AND tid < $2
+                )
+            )
+        WHERE current_object.zoid = $1
+        """,
+        None),
+    ('object_exists', 'BIGINT',
+        "SELECT 1 FROM current_object WHERE zoid = $1",
+        "SELECT 1 FROM object_state WHERE zoid = $1"),
+    ('get_object_tid_after', 'BIGINT, BIGINT',
+        _postgresql_get_object_tid_after,
+        _postgresql_get_object_tid_after),
+    ('current_object_tids', 'BIGINT[]',
+        "SELECT zoid, tid FROM current_object WHERE zoid = ANY($1)",
+        "SELECT zoid, tid FROM object_state WHERE zoid = ANY($1)"),
+    ('load_current_multi', 'BIGINT[]',
+        """
+        SELECT zoid, state, tid
+        FROM current_object
+            JOIN object_state USING(zoid, tid)
+        WHERE zoid = ANY($1)
+        """,
+        """
+        SELECT zoid, state, tid
+        FROM object_state
+        WHERE zoid = ANY($1)
+        """),
+)
+
+
+# postgresql_current_state_statements replaces some of the prepared
+# statements when current_object holds a copy of the current states.
+postgresql_current_state_statements = {
+    'load_current': """
+        SELECT state, tid
+        FROM current_object
+        WHERE zoid = $1
+        """,
+    'load_current_multi': """
+        SELECT zoid, state, tid
+        FROM current_object
+        WHERE zoid = ANY($1)
+        """,
+}
+
+
 class ObjectMover(object):
     implements(IObjectMover)
 
@@ -46,16 +146,24 @@ class ObjectMover(object):
         'load_revision',
         'exists',
         'load_before',
+        'load_before_with_end',
         'get_object_tid_after',
         'current_object_tids',
+        'load_current_multi',
+        'load_revisions',
+        'load_recent',
+        'on_load_opened',
         'on_store_opened',
         'make_batcher',
         'store_temp',
         'restore',
         'detect_conflict',
+        'detect_conflicts',
         'replace_temp',
+        'replace_temps',
         'move_from_temp',
         'update_current',
+        'vote',
         'download_blob',
         'upload_blob',
     )
@@ -65,7 +173,12 @@ class ObjectMover(object):
         # The inputsizes parameter is for Oracle only.
         self.database_type = database_type
         self.keep_history = options.keep_history
+        self.keep_current_state = (
+            options.keep_history and options.keep_current_state)
         self.blob_chunk_size = options.blob_chunk_size
+        self.reuse_temp_tables = options.reuse_temp_tables
+        self.commit_lock_timeout = options.commit_lock_timeout
+        self.commit_lock_id = options.commit_lock_id
         self.runner = runner
         self.Binary = Binary
         self.inputsizes = inputsizes
@@ -83,25 +196,12 @@ class ObjectMover(object):
 
         oid is an integer.  Returns (None, None) if object does not exist.
         """
-        if self.keep_history:
-            stmt = """
-            SELECT encode(state, 'base64'), tid
-            FROM current_object
-                JOIN object_state USING(zoid, tid)
-            WHERE zoid = %s
-            """
-        else:
-            stmt = """
-            SELECT encode(state, 'base64'), tid
-            FROM object_state
-            WHERE zoid = %s
-            """
-        cursor.execute(stmt, (oid,))
+        cursor.execute("EXECUTE load_current(%s)", (oid,))
         if cursor.rowcount:
             assert cursor.rowcount == 1
-            state64, tid = cursor.fetchone()
-            if state64 is not None:
-                state = decodestring(state64)
+            state, tid = cursor.fetchone()
+            if state is not None:
+                state = str(state)
             else:
                 # This object's creation has been undone
                 state = None
@@ -114,7 +214,13 @@ class ObjectMover(object):
 
         oid is an integer.  Returns (None, None) if object does not exist.
         """
-        if self.keep_history:
+        if self.keep_current_state:
+            stmt = """
+            SELECT state, tid
+            FROM current_object
+            WHERE zoid = %s
+            """
+        elif self.keep_history:
             stmt = """
             SELECT state, tid
             FROM current_object
@@ -139,7 +245,13 @@ class ObjectMover(object):
 
         oid is an integer.  Returns (None, None) if object does not exist.
         """
-        if self.keep_history:
+        if self.keep_current_state:
+            stmt = """
+            SELECT state, tid
+            FROM current_object
+            WHERE zoid = :1
+            """
+        elif self.keep_history:
             stmt = """
             SELECT state, tid
             FROM current_object
@@ -164,7 +276,7 @@ class ObjectMover(object):
         Returns None if no such state exists.
         """
         stmt = """
-        SELECT encode(state, 'base64')
+        SELECT state
         FROM object_state
         WHERE zoid = %s
             AND tid = %s
@@ -172,9 +284,9 @@ class ObjectMover(object):
         cursor.execute(stmt, (oid, tid))
         if cursor.rowcount:
             assert cursor.rowcount == 1
-            (state64,) = cursor.fetchone()
-            if state64 is not None:
-                return decodestring(state64)
+            (state,) = cursor.fetchone()
+            if state is not None:
+                return str(state)
         return None
 
     def mysql_load_revision(self, cursor, oid, tid):
@@ -213,7 +325,12 @@ class ObjectMover(object):
 
 
 
-    def generic_exists(self, cursor, oid):
+    def postgresql_exists(self, cursor, oid):
+        """Returns a true value if the given object exists."""
+        cursor.execute("EXECUTE object_exists(%s)", (oid,))
+        return cursor.rowcount
+
+    def mysql_exists(self, cursor, oid):
         """Returns a true value if the given object exists."""
         if self.keep_history:
             stmt = "SELECT 1 FROM current_object WHERE zoid = %s"
@@ -222,9 +339,6 @@ class ObjectMover(object):
         cursor.execute(stmt, (oid,))
         return cursor.rowcount
 
-    postgresql_exists = generic_exists
-    mysql_exists = generic_exists
-
     def oracle_exists(self, cursor, oid):
         """Returns a true value if the given object exists."""
         if self.keep_history:
@@ -244,20 +358,12 @@ class ObjectMover(object):
 
         Returns (None, None) if no earlier state exists.
         """
-        stmt = """
-        SELECT encode(state, 'base64'), tid
-        FROM object_state
-        WHERE zoid = %s
-            AND tid < %s
-        ORDER BY tid DESC
-        LIMIT 1
-        """
-        cursor.execute(stmt, (oid, tid))
+        cursor.execute("EXECUTE load_before(%s, %s)", (oid, tid))
         if cursor.rowcount:
             assert cursor.rowcount == 1
-            state64, tid = cursor.fetchone()
-            if state64 is not None:
-                state = decodestring(state64)
+            state, tid = cursor.fetchone()
+            if state is not None:
+                state = str(state)
             else:
                 # The object's creation has been undone
                 state = None
@@ -307,7 +413,123 @@ class ObjectMover(object):
 
 
 
-    def generic_get_object_tid_after(self, cursor, oid, tid):
+    def _history_free_load_before_with_end(self, cursor, oid, tid):
+        """Implement load_before_with_end for history-free databases.
+
+        History-free databases have only one state per object, so
+        there is never an end tid.
+        """
+        state, start_tid = self.load_current(cursor, oid)
+        if start_tid is None:
+            return None
+        if start_tid < tid:
+            return state, start_tid, None
+        return None, None, None
+
+    def postgresql_load_before_with_end(self, cursor, oid, tid):
+        """Returns the state of an object before transaction tid.
+
+        Returns (state, start_tid, end_tid), where end_tid is the tid
+        of the next change to the object, or None if there is no later
+        change.  Returns (None, None, None) if no earlier state exists,
+        or None if the object does not exist.
+        """
+        if not self.keep_history:
+            return self._history_free_load_before_with_end(cursor, oid, tid)
+        cursor.execute("EXECUTE load_before_with_end(%s, %s)", (oid, tid))
+        if not cursor.rowcount:
+            return None
+        assert cursor.rowcount == 1
+        state, start_tid, end_tid = cursor.fetchone()
+        if state is not None:
+            state = str(state)
+        return state, start_tid, end_tid
+
+    def mysql_load_before_with_end(self, cursor, oid, tid):
+        """Returns the state of an object before transaction tid.
+
+        Returns (state, start_tid, end_tid), where end_tid is the tid
+        of the next change to the object, or None if there is no later
+        change.  Returns (None, None, None) if no earlier state exists,
+        or None if the object does not exist.
+        """
+        if not self.keep_history:
+            return self._history_free_load_before_with_end(cursor, oid, tid)
+        stmt = """
+        SELECT object_state.state, object_state.tid,
+            (
+                SELECT MIN(later.tid)
+                FROM object_state later
+                WHERE later.zoid = %(oid)s
+                    AND later.tid > object_state.tid
+            )
+        FROM current_object
+            LEFT JOIN object_state ON (
+                object_state.zoid = current_object.zoid
+                AND object_state.tid = (
+                    SELECT MAX(tid)
+                    FROM object_state
+                    WHERE zoid = %(oid)s
+                        AND tid < %(tid)s
+                )
+            )
+        WHERE current_object.zoid = %(oid)s
+        """
+        cursor.execute(stmt, {'oid': oid, 'tid': tid})
+        if not cursor.rowcount:
+            return None
+        assert cursor.rowcount == 1
+        return cursor.fetchone()
+
+    def oracle_load_before_with_end(self, cursor, oid, tid):
+        """Returns the state of an object before transaction tid.
+
+        Returns (state, start_tid, end_tid), where end_tid is the tid
+        of the next change to the object, or None if there is no later
+        change.  Returns (None, None, None) if no earlier state exists,
+        or None if the object does not exist.
+        """
+        if not self.keep_history:
+            return self._history_free_load_before_with_end(cursor, oid, tid)
+        stmt = """
+        SELECT object_state.state, object_state.tid,
+            (
+                SELECT MIN(later.tid)
+                FROM object_state later
+                WHERE later.zoid = :oid
+                    AND later.tid > object_state.tid
+            )
+        FROM current_object
+            LEFT JOIN object_state ON (
+                object_state.zoid = current_object.zoid
+                AND object_state.tid = (
+                    SELECT MAX(tid)
+                    FROM object_state
+                    WHERE zoid = :oid
+                        AND tid < :tid
+                )
+            )
+        WHERE current_object.zoid = :oid
+        """
+        return self.runner.run_lob_stmt(
+            cursor, stmt, {'oid': oid, 'tid': tid})
+
+
+
+
+    def postgresql_get_object_tid_after(self, cursor, oid, tid):
+        """Returns the tid of the next change after an object revision.
+
+        Returns None if no later state exists.
+        """
+        cursor.execute("EXECUTE get_object_tid_after(%s, %s)", (oid, tid))
+        if cursor.rowcount:
+            assert cursor.rowcount == 1
+            return cursor.fetchone()[0]
+        else:
+            return None
+
+    def mysql_get_object_tid_after(self, cursor, oid, tid):
         """Returns the tid of the next change after an object revision.
 
         Returns None if no later state exists.
@@ -327,8 +549,6 @@ class ObjectMover(object):
         else:
             return None
 
-    postgresql_get_object_tid_after = generic_get_object_tid_after
-    mysql_get_object_tid_after = generic_get_object_tid_after
 
     def oracle_get_object_tid_after(self, cursor, oid, tid):
         """Returns the tid of the next change after an object revision.
@@ -352,6 +572,17 @@ class ObjectMover(object):
 
 
 
+    def postgresql_current_object_tids(self, cursor, oids):
+        """Returns the current {oid: tid} for specified object ids."""
+        res = {}
+        oids = list(oids)
+        while oids:
+            cursor.execute("EXECUTE current_object_tids(%s)", (oids[:1000],))
+            del oids[:1000]
+            for oid, tid in cursor:
+                res[oid] = tid
+        return res
+
     def generic_current_object_tids(self, cursor, oids):
         """Returns the current {oid: tid} for specified object ids."""
         res = {}
@@ -370,15 +601,301 @@ class ObjectMover(object):
                 res[oid] = tid
         return res
 
-    postgresql_current_object_tids = generic_current_object_tids
     mysql_current_object_tids = generic_current_object_tids
     oracle_current_object_tids = generic_current_object_tids
 
 
 
 
+    def postgresql_load_current_multi(self, cursor, oids):
+        """Iterate over the current states of the specified objects.
+
+        Yields (oid, state, tid) for each object that exists, in no
+        particular order.  Don't use the cursor for anything else
+        until the iteration is finished.
+        """
+        oids = list(oids)
+        while oids:
+            cursor.execute("EXECUTE load_current_multi(%s)", (oids[:1000],))
+            del oids[:1000]
+            for oid, state, tid in cursor:
+                if state is not None:
+                    state = str(state)
+                yield oid, state, tid
+
+    def mysql_load_current_multi(self, cursor, oids):
+        """Iterate over the current states of the specified objects.
+
+        Yields (oid, state, tid) for each object that exists, in no
+        particular order.  Don't use the cursor for anything else
+        until the iteration is finished.
+        """
+        if self.keep_current_state:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+            WHERE zoid IN (%s)
+            """
+        elif self.keep_history:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+                JOIN object_state USING(zoid, tid)
+            WHERE zoid IN (%s)
+            """
+        else:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM object_state
+            WHERE zoid IN (%s)
+            """
+        oids = list(oids)
+        while oids:
+            oid_list = ','.join(str(oid) for oid in oids[:1000])
+            del oids[:1000]
+            cursor.execute(stmt % oid_list)
+            for row in cursor:
+                yield row
+
+    # oracle_multi_chunk_size is the number of bind variables in the
+    # IN list used by oracle_load_current_multi.  Every chunk binds
+    # exactly this many values so Oracle can reuse the parsed statement.
+    oracle_multi_chunk_size = 100
+
+    def oracle_load_current_multi(self, cursor, oids):
+        """Iterate over the current states of the specified objects.
+
+        Yields (oid, state, tid) for each object that exists, in no
+        particular order.  Don't use the cursor for anything else
+        until the iteration is finished.
+        """
+        chunk_size = self.oracle_multi_chunk_size
+        params = ', '.join(':%d' % (i + 1) for i in range(chunk_size))
+        if self.keep_current_state:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+            WHERE zoid IN (%s)
+            """ % params
+        elif self.keep_history:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+                JOIN object_state USING(zoid, tid)
+            WHERE zoid IN (%s)
+            """ % params
+        else:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM object_state
+            WHERE zoid IN (%s)
+            """ % params
+        oids = list(oids)
+        while oids:
+            chunk = oids[:chunk_size]
+            del oids[:chunk_size]
+            # Pad with NULLs, which match nothing.
+            chunk.extend([None] * (chunk_size - len(chunk)))
+            cursor.execute(stmt, chunk)
+            for oid, state, tid in cursor:
+                if hasattr(state, 'read'):
+                    # Read the LOB before the cursor fetches more rows.
+                    state = state.read()
+                yield oid, state, tid
+
+
+
+
+    def generic_load_revisions(self, cursor, revisions):
+        """Iterate over specific revisions of objects.
+
+        revisions is a list of (oid, tid).  Yields (oid, tid, state)
+        for each revision that exists, in no particular order.  Don't
+        use the cursor for anything else until the iteration is
+        finished.
+        """
+        revisions = list(revisions)
+        while revisions:
+            chunk = revisions[:100]
+            del revisions[:100]
+            conditions = ' OR '.join(
+                '(zoid = %d AND tid = %d)' % (oid, tid)
+                for (oid, tid) in chunk)
+            stmt = """
+            SELECT zoid, tid, state
+            FROM object_state
+            WHERE %s
+            """ % conditions
+            cursor.execute(stmt)
+            for oid, tid, state in cursor:
+                if hasattr(state, 'read'):
+                    # Oracle: read the LOB before the cursor fetches
+                    # more rows.
+                    state = state.read()
+                if state is not None:
+                    state = str(state)
+                yield oid, tid, state
+
+    postgresql_load_revisions = generic_load_revisions
+    mysql_load_revisions = generic_load_revisions
+    oracle_load_revisions = generic_load_revisions
+
+
+
+
+    def postgresql_load_recent(self, cursor, limit):
+        """Iterate over the current states of recently changed objects.
+
+        Yields (oid, state, tid) for at most limit objects, newest first.
+        """
+        if self.keep_current_state:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        elif self.keep_history:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+                JOIN object_state USING(zoid, tid)
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        else:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM object_state
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        cursor.execute(stmt, (limit,))
+        for oid, state, tid in cursor:
+            if state is not None:
+                state = str(state)
+            yield oid, state, tid
+
+    def mysql_load_recent(self, cursor, limit):
+        """Iterate over the current states of recently changed objects.
+
+        Yields (oid, state, tid) for at most limit objects, newest first.
+        """
+        if self.keep_current_state:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        elif self.keep_history:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM current_object
+                JOIN object_state USING(zoid, tid)
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        else:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM object_state
+            ORDER BY tid DESC
+            LIMIT %s
+            """
+        cursor.execute(stmt, (limit,))
+        return iter(cursor.fetchall())
+
+    def oracle_load_recent(self, cursor, limit):
+        """Iterate over the current states of recently changed objects.
+
+        Yields (oid, state, tid) for at most limit objects, newest first.
+        """
+        if self.keep_current_state:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM (
+                SELECT zoid, state, tid
+                FROM current_object
+                ORDER BY tid DESC
+            )
+            WHERE ROWNUM <= :1
+            """
+        elif self.keep_history:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM (
+                SELECT zoid, state, tid
+                FROM current_object
+                    JOIN object_state USING(zoid, tid)
+                ORDER BY tid DESC
+            )
+            WHERE ROWNUM <= :1
+            """
+        else:
+            stmt = """
+            SELECT zoid, state, tid
+            FROM (
+                SELECT zoid, state, tid
+                FROM object_state
+                ORDER BY tid DESC
+            )
+            WHERE ROWNUM <= :1
+            """
+        cursor.execute(stmt, (limit,))
+        for oid, state, tid in cursor:
+            if hasattr(state, 'read'):
+                state = state.read()
+            yield oid, state, tid
+
+
+
+
+    def postgresql_prepare_statements(self, cursor):
+        """PREPARE the statements in postgresql_prepared_statements."""
+        for name, param_types, hp_stmt, hf_stmt in (
+                postgresql_prepared_statements):
+            if self.keep_current_state:
+                stmt = postgresql_current_state_statements.get(name, hp_stmt)
+            elif self.keep_history:
+                stmt = hp_stmt
+            else:
+                stmt = hf_stmt
+            if stmt is None:
+                continue
+            cursor.execute("PREPARE %s(%s) AS %s" % (name, param_types, stmt))
+
+    def postgresql_on_load_opened(self, cursor, restart=False):
+        """Prepare the statements used for loading objects.
+
+        Prepared statements last as long as the session, so there is
+        nothing to do when the connection is restarted.
+        """
+        if not restart:
+            self.postgresql_prepare_statements(cursor)
+
+    mysql_on_load_opened = None
+    oracle_on_load_opened = None
+
+
+
+
     def postgresql_on_store_opened(self, cursor, restart=False):
         """Create the temporary tables for storing objects"""
+        if not restart:
+            # Conflict resolution and serial checks use the
+            # store connection to load objects.
+            self.postgresql_prepare_statements(cursor)
+        elif self.reuse_temp_tables:
+            # The tables were emptied by the commit or rollback
+            # that ended the previous transaction.
+            return
+
+        if self.reuse_temp_tables:
+            on_commit = 'DELETE ROWS'
+        else:
+            on_commit = 'DROP'
+
         # note that the md5 column is not used if self.keep_history == False.
         stmt = """
         CREATE TEMPORARY TABLE temp_store (
@@ -386,14 +903,14 @@ class ObjectMover(object):
             prev_tid    BIGINT NOT NULL,
             md5         CHAR(32),
             state       BYTEA
-        ) ON COMMIT DROP;
+        ) ON COMMIT %(on_commit)s;
         CREATE UNIQUE INDEX temp_store_zoid ON temp_store (zoid);
 
         CREATE TEMPORARY TABLE temp_blob_chunk (
             zoid        BIGINT NOT NULL,
             chunk_num   BIGINT NOT NULL,
             chunk       OID
-        ) ON COMMIT DROP;
+        ) ON COMMIT %(on_commit)s;
         CREATE UNIQUE INDEX temp_blob_chunk_key
             ON temp_blob_chunk (zoid, chunk_num);
 
@@ -404,12 +921,22 @@ class ObjectMover(object):
             BEFORE DELETE ON temp_blob_chunk
             FOR EACH ROW
             EXECUTE PROCEDURE temp_blob_chunk_delete_trigger();
-        """
+        """ % {'on_commit': on_commit}
         cursor.execute(stmt)
 
+        if self.reuse_temp_tables:
+            # Commit the tables so that rolling back a transaction
+            # does not drop them.
+            cursor.connection.commit()
+
     def mysql_on_store_opened(self, cursor, restart=False):
         """Create the temporary table for storing objects"""
         if restart:
+            if self.reuse_temp_tables:
+                # MyISAM tables are not transactional, so empty them.
+                cursor.execute("TRUNCATE TABLE temp_store")
+                cursor.execute("TRUNCATE TABLE temp_blob_chunk")
+                return
             stmt = "DROP TEMPORARY TABLE IF EXISTS temp_store"
             cursor.execute(stmt)
             stmt = "DROP TEMPORARY TABLE IF EXISTS temp_blob_chunk"
@@ -460,13 +987,13 @@ class ObjectMover(object):
             md5sum = compute_md5sum(data)
         else:
             md5sum = None
-        batcher.delete_from('temp_store', zoid=oid)
-        batcher.insert_into(
-            "temp_store (zoid, prev_tid, md5, state)",
-            "%s, %s, %s, decode(%s, 'base64')",
-            (oid, prev_tid, md5sum, encodestring(data)),
-            rowkey=oid,
+        batcher.copy_into(
+            'temp_store',
+            ('zoid', 'prev_tid', 'md5', 'state'),
+            ('bigint', 'bigint', 'char(32)', 'bytea'),
+            (oid, prev_tid, md5sum, data),
             size=len(data),
+            insert_row=(oid, prev_tid, md5sum, self.Binary(data)),
         )
 
     def mysql_store_temp(self, cursor, batcher, oid, prev_tid, data):
@@ -533,7 +1060,7 @@ class ObjectMover(object):
             md5sum = None
 
         if data is not None:
-            encoded = encodestring(data)
+            encoded = self.Binary(data)
             size = len(data)
         else:
             encoded = None
@@ -544,7 +1071,7 @@ class ObjectMover(object):
             row_schema = """
                 %s, %s,
                 COALESCE((SELECT tid FROM current_object WHERE zoid = %s), 0),
-                %s, %s, decode(%s, 'base64')
+                %s, %s, %s
             """
             batcher.insert_into(
                 "object_state (zoid, tid, prev_tid, md5, state_size, state)",
@@ -558,7 +1085,7 @@ class ObjectMover(object):
             if data:
                 batcher.insert_into(
                     "object_state (zoid, tid, state_size, state)",
-                    "%s, %s, %s, decode(%s, 'base64')",
+                    "%s, %s, %s, %s",
                     (oid, tid, size, encoded),
                     rowkey=oid,
                     size=size,
@@ -698,7 +1225,7 @@ class ObjectMover(object):
         if self.keep_history:
             stmt = """
             SELECT temp_store.zoid, current_object.tid, temp_store.prev_tid,
-                encode(temp_store.state, 'base64')
+                temp_store.state
             FROM temp_store
                 JOIN current_object ON (temp_store.zoid = current_object.zoid)
             WHERE temp_store.prev_tid != current_object.tid
@@ -707,7 +1234,7 @@ class ObjectMover(object):
         else:
             stmt = """
             SELECT temp_store.zoid, object_state.tid, temp_store.prev_tid,
-                encode(temp_store.state, 'base64')
+                temp_store.state
             FROM temp_store
                 JOIN object_state ON (temp_store.zoid = object_state.zoid)
             WHERE temp_store.prev_tid != object_state.tid
@@ -716,7 +1243,7 @@ class ObjectMover(object):
         cursor.execute(stmt)
         if cursor.rowcount:
             oid, prev_tid, attempted_prev_tid, data = cursor.fetchone()
-            return oid, prev_tid, attempted_prev_tid, decodestring(data)
+            return oid, prev_tid, attempted_prev_tid, str(data)
         return None
 
     def mysql_detect_conflict(self, cursor):
@@ -778,6 +1305,94 @@ class ObjectMover(object):
 
 
 
+    def postgresql_detect_conflicts(self, cursor, locked=True):
+        """Find all conflicts in the data about to be committed.
+
+        Returns a list of (oid, prev_tid, attempted_prev_tid,
+        attempted_data).
+        """
+        if self.keep_history:
+            stmt = """
+            SELECT temp_store.zoid, current_object.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid
+            """
+        else:
+            stmt = """
+            SELECT temp_store.zoid, object_state.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid
+            """
+        cursor.execute(stmt)
+        return [(oid, prev_tid, attempted_prev_tid, str(data))
+            for (oid, prev_tid, attempted_prev_tid, data) in cursor]
+
+    def mysql_detect_conflicts(self, cursor, locked=True):
+        """Find all conflicts in the data about to be committed.
+
+        Returns a list of (oid, prev_tid, attempted_prev_tid,
+        attempted_data).
+        """
+        if self.keep_history:
+            stmt = """
+            SELECT temp_store.zoid, current_object.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid
+            """
+        else:
+            stmt = """
+            SELECT temp_store.zoid, object_state.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid
+            """
+        if locked:
+            # Lock in share mode to ensure the data being read is up to date.
+            stmt += "LOCK IN SHARE MODE"
+        cursor.execute(stmt)
+        return list(cursor.fetchall())
+
+    def oracle_detect_conflicts(self, cursor, locked=True):
+        """Find all conflicts in the data about to be committed.
+
+        Returns a list of (oid, prev_tid, attempted_prev_tid,
+        attempted_data).
+        """
+        if self.keep_history:
+            stmt = """
+            SELECT temp_store.zoid, current_object.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid
+            """
+        else:
+            stmt = """
+            SELECT temp_store.zoid, object_state.tid, temp_store.prev_tid,
+                temp_store.state
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid
+            """
+        cursor.execute(stmt)
+        res = []
+        for oid, prev_tid, attempted_prev_tid, data in cursor:
+            if hasattr(data, 'read'):
+                # Read the LOB before the cursor fetches more rows.
+                data = data.read()
+            res.append((oid, prev_tid, attempted_prev_tid, data))
+        return res
+
+
+
+
     def postgresql_replace_temp(self, cursor, oid, prev_tid, data):
         """Replace an object in the temporary table.
 
@@ -791,10 +1406,10 @@ class ObjectMover(object):
         UPDATE temp_store SET
             prev_tid = %s,
             md5 = %s,
-            state = decode(%s, 'base64')
+            state = %s
         WHERE zoid = %s
         """
-        cursor.execute(stmt, (prev_tid, md5sum, encodestring(data), oid))
+        cursor.execute(stmt, (prev_tid, md5sum, self.Binary(data), oid))
 
     def mysql_replace_temp(self, cursor, oid, prev_tid, data):
         """Replace an object in the temporary table.
@@ -837,6 +1452,83 @@ class ObjectMover(object):
 
 
 
+    def postgresql_replace_temps(self, cursor, rows):
+        """Replace objects in the temporary table in one statement.
+
+        rows is a list of (oid, prev_tid, data).  This happens after
+        conflict resolution.
+        """
+        parts = []
+        params = []
+        for oid, prev_tid, data in rows:
+            if self.keep_history:
+                md5sum = compute_md5sum(data)
+            else:
+                md5sum = None
+            parts.append("(%s, %s, %s, %s)")
+            params.extend((oid, prev_tid, md5sum, self.Binary(data)))
+        stmt = """
+        UPDATE temp_store SET
+            prev_tid = v.prev_tid,
+            md5 = v.md5,
+            state = v.state
+        FROM (VALUES %s) AS v (zoid, prev_tid, md5, state)
+        WHERE temp_store.zoid = v.zoid
+        """ % ',\n'.join(parts)
+        cursor.execute(stmt, tuple(params))
+
+    def mysql_replace_temps(self, cursor, rows):
+        """Replace objects in the temporary table in one statement.
+
+        rows is a list of (oid, prev_tid, data).  This happens after
+        conflict resolution.
+        """
+        parts = []
+        params = []
+        for oid, prev_tid, data in rows:
+            if self.keep_history:
+                md5sum = compute_md5sum(data)
+            else:
+                md5sum = None
+            parts.append("(%s, %s, %s, %s)")
+            params.extend((oid, prev_tid, md5sum, self.Binary(data)))
+        stmt = """
+        REPLACE INTO temp_store (zoid, prev_tid, md5, state)
+        VALUES %s
+        """ % ',\n'.join(parts)
+        cursor.execute(stmt, tuple(params))
+
+    def oracle_replace_temps(self, cursor, rows):
+        """Replace objects in the temporary table in one statement.
+
+        rows is a list of (oid, prev_tid, data).  This happens after
+        conflict resolution.
+        """
+        params = []
+        for oid, prev_tid, data in rows:
+            if self.keep_history:
+                md5sum = compute_md5sum(data)
+            else:
+                md5sum = None
+            params.append({
+                'oid': oid,
+                'prev_tid': prev_tid,
+                'md5sum': md5sum,
+                'blobdata': self.Binary(data),
+                })
+        stmt = """
+        UPDATE temp_store SET
+            prev_tid = :prev_tid,
+            md5 = :md5sum,
+            state = :blobdata
+        WHERE zoid = :oid
+        """
+        cursor.setinputsizes(blobdata=self.inputsizes['blobdata'])
+        cursor.executemany(stmt, params)
+
+
+
+
     def generic_move_from_temp(self, cursor, tid, txn_has_blobs):
         """Moved the temporarily stored objects to permanent storage.
 
@@ -891,27 +1583,8 @@ class ObjectMover(object):
                     """
                 cursor.execute(stmt, (tid,))
 
-            if txn_has_blobs:
-                stmt = """
-                DELETE FROM blob_chunk
-                WHERE zoid IN (SELECT zoid FROM temp_store)
-                """
-                cursor.execute(stmt)
-
         if txn_has_blobs:
-            if self.database_type == 'oracle':
-                stmt = """
-                INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
-                SELECT zoid, :1, chunk_num, chunk
-                FROM temp_blob_chunk
-                """
-            else:
-                stmt = """
-                INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
-                SELECT zoid, %s, chunk_num, chunk
-                FROM temp_blob_chunk
-                """
-            cursor.execute(stmt, (tid,))
+            self._move_blobs_from_temp(cursor, tid)
 
         stmt = """
         SELECT zoid FROM temp_store
@@ -919,9 +1592,94 @@ class ObjectMover(object):
         cursor.execute(stmt)
         return [oid for (oid,) in cursor]
 
-    postgresql_move_from_temp = generic_move_from_temp
     mysql_move_from_temp = generic_move_from_temp
-    oracle_move_from_temp = generic_move_from_temp
+
+    def postgresql_move_from_temp(self, cursor, tid, txn_has_blobs):
+        """Moved the temporarily stored objects to permanent storage.
+
+        Returns the list of oids stored.
+        """
+        if (self.keep_history
+                or self.version_detector.get_version(cursor) < (9, 5)):
+            return self.generic_move_from_temp(cursor, tid, txn_has_blobs)
+
+        # Update existing rows in place rather than deleting and
+        # inserting them, and get the oids in the same statement.
+        stmt = """
+        INSERT INTO object_state (zoid, tid, state_size, state)
+        SELECT zoid, %s, COALESCE(LENGTH(state), 0), state
+        FROM temp_store
+        ON CONFLICT (zoid) DO UPDATE SET
+            tid = EXCLUDED.tid,
+            state_size = EXCLUDED.state_size,
+            state = EXCLUDED.state
+        RETURNING zoid
+        """
+        cursor.execute(stmt, (tid,))
+        oids = [oid for (oid,) in cursor]
+
+        if txn_has_blobs:
+            self._move_blobs_from_temp(cursor, tid)
+
+        return oids
+
+    def oracle_move_from_temp(self, cursor, tid, txn_has_blobs):
+        """Moved the temporarily stored objects to permanent storage.
+
+        Returns the list of oids stored.
+        """
+        if self.keep_history:
+            return self.generic_move_from_temp(cursor, tid, txn_has_blobs)
+
+        # Update existing rows in place rather than deleting and
+        # inserting them.
+        stmt = """
+        MERGE INTO object_state
+        USING (
+            SELECT zoid, COALESCE(LENGTH(state), 0) AS state_size, state
+            FROM temp_store
+        ) temp
+        ON (object_state.zoid = temp.zoid)
+        WHEN MATCHED THEN UPDATE SET
+            tid = :tid,
+            state_size = temp.state_size,
+            state = temp.state
+        WHEN NOT MATCHED THEN INSERT (zoid, tid, state_size, state)
+            VALUES (temp.zoid, :tid, temp.state_size, temp.state)
+        """
+        cursor.execute(stmt, {'tid': tid})
+
+        if txn_has_blobs:
+            self._move_blobs_from_temp(cursor, tid)
+
+        stmt = """
+        SELECT zoid FROM temp_store
+        """
+        cursor.execute(stmt)
+        return [oid for (oid,) in cursor]
+
+    def _move_blobs_from_temp(self, cursor, tid):
+        """Move the blob chunks stored in this transaction to blob_chunk."""
+        if not self.keep_history:
+            stmt = """
+            DELETE FROM blob_chunk
+            WHERE zoid IN (SELECT zoid FROM temp_store)
+            """
+            cursor.execute(stmt)
+
+        if self.database_type == 'oracle':
+            stmt = """
+            INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+            SELECT zoid, :1, chunk_num, chunk
+            FROM temp_blob_chunk
+            """
+        else:
+            stmt = """
+            INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+            SELECT zoid, %s, chunk_num, chunk
+            FROM temp_blob_chunk
+            """
+        cursor.execute(stmt, (tid,))
 
 
 
@@ -935,6 +1693,30 @@ class ObjectMover(object):
             # nothing needs to be updated
             return
 
+        if self.keep_current_state:
+            cursor.execute("""
+            -- Insert objects created in this transaction into current_object.
+            INSERT INTO current_object (zoid, tid, state)
+            SELECT zoid, tid, state FROM object_state
+            WHERE tid = %(tid)s
+                AND prev_tid = 0;
+
+            -- Change existing objects.  To avoid deadlocks,
+            -- update in OID order.
+            UPDATE current_object SET tid = %(tid)s, state = (
+                SELECT state FROM object_state
+                WHERE zoid = current_object.zoid
+                    AND tid = %(tid)s
+            )
+            WHERE zoid IN (
+                SELECT zoid FROM object_state
+                WHERE tid = %(tid)s
+                    AND prev_tid != 0
+                ORDER BY zoid
+            )
+            """, {'tid': tid})
+            return
+
         cursor.execute("""
         -- Insert objects created in this transaction into current_object.
         INSERT INTO current_object (zoid, tid)
@@ -962,11 +1744,19 @@ class ObjectMover(object):
             # nothing needs to be updated
             return
 
-        cursor.execute("""
-        REPLACE INTO current_object (zoid, tid)
-        SELECT zoid, tid FROM object_state
-        WHERE tid = %s
-        """, (tid,))
+        if self.keep_current_state:
+            stmt = """
+            REPLACE INTO current_object (zoid, tid, state)
+            SELECT zoid, tid, state FROM object_state
+            WHERE tid = %s
+            """
+        else:
+            stmt = """
+            REPLACE INTO current_object (zoid, tid)
+            SELECT zoid, tid FROM object_state
+            WHERE tid = %s
+            """
+        cursor.execute(stmt, (tid,))
 
     def oracle_update_current(self, cursor, tid):
         """Update the current object pointers.
@@ -977,6 +1767,33 @@ class ObjectMover(object):
             # nothing needs to be updated
             return
 
+        if self.keep_current_state:
+            # Insert objects created in this transaction into
+            # current_object.
+            stmt = """
+            INSERT INTO current_object (zoid, tid, state)
+            SELECT zoid, tid, state FROM object_state
+            WHERE tid = :1
+                AND prev_tid = 0
+            """
+            cursor.execute(stmt, (tid,))
+
+            # Change existing objects.
+            stmt = """
+            UPDATE current_object SET tid = :1, state = (
+                SELECT state FROM object_state
+                WHERE zoid = current_object.zoid
+                    AND tid = :1
+            )
+            WHERE zoid IN (
+                SELECT zoid FROM object_state
+                WHERE tid = :1
+                    AND prev_tid != 0
+            )
+            """
+            cursor.execute(stmt, (tid,))
+            return
+
         # Insert objects created in this transaction into current_object.
         stmt = """
         INSERT INTO current_object (zoid, tid)
@@ -1000,6 +1817,112 @@ class ObjectMover(object):
 
 
 
+    def postgresql_vote(self, cursor, tid_min, username, description,
+            extension, txn_has_blobs):
+        """Lock, choose a tid and move the stored objects in one call.
+
+        Returns (tid, oids, conflicts).
+        """
+        stmt = """
+        SELECT * FROM relstorage_vote(%s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(stmt, (tid_min, self.Binary(username),
+            self.Binary(description), self.Binary(extension),
+            bool(txn_has_blobs), self.keep_history,
+            self.keep_current_state))
+        return self._read_vote_results(cursor)
+
+    def mysql_vote(self, cursor, tid_min, username, description,
+            extension, txn_has_blobs):
+        """Lock, choose a tid and move the stored objects in one call.
+
+        Returns (tid, oids, conflicts).
+        """
+        stmt = """
+        CALL relstorage_vote(%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        cursor.execute(stmt, (tid_min, self.Binary(username),
+            self.Binary(description), self.Binary(extension),
+            bool(txn_has_blobs), self.keep_history,
+            self.keep_current_state, self.commit_lock_timeout))
+        rows = cursor.fetchall()
+        # Read the status result of the CALL statement.
+        while cursor.nextset():
+            pass
+        return self._read_vote_results(rows)
+
+    def oracle_vote(self, cursor, tid_min, username, description,
+            extension, txn_has_blobs):
+        """Lock, choose a tid and move the stored objects in one call.
+
+        Returns (tid, oids, conflicts).
+        """
+        # The commit lock is requested in the anonymous block rather
+        # than in the package because the package does not have the
+        # privileges that the session gets from its roles.
+        stmt = """
+        BEGIN
+            :status := DBMS_LOCK.REQUEST(:lock_id, 6, :timeout, TRUE);
+            -- 4 means the lock is already owned by this session.
+            IF :status IN (0, 4) THEN
+                relstorage_op.vote(:tid_min, :username, :description,
+                    :extension, :has_blobs, :keep_current_state, :results);
+            END IF;
+        END;
+        """
+        max_desc_len = 2000
+        if len(description) > max_desc_len:
+            description = description[:max_desc_len]
+        status = cursor.var(self.inputsizes['tid'])
+        results = cursor.var(self.inputsizes['cursor'])
+        cursor.execute(stmt, {
+            'status': status,
+            'lock_id': self.commit_lock_id,
+            'timeout': self.commit_lock_timeout,
+            'tid_min': tid_min,
+            'username': self.Binary(username),
+            'description': self.Binary(description),
+            'extension': self.Binary(extension),
+            'has_blobs': txn_has_blobs and 1 or 0,
+            'keep_current_state': self.keep_current_state and 1 or 0,
+            'results': results,
+            })
+        if status.getvalue() not in (0, 4):
+            raise StorageError(
+                "Unable to acquire commit lock (status %s)"
+                % status.getvalue())
+        return self._read_vote_results(results.getvalue())
+
+    def _read_vote_results(self, rows):
+        """Read the rows produced by the relstorage_vote procedures.
+
+        Conflict rows have no tid.  Otherwise there is one row for the
+        tid and one row for each stored object.
+        """
+        tid = None
+        oids = []
+        conflicts = []
+        for new_tid, oid, prev_tid, attempted_prev_tid, data in rows:
+            if new_tid is None:
+                if oid is None:
+                    continue
+                if hasattr(data, 'read'):
+                    # Read the LOB before the cursor fetches more rows.
+                    data = data.read()
+                elif data is not None:
+                    data = str(data)
+                conflicts.append((oid, prev_tid, attempted_prev_tid, data))
+            else:
+                tid = new_tid
+                if oid is not None:
+                    oids.append(oid)
+        if tid is None and not conflicts:
+            raise StorageError("Unable to acquire commit lock")
+        return tid, oids, conflicts
+
+
+
+
     def postgresql_download_blob(self, cursor, oid, tid, filename):
         """Download a blob into a file."""
         stmt = """
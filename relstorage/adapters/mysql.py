@@ -66,6 +66,7 @@ from relstorage.adapters.poller import Poller
 from relstorage.adapters.schema import MySQLSchemaInstaller
 from relstorage.adapters.scriptrunner import ScriptRunner
 from relstorage.adapters.stats import MySQLStats
+from relstorage.adapters.tidallocator import MySQLTIDAllocator
 from relstorage.adapters.txncontrol import MySQLTransactionControl
 from relstorage.options import Options
 
@@ -108,6 +109,8 @@ class MySQLAdapter(object):
             connmanager=self.connmanager,
             runner=self.runner,
             keep_history=self.keep_history,
+            keep_current_state=options.keep_current_state,
+            commit_procedure=options.commit_procedure,
             )
         self.mover = ObjectMover(
             database_type='mysql',
@@ -116,6 +119,7 @@ class MySQLAdapter(object):
             )
         self.connmanager.set_on_store_opened(self.mover.on_store_opened)
         self.oidallocator = MySQLOIDAllocator()
+        self.tidallocator = MySQLTIDAllocator()
         self.txncontrol = MySQLTransactionControl(
             keep_history=self.keep_history,
             Binary=MySQLdb.Binary,
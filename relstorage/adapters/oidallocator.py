@@ -17,7 +17,10 @@
 # All of these allocators allocate 16 OIDs at a time.  In the sequence
 # or table, value (n) represents (n * 16 - 15) through (n * 16).  So,
 # value 1 represents OID block 1-16, 2 represents OID block 17-32,
-# and so on.
+# and so on.  new_oids() can take several values in one round trip,
+# returning several blocks.  The blocks may not be contiguous, but
+# each one follows the same encoding, so clients that take one block
+# at a time can share the database.
 
 from relstorage.adapters.interfaces import IOIDAllocator
 from zope.interface import implements
@@ -35,12 +38,18 @@ class PostgreSQLOIDAllocator(object):
             END
         """, (n, n))
 
-    def new_oids(self, cursor):
+    def new_oids(self, cursor, blocks=1):
         """Return a sequence of new, unused OIDs."""
-        stmt = "SELECT NEXTVAL('zoid_seq')"
-        cursor.execute(stmt)
-        n = cursor.fetchone()[0]
-        return range(n * 16 - 15, n * 16 + 1)
+        if blocks == 1:
+            stmt = "SELECT NEXTVAL('zoid_seq')"
+            cursor.execute(stmt)
+        else:
+            stmt = "SELECT NEXTVAL('zoid_seq') FROM generate_series(1, %s)"
+            cursor.execute(stmt, (blocks,))
+        res = []
+        for (n,) in cursor.fetchall():
+            res.extend(range(n * 16 - 15, n * 16 + 1))
+        return res
 
 
 class MySQLOIDAllocator(object):
@@ -51,16 +60,19 @@ class MySQLOIDAllocator(object):
         n = (oid + 15) // 16
         cursor.execute("REPLACE INTO new_oid VALUES(%s)", (n,))
 
-    def new_oids(self, cursor):
+    def new_oids(self, cursor, blocks=1):
         """Return a sequence of new, unused OIDs."""
-        stmt = "INSERT INTO new_oid VALUES ()"
+        # new_oid is a MyISAM table, so the rows of a multi-row insert
+        # get consecutive values starting at insert_id().
+        stmt = "INSERT INTO new_oid VALUES %s" % ', '.join(['()'] * blocks)
         cursor.execute(stmt)
-        n = cursor.connection.insert_id()
-        if n % 100 == 0:
+        first = cursor.connection.insert_id()
+        n = first + blocks - 1
+        if n // 100 != (first - 1) // 100:
             # Clean out previously generated OIDs.
             stmt = "DELETE FROM new_oid WHERE zoid < %s"
             cursor.execute(stmt, (n,))
-        return range(n * 16 - 15, n * 16 + 1)
+        return range(first * 16 - 15, n * 16 + 1)
 
 
 class OracleOIDAllocator(object):
@@ -94,10 +106,16 @@ class OracleOIDAllocator(object):
             finally:
                 self.connmanager.close(conn2, cursor2)
 
-    def new_oids(self, cursor):
+    def new_oids(self, cursor, blocks=1):
         """Return a sequence of new, unused OIDs."""
-        stmt = "SELECT zoid_seq.nextval FROM DUAL"
-        cursor.execute(stmt)
-        n = cursor.fetchone()[0]
-        return range(n * 16 - 15, n * 16 + 1)
+        if blocks == 1:
+            stmt = "SELECT zoid_seq.nextval FROM DUAL"
+            cursor.execute(stmt)
+        else:
+            stmt = "SELECT zoid_seq.nextval FROM DUAL CONNECT BY LEVEL <= :1"
+            cursor.execute(stmt, (blocks,))
+        res = []
+        for (n,) in cursor.fetchall():
+            res.extend(range(n * 16 - 15, n * 16 + 1))
+        return res
 
@@ -31,6 +31,7 @@ from relstorage.adapters.poller import Poller
 from relstorage.adapters.schema import OracleSchemaInstaller
 from relstorage.adapters.scriptrunner import OracleScriptRunner
 from relstorage.adapters.stats import OracleStats
+from relstorage.adapters.tidallocator import OracleTIDAllocator
 from relstorage.adapters.txncontrol import OracleTransactionControl
 from relstorage.options import Options
 
@@ -90,6 +91,7 @@ class OracleAdapter(object):
             connmanager=self.connmanager,
             runner=self.runner,
             keep_history=self.keep_history,
+            keep_current_state=options.keep_current_state,
             )
         self.mover = ObjectMover(
             database_type='oracle',
@@ -104,12 +106,16 @@ class OracleAdapter(object):
                 'prev_tid': cx_Oracle.NUMBER,
                 'chunk_num': cx_Oracle.NUMBER,
                 'md5sum': cx_Oracle.STRING,
+                'cursor': cx_Oracle.CURSOR,
                 },
             )
         self.connmanager.set_on_store_opened(self.mover.on_store_opened)
         self.oidallocator = OracleOIDAllocator(
             connmanager=self.connmanager,
             )
+        self.tidallocator = OracleTIDAllocator(
+            inputsize_NUMBER=cx_Oracle.NUMBER,
+            )
         self.txncontrol = OracleTransactionControl(
             keep_history=self.keep_history,
             Binary=cx_Oracle.Binary,
@@ -14,10 +14,11 @@
 """Pack/Undo implementations.
 """
 
-from base64 import decodestring
 from itertools import groupby
 from operator import itemgetter
 from relstorage.adapters.interfaces import IPackUndo
+from relstorage.adapters.refpool import ReferenceFinderPool
+from relstorage.adapters.refpool import find_references_inline
 from ZODB.POSException import UndoError
 from zope.interface import implements
 import logging
@@ -31,6 +32,14 @@ class PackUndo(object):
 
     verify_sane_database = False
 
+    # _ref_pool is a ReferenceFinderPool while fill_object_refs() runs
+    # with the pack-reference-workers option.
+    _ref_pool = None
+
+    # in_list_size: the most OIDs or tids to put in an "IN (...)" list.
+    # Oracle refuses lists of more than 1000.
+    in_list_size = 100
+
     def __init__(self, database_type, connmanager, runner, locker, options):
         self.database_type = database_type
         self.connmanager = connmanager
@@ -38,6 +47,33 @@ class PackUndo(object):
         self.locker = locker
         self.options = options
 
+    def _fill_object_refs_with_pool(self, conn, cursor, get_references):
+        """Call fill_object_refs(), unpickling in worker processes if
+        the pack-reference-workers option is set.
+        """
+        workers = self.options.pack_reference_workers
+        if not workers:
+            self.fill_object_refs(conn, cursor, get_references)
+            return
+        log.info("pre_pack: starting %d reference finder process(es)",
+            workers)
+        self._ref_pool = ReferenceFinderPool(workers, get_references)
+        try:
+            self.fill_object_refs(conn, cursor, get_references)
+        finally:
+            self._ref_pool.close()
+            self._ref_pool = None
+
+    def _find_references(self, rows, get_references):
+        """Find the references from object states.
+
+        rows is a list of (from_oid, tid, state).  Yields
+        (from_oid, tid, to_oids).
+        """
+        if self._ref_pool is not None and len(rows) > 1:
+            return self._ref_pool.find(rows)
+        return find_references_inline(get_references, rows)
+
     def choose_pack_transaction(self, pack_point):
         """Return the transaction before or at the specified pack time.
 
@@ -376,73 +412,75 @@ class HistoryPreservingPackUndo(PackUndo):
         """
         self.runner.run_script_stmt(cursor, stmt)
         tids = [tid for (tid,) in cursor]
-        log_at = time.time() + 60
+        start = time.time()
+        log_at = start + 60
         if tids:
             self.on_filling_object_refs()
             tid_count = len(tids)
             txns_done = 0
+            states_done = 0
             log.info("analyzing references from objects in %d new "
                 "transaction(s)", tid_count)
-            for tid in tids:
-                self._add_refs_for_tid(cursor, tid, get_references)
-                txns_done += 1
+            if self._ref_pool is not None:
+                # Analyze many transactions at once, so every worker
+                # process gets states to unpickle.
+                batch_size = self.in_list_size
+            else:
+                batch_size = 1
+            while tids:
+                batch = tids[:batch_size]
+                tids = tids[batch_size:]
+                states_done += self._add_refs_for_tids(
+                    cursor, batch, get_references)
+                txns_done += len(batch)
                 now = time.time()
                 if now >= log_at:
                     # save the work done so far
                     conn.commit()
                     log_at = now + 60
                     log.info(
-                        "transactions analyzed: %d/%d", txns_done, tid_count)
+                        "transactions analyzed: %d/%d (%.1f states/s)",
+                        txns_done, tid_count, states_done / (now - start))
             conn.commit()
-            log.info("transactions analyzed: %d/%d", txns_done, tid_count)
+            log.info("transactions analyzed: %d/%d (%.1f states/s)",
+                txns_done, tid_count,
+                states_done / max(time.time() - start, 0.001))
 
-    def _add_refs_for_tid(self, cursor, tid, get_references):
-        """Fill object_refs with all states for a transaction.
+    def _add_refs_for_tids(self, cursor, tids, get_references):
+        """Fill object_refs with all states for some transactions.
 
-        Returns the number of references added.
+        Returns the number of states analyzed.
         """
-        log.debug("pre_pack: transaction %d: computing references ", tid)
-        from_count = 0
-        use_base64 = (self.database_type == 'postgresql')
+        log.debug("pre_pack: transaction(s) %s: computing references ",
+            tids)
+        tid_list = ','.join(str(tid) for tid in tids)
 
-        if use_base64:
-            stmt = """
-            SELECT zoid, encode(state, 'base64')
-            FROM object_state
-            WHERE tid = %(tid)s
-            """
-        else:
-            stmt = """
-            SELECT zoid, state
-            FROM object_state
-            WHERE tid = %(tid)s
-            """
-        self.runner.run_script_stmt(cursor, stmt, {'tid': tid})
+        stmt = """
+        SELECT zoid, tid, state
+        FROM object_state
+        WHERE tid IN (%s)
+        """ % tid_list
+        self.runner.run_script_stmt(cursor, stmt)
 
-        add_rows = []  # [(from_oid, tid, to_oid)]
-        for from_oid, state in cursor:
+        rows = []  # [(from_oid, tid, state)]
+        for from_oid, tid, state in cursor:
             if hasattr(state, 'read'):
                 # Oracle
                 state = state.read()
             if state:
-                state = str(state)
-                if use_base64:
-                    state = decodestring(state)
-                from_count += 1
-                try:
-                    to_oids = get_references(state)
-                except:
-                    log.error("pre_pack: can't unpickle "
-                        "object %d in transaction %d; state length = %d" % (
-                        from_oid, tid, len(state)))
-                    raise
-                for to_oid in to_oids:
-                    add_rows.append((from_oid, tid, to_oid))
+                rows.append((from_oid, tid, str(state)))
+        from_count = len(rows)
+
+        add_rows = []  # [(from_oid, tid, to_oid)]
+        for from_oid, tid, to_oids in self._find_references(
+                rows, get_references):
+            for to_oid in to_oids:
+                add_rows.append((from_oid, tid, to_oid))
 
         # A previous pre-pack may have been interrupted.  Delete rows
         # from the interrupted attempt.
-        stmt = "DELETE FROM object_ref WHERE tid = %(tid)s"
-        self.runner.run_script_stmt(cursor, stmt, {'tid': tid})
+        stmt = "DELETE FROM object_ref WHERE tid IN (%s)" % tid_list
+        self.runner.run_script_stmt(cursor, stmt)
 
         # Add the new references.
         stmt = """
@@ -451,17 +489,17 @@ class HistoryPreservingPackUndo(PackUndo):
         """
         self.runner.run_many(cursor, stmt, add_rows)
 
-        # The references have been computed for this transaction.
+        # The references have been computed for these transactions.
         stmt = """
         INSERT INTO object_refs_added (tid)
-        VALUES (%(tid)s)
+        VALUES (%s)
         """
-        self.runner.run_script_stmt(cursor, stmt, {'tid': tid})
+        self.runner.run_many(cursor, stmt, [(tid,) for tid in tids])
 
         to_count = len(add_rows)
-        log.debug("pre_pack: transaction %d: has %d reference(s) "
-            "from %d object(s)", tid, to_count, from_count)
-        return to_count
+        log.debug("pre_pack: transaction(s) %s: has %d reference(s) "
+            "from %d object(s)", tids, to_count, from_count)
+        return from_count
 
     def pre_pack(self, pack_tid, get_references):
         """Decide what to pack.
@@ -577,7 +615,7 @@ class HistoryPreservingPackUndo(PackUndo):
         if stmt:
             self.runner.run_script(cursor, stmt)
 
-        self.fill_object_refs(conn, cursor, get_references)
+        self._fill_object_refs_with_pool(conn, cursor, get_references)
 
         log.info("pre_pack: filling the pack_object table")
         # Fill the pack_object table with OIDs that either will be
@@ -972,7 +1010,13 @@ class HistoryFreePackUndo(PackUndo):
             """
             self.runner.run_script_stmt(cursor, stmt)
             oids = [oid for (oid,) in cursor]
-            log_at = time.time() + 60
+            start = time.time()
+            log_at = start + 60
+            if self._ref_pool is not None:
+                # Give every worker process enough states to unpickle.
+                batch_size = 100 * self._ref_pool.workers
+            else:
+                batch_size = 100
             if oids:
                 if attempt == 1:
                     self.on_filling_object_refs()
@@ -980,8 +1024,8 @@ class HistoryFreePackUndo(PackUndo):
                 oids_done = 0
                 log.info("analyzing references from %d object(s)", oid_count)
                 while oids:
-                    batch = oids[:100]
-                    oids = oids[100:]
+                    batch = oids[:batch_size]
+                    oids = oids[batch_size:]
                     self._add_refs_for_oids(cursor, batch, get_references)
                     oids_done += len(batch)
                     now = time.time()
@@ -990,10 +1034,13 @@ class HistoryFreePackUndo(PackUndo):
                         conn.commit()
                         log_at = now + 60
                         log.info(
-                            "objects analyzed: %d/%d", oids_done, oid_count)
+                            "objects analyzed: %d/%d (%.1f objects/s)",
+                            oids_done, oid_count, oids_done / (now - start))
                 conn.commit()
                 log.info(
-                    "objects analyzed: %d/%d", oids_done, oid_count)
+                    "objects analyzed: %d/%d (%.1f objects/s)",
+                    oids_done, oid_count,
+                    oids_done / max(time.time() - start, 0.001))
             else:
                 # No changes since last pass.
                 break
@@ -1003,51 +1050,46 @@ class HistoryFreePackUndo(PackUndo):
 
         Returns the number of references added.
         """
-        oid_list = ','.join(str(oid) for oid in oids)
-        use_base64 = (self.database_type == 'postgresql')
+        # The batch can be larger than Oracle allows in an IN list
+        # when reference finder workers are in use, so split it.
+        oid_lists = []
+        for i in range(0, len(oids), self.in_list_size):
+            oid_lists.append(','.join(
+                str(oid) for oid in oids[i:i + self.in_list_size]))
 
-        if use_base64:
-            stmt = """
-            SELECT zoid, tid, encode(state, 'base64')
-            FROM object_state
-            WHERE zoid IN (%s)
-            """ % oid_list
-        else:
+        add_objects = []
+        add_refs = []
+        rows = []  # [(from_oid, tid, state)]
+        for oid_list in oid_lists:
             stmt = """
             SELECT zoid, tid, state
             FROM object_state
             WHERE zoid IN (%s)
             """ % oid_list
-        self.runner.run_script_stmt(cursor, stmt)
+            self.runner.run_script_stmt(cursor, stmt)
 
-        add_objects = []
-        add_refs = []
-        for from_oid, tid, state in cursor:
-            if hasattr(state, 'read'):
-                # Oracle
-                state = state.read()
-            add_objects.append((from_oid, tid))
-            if state:
-                state = str(state)
-                if use_base64:
-                    state = decodestring(state)
-                try:
-                    to_oids = get_references(state)
-                except:
-                    log.error("pre_pack: can't unpickle "
-                        "object %d in transaction %d; state length = %d" % (
-                        from_oid, tid, len(state)))
-                    raise
-                for to_oid in to_oids:
-                    add_refs.append((from_oid, tid, to_oid))
+            for from_oid, tid, state in cursor:
+                if hasattr(state, 'read'):
+                    # Oracle
+                    state = state.read()
+                add_objects.append((from_oid, tid))
+                if state:
+                    rows.append((from_oid, tid, str(state)))
+
+        for from_oid, tid, to_oids in self._find_references(
+                rows, get_references):
+            for to_oid in to_oids:
+                add_refs.append((from_oid, tid, to_oid))
 
         if not add_objects:
             return 0
 
-        stmt = "DELETE FROM object_refs_added WHERE zoid IN (%s)" % oid_list
-        self.runner.run_script_stmt(cursor, stmt)
-        stmt = "DELETE FROM object_ref WHERE zoid IN (%s)" % oid_list
-        self.runner.run_script_stmt(cursor, stmt)
+        for oid_list in oid_lists:
+            stmt = ("DELETE FROM object_refs_added WHERE zoid IN (%s)"
+                % oid_list)
+            self.runner.run_script_stmt(cursor, stmt)
+            stmt = "DELETE FROM object_ref WHERE zoid IN (%s)" % oid_list
+            self.runner.run_script_stmt(cursor, stmt)
 
         stmt = """
         INSERT INTO object_ref (zoid, tid, to_zoid) VALUES (%s, %s, %s)
@@ -1100,7 +1142,7 @@ class HistoryFreePackUndo(PackUndo):
         if stmt:
             self.runner.run_script(cursor, stmt)
 
-        self.fill_object_refs(conn, cursor, get_references)
+        self._fill_object_refs_with_pool(conn, cursor, get_references)
 
         log.info("pre_pack: filling the pack_object table")
         # Fill the pack_object table with all known OIDs.
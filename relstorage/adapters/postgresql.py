@@ -33,6 +33,7 @@ from relstorage.adapters.poller import Poller
 from relstorage.adapters.schema import PostgreSQLSchemaInstaller
 from relstorage.adapters.scriptrunner import ScriptRunner
 from relstorage.adapters.stats import PostgreSQLStats
+from relstorage.adapters.tidallocator import PostgreSQLTIDAllocator
 from relstorage.adapters.txncontrol import PostgreSQLTransactionControl
 from relstorage.options import Options
 
@@ -77,17 +78,22 @@ class PostgreSQLAdapter(object):
             runner=self.runner,
             locker=self.locker,
             keep_history=self.keep_history,
+            keep_current_state=options.keep_current_state,
             )
         self.mover = ObjectMover(
             database_type='postgresql',
             options=options,
             runner=self.runner,
+            Binary=psycopg2.Binary,
             version_detector=self.version_detector,
             )
         self.connmanager.set_on_store_opened(self.mover.on_store_opened)
+        self.connmanager.set_on_load_opened(self.mover.on_load_opened)
         self.oidallocator = PostgreSQLOIDAllocator()
+        self.tidallocator = PostgreSQLTIDAllocator()
         self.txncontrol = PostgreSQLTransactionControl(
             keep_history=self.keep_history,
+            Binary=psycopg2.Binary,
             )
 
         self.poller = Poller(
@@ -231,8 +237,14 @@ class Psycopg2ConnectionManager(AbstractConnectionManager):
             ORDER BY tid DESC
             LIMIT 1
             """
-        cursor.execute(stmt)
-        return conn, cursor
+        try:
+            cursor.execute(stmt)
+            if self.on_load_opened is not None:
+                self.on_load_opened(cursor, restart=False)
+            return conn, cursor
+        except:
+            self.close(conn, cursor)
+            raise
 
 
 class PostgreSQLVersionDetector(object):
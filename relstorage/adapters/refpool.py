@@ -0,0 +1,104 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Reference extraction in a pool of worker processes.
+"""
+
+import logging
+
+try:
+    import multiprocessing
+except ImportError:
+    # Python < 2.6
+    multiprocessing = None
+
+log = logging.getLogger(__name__)
+
+# The get_references function of a worker process.
+_get_references = None
+
+
+def _init_worker(get_references):
+    global _get_references
+    _get_references = get_references
+
+
+def find_references(row):
+    """Find the references from one object state.
+
+    row is (from_oid, tid, state).  Returns (from_oid, tid, to_oids),
+    where to_oids is the exception raised instead if the state could
+    not be unpickled.
+    """
+    from_oid, tid, state = row
+    try:
+        return from_oid, tid, _get_references(state)
+    except Exception, e:
+        return from_oid, tid, e
+
+
+def find_references_inline(get_references, rows):
+    """Find the references from object states in this process.
+
+    Yields (from_oid, tid, to_oids) for each (from_oid, tid, state).
+    """
+    for from_oid, tid, state in rows:
+        try:
+            to_oids = get_references(state)
+        except:
+            log.error("pre_pack: can't unpickle "
+                "object %d in transaction %d; state length = %d" % (
+                from_oid, tid, len(state)))
+            raise
+        yield from_oid, tid, to_oids
+
+
+class ReferenceFinderPool(object):
+    """A pool of processes that unpickle states to find references.
+
+    Used by pre-pack.  The main process downloads the states and
+    stores the references; the workers do the unpickling, which
+    holds the GIL and is usually the slowest part of pre-pack.
+    The workers are forked with the get_references function, so it
+    does not need to be picklable.
+    """
+
+    def __init__(self, workers, get_references):
+        if multiprocessing is None:
+            raise ValueError(
+                "pack-reference-workers requires Python 2.6 or later")
+        self.workers = workers
+        self._pool = multiprocessing.Pool(
+            workers, _init_worker, (get_references,))
+
+    def find(self, rows):
+        """Find the references from object states in the workers.
+
+        rows is a list of (from_oid, tid, state).  Yields
+        (from_oid, tid, to_oids) in the same order.
+        """
+        # Send each worker several chunks, so the workers finish at
+        # about the same time.
+        chunksize = max(1, len(rows) // (self.workers * 4))
+        for from_oid, tid, to_oids in self._pool.imap(
+                find_references, rows, chunksize):
+            if isinstance(to_oids, Exception):
+                log.error("pre_pack: can't unpickle "
+                    "object %d in transaction %d" % (from_oid, tid))
+                raise to_oids
+            yield from_oid, tid, to_oids
+
+    def close(self):
+        log.debug("Stopping the reference finder workers")
+        self._pool.terminate()
+        self._pool.join()
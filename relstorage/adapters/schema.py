@@ -21,8 +21,9 @@ import re
 
 # Versions of the installed stored procedures. Change these when
 # the corresponding code changes.
-oracle_package_version = '1.5A'
-postgresql_proc_version = '1.5B'
+oracle_package_version = '1.5C'
+postgresql_proc_version = '1.5D'
+mysql_proc_version = '1.5B'
 
 log = logging.getLogger("relstorage")
 
@@ -40,6 +41,24 @@ history_preserving_schema = """
     oracle:
         CREATE TABLE pack_lock (dummy CHAR);
 
+# last_tid: The most recently allocated tid.  Updated while holding
+# the commit lock, so choosing a new tid touches only this row.
+
+    postgresql:
+        CREATE TABLE last_tid (
+            tid         BIGINT NOT NULL
+        );
+
+    mysql:
+        CREATE TABLE last_tid (
+            tid         BIGINT NOT NULL
+        ) ENGINE = InnoDB;
+
+    oracle:
+        CREATE TABLE last_tid (
+            tid         NUMBER(20) NOT NULL
+        );
+
 # transaction: The list of all transactions in the database.
 
     postgresql:
@@ -397,6 +416,48 @@ history_preserving_init = """
     oracle:
         DROP SEQUENCE zoid_seq;
         CREATE SEQUENCE zoid_seq;
+
+# Reset the tid counter.
+
+    postgresql:
+        INSERT INTO last_tid (tid) VALUES (0);
+
+    mysql:
+        INSERT INTO last_tid (tid) VALUES (0);
+
+    oracle:
+        INSERT INTO last_tid (tid) VALUES (0);
+"""
+
+# current_state_script adds a copy of the current object state to
+# current_object in history-preserving databases when the
+# keep-current-state option is enabled.  Current states can then be
+# loaded without joining current_object to object_state.
+
+current_state_script = """
+    postgresql:
+        ALTER TABLE current_object ADD COLUMN state BYTEA;
+        UPDATE current_object SET state = (
+            SELECT state
+            FROM object_state
+            WHERE object_state.zoid = current_object.zoid
+                AND object_state.tid = current_object.tid
+        );
+
+    mysql:
+        ALTER TABLE current_object ADD COLUMN state LONGBLOB;
+        UPDATE current_object
+            JOIN object_state USING (zoid, tid)
+        SET current_object.state = object_state.state;
+
+    oracle:
+        ALTER TABLE current_object ADD (state BLOB);
+        UPDATE current_object SET state = (
+            SELECT state
+            FROM object_state
+            WHERE object_state.zoid = current_object.zoid
+                AND object_state.tid = current_object.tid
+        );
 """
 
 postgresql_procedures = """
@@ -431,6 +492,240 @@ AS $temp_blob_chunk_delete_trigger$
         RETURN OLD;
     END;
 $temp_blob_chunk_delete_trigger$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION relstorage_vote(
+    p_tid_min BIGINT,
+    p_username BYTEA,
+    p_description BYTEA,
+    p_extension BYTEA,
+    p_has_blobs BOOLEAN,
+    p_keep_history BOOLEAN,
+    p_keep_current_state BOOLEAN,
+    OUT r_tid BIGINT,
+    OUT r_zoid BIGINT,
+    OUT r_prev_tid BIGINT,
+    OUT r_attempted_prev_tid BIGINT,
+    OUT r_state BYTEA) RETURNS SETOF RECORD
+AS $relstorage_vote$
+    -- Version: %(postgresql_proc_version)s
+    -- Take the commit lock, detect conflicts, choose a tid, move the
+    -- objects out of temp_store and update the current object pointers.
+    -- If there are conflicts, changes nothing and returns a row with
+    -- a null tid for each conflict.  Otherwise returns a row with
+    -- the new tid followed by a row for each stored object.
+    DECLARE
+        has_conflicts BOOLEAN := FALSE;
+    BEGIN
+        LOCK TABLE commit_lock IN EXCLUSIVE MODE;
+        IF p_keep_history THEN
+            LOCK TABLE transaction IN SHARE MODE;
+            LOCK TABLE current_object IN SHARE MODE;
+            FOR r_zoid, r_prev_tid, r_attempted_prev_tid, r_state IN
+                SELECT temp_store.zoid, current_object.tid,
+                    temp_store.prev_tid, temp_store.state
+                FROM temp_store
+                    JOIN current_object ON (
+                        temp_store.zoid = current_object.zoid)
+                WHERE temp_store.prev_tid != current_object.tid
+            LOOP
+                has_conflicts := TRUE;
+                RETURN NEXT;
+            END LOOP;
+        ELSE
+            LOCK TABLE object_state IN SHARE MODE;
+            FOR r_zoid, r_prev_tid, r_attempted_prev_tid, r_state IN
+                SELECT temp_store.zoid, object_state.tid,
+                    temp_store.prev_tid, temp_store.state
+                FROM temp_store
+                    JOIN object_state ON (temp_store.zoid = object_state.zoid)
+                WHERE temp_store.prev_tid != object_state.tid
+            LOOP
+                has_conflicts := TRUE;
+                RETURN NEXT;
+            END LOOP;
+        END IF;
+        IF has_conflicts THEN
+            RETURN;
+        END IF;
+        r_zoid := NULL;
+        r_prev_tid := NULL;
+        r_attempted_prev_tid := NULL;
+        r_state := NULL;
+
+        -- Choose a tid greater than any existing tid.
+        UPDATE last_tid SET tid = GREATEST(tid + 1, p_tid_min)
+        RETURNING tid INTO r_tid;
+
+        IF p_keep_history THEN
+            INSERT INTO transaction
+                (tid, packed, username, description, extension)
+            VALUES (r_tid, FALSE, p_username, p_description, p_extension);
+
+            INSERT INTO object_state
+                (zoid, tid, prev_tid, md5, state_size, state)
+            SELECT zoid, r_tid, prev_tid, md5,
+                COALESCE(LENGTH(state), 0), state
+            FROM temp_store;
+        ELSE
+            DELETE FROM object_state
+            WHERE zoid IN (SELECT zoid FROM temp_store);
+
+            INSERT INTO object_state (zoid, tid, state_size, state)
+            SELECT zoid, r_tid, COALESCE(LENGTH(state), 0), state
+            FROM temp_store;
+        END IF;
+
+        IF p_has_blobs THEN
+            IF NOT p_keep_history THEN
+                DELETE FROM blob_chunk
+                WHERE zoid IN (SELECT zoid FROM temp_store);
+            END IF;
+            INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+            SELECT zoid, r_tid, chunk_num, chunk
+            FROM temp_blob_chunk;
+        END IF;
+
+        IF p_keep_history AND p_keep_current_state THEN
+            INSERT INTO current_object (zoid, tid, state)
+            SELECT zoid, tid, state FROM object_state
+            WHERE tid = r_tid
+                AND prev_tid = 0;
+
+            UPDATE current_object SET tid = r_tid, state = (
+                SELECT state FROM object_state
+                WHERE zoid = current_object.zoid
+                    AND tid = r_tid
+            )
+            WHERE zoid IN (
+                SELECT zoid FROM object_state
+                WHERE tid = r_tid
+                    AND prev_tid != 0
+                ORDER BY zoid
+            );
+        ELSIF p_keep_history THEN
+            INSERT INTO current_object (zoid, tid)
+            SELECT zoid, tid FROM object_state
+            WHERE tid = r_tid
+                AND prev_tid = 0;
+
+            UPDATE current_object SET tid = r_tid
+            WHERE zoid IN (
+                SELECT zoid FROM object_state
+                WHERE tid = r_tid
+                    AND prev_tid != 0
+                ORDER BY zoid
+            );
+        END IF;
+
+        RETURN NEXT;
+        FOR r_zoid IN SELECT zoid FROM temp_store LOOP
+            RETURN NEXT;
+        END LOOP;
+        RETURN;
+    END;
+$relstorage_vote$ LANGUAGE plpgsql;
+""" % globals()
+
+mysql_procedures = """
+CREATE PROCEDURE relstorage_vote(
+    IN p_tid_min BIGINT UNSIGNED,
+    IN p_username BLOB,
+    IN p_description BLOB,
+    IN p_extension BLOB,
+    IN p_has_blobs BOOLEAN,
+    IN p_keep_history BOOLEAN,
+    IN p_keep_current_state BOOLEAN,
+    IN p_lock_timeout INTEGER)
+COMMENT 'Version: %(mysql_proc_version)s'
+BEGIN
+    -- Take the commit lock, detect conflicts, choose a tid, move the
+    -- objects out of temp_store and update the current object pointers.
+    -- Returns the same rows as the PostgreSQL relstorage_vote function,
+    -- or a single row of nulls if the commit lock is not available.
+    DECLARE v_lock VARCHAR(255) DEFAULT CONCAT(DATABASE(), '.commit');
+    DECLARE v_tid BIGINT UNSIGNED;
+    DECLARE v_conflicts INTEGER;
+
+    IF NOT (IS_USED_LOCK(v_lock) <=> CONNECTION_ID()) THEN
+        IF NOT COALESCE(GET_LOCK(v_lock, p_lock_timeout), 0) THEN
+            SELECT NULL, NULL, NULL, NULL, NULL;
+        END IF;
+    END IF;
+
+    IF IS_USED_LOCK(v_lock) <=> CONNECTION_ID() THEN
+        IF p_keep_history THEN
+            SELECT COUNT(*) INTO v_conflicts
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid
+            LOCK IN SHARE MODE;
+        ELSE
+            SELECT COUNT(*) INTO v_conflicts
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid
+            LOCK IN SHARE MODE;
+        END IF;
+
+        IF v_conflicts AND p_keep_history THEN
+            SELECT NULL, temp_store.zoid, current_object.tid,
+                temp_store.prev_tid, temp_store.state
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid;
+        ELSEIF v_conflicts THEN
+            SELECT NULL, temp_store.zoid, object_state.tid,
+                temp_store.prev_tid, temp_store.state
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid;
+        ELSE
+            -- Choose a tid greater than any existing tid.
+            UPDATE last_tid SET tid = GREATEST(tid + 1, p_tid_min);
+            SELECT tid INTO v_tid FROM last_tid;
+
+            IF p_keep_history THEN
+                INSERT INTO transaction
+                    (tid, packed, username, description, extension)
+                VALUES (v_tid, FALSE, p_username, p_description, p_extension);
+
+                INSERT INTO object_state
+                    (zoid, tid, prev_tid, md5, state_size, state)
+                SELECT zoid, v_tid, prev_tid, md5,
+                    COALESCE(LENGTH(state), 0), state
+                FROM temp_store;
+            ELSE
+                REPLACE INTO object_state (zoid, tid, state_size, state)
+                SELECT zoid, v_tid, COALESCE(LENGTH(state), 0), state
+                FROM temp_store;
+            END IF;
+
+            IF p_has_blobs THEN
+                IF NOT p_keep_history THEN
+                    DELETE FROM blob_chunk
+                    WHERE zoid IN (SELECT zoid FROM temp_store);
+                END IF;
+                INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+                SELECT zoid, v_tid, chunk_num, chunk
+                FROM temp_blob_chunk;
+            END IF;
+
+            IF p_keep_history AND p_keep_current_state THEN
+                REPLACE INTO current_object (zoid, tid, state)
+                SELECT zoid, tid, state FROM object_state
+                WHERE tid = v_tid;
+            ELSEIF p_keep_history THEN
+                REPLACE INTO current_object (zoid, tid)
+                SELECT zoid, tid FROM object_state
+                WHERE tid = v_tid;
+            END IF;
+
+            SELECT v_tid, NULL, NULL, NULL, NULL
+            UNION ALL
+            SELECT v_tid, zoid, NULL, NULL, NULL FROM temp_store;
+        END IF;
+    END IF;
+END
 """ % globals()
 
 oracle_history_preserving_package = """
@@ -448,6 +743,14 @@ CREATE OR REPLACE PACKAGE relstorage_op AS
         tids IN numlist,
         md5s IN md5list,
         states IN statelist);
+    PROCEDURE vote(
+        p_tid_min IN NUMBER,
+        p_username IN RAW,
+        p_description IN RAW,
+        p_extension IN RAW,
+        p_has_blobs IN NUMBER,
+        p_keep_current_state IN NUMBER,
+        p_results OUT SYS_REFCURSOR);
 END relstorage_op;
 /
 
@@ -485,6 +788,97 @@ CREATE OR REPLACE PACKAGE BODY relstorage_op AS
                         WHERE zoid = zoids(indx)), 0),
                 md5s(indx), COALESCE(LENGTH(states(indx)), 0), states(indx));
     END restore;
+
+    PROCEDURE vote(
+        p_tid_min IN NUMBER,
+        p_username IN RAW,
+        p_description IN RAW,
+        p_extension IN RAW,
+        p_has_blobs IN NUMBER,
+        p_keep_current_state IN NUMBER,
+        p_results OUT SYS_REFCURSOR) IS
+        conflicts NUMBER;
+        new_tid NUMBER(20);
+    BEGIN
+        -- The caller holds the commit lock.  Detect conflicts, choose
+        -- a tid, move the objects out of temp_store and update the
+        -- current object pointers.  Opens p_results with the same rows
+        -- as the PostgreSQL relstorage_vote function.
+        LOCK TABLE transaction IN SHARE MODE;
+        LOCK TABLE current_object IN SHARE MODE;
+
+        SELECT COUNT(*) INTO conflicts
+        FROM temp_store
+            JOIN current_object ON (temp_store.zoid = current_object.zoid)
+        WHERE temp_store.prev_tid != current_object.tid;
+
+        IF conflicts > 0 THEN
+            OPEN p_results FOR
+            SELECT NULL, temp_store.zoid, current_object.tid,
+                temp_store.prev_tid, temp_store.state
+            FROM temp_store
+                JOIN current_object ON (temp_store.zoid = current_object.zoid)
+            WHERE temp_store.prev_tid != current_object.tid;
+            RETURN;
+        END IF;
+
+        UPDATE last_tid SET tid = GREATEST(tid + 1, p_tid_min)
+        RETURNING tid INTO new_tid;
+
+        INSERT INTO transaction
+            (tid, packed, username, description, extension)
+        VALUES (new_tid, 'N', p_username, p_description, p_extension);
+
+        INSERT INTO object_state
+            (zoid, tid, prev_tid, md5, state_size, state)
+        SELECT zoid, new_tid, prev_tid, md5,
+            COALESCE(LENGTH(state), 0), state
+        FROM temp_store;
+
+        IF p_has_blobs = 1 THEN
+            INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+            SELECT zoid, new_tid, chunk_num, chunk
+            FROM temp_blob_chunk;
+        END IF;
+
+        IF p_keep_current_state = 1 THEN
+            -- current_object.state exists only when the
+            -- keep-current-state option is enabled.
+            EXECUTE IMMEDIATE '
+                INSERT INTO current_object (zoid, tid, state)
+                SELECT zoid, tid, state FROM object_state
+                WHERE tid = :1
+                    AND prev_tid = 0' USING new_tid;
+            EXECUTE IMMEDIATE '
+                UPDATE current_object SET tid = :1, state = (
+                    SELECT state FROM object_state
+                    WHERE zoid = current_object.zoid
+                        AND tid = :2
+                )
+                WHERE zoid IN (
+                    SELECT zoid FROM object_state
+                    WHERE tid = :3
+                        AND prev_tid != 0
+                )' USING new_tid, new_tid, new_tid;
+        ELSE
+            INSERT INTO current_object (zoid, tid)
+            SELECT zoid, tid FROM object_state
+            WHERE tid = new_tid
+                AND prev_tid = 0;
+
+            UPDATE current_object SET tid = new_tid
+            WHERE zoid IN (
+                SELECT zoid FROM object_state
+                WHERE tid = new_tid
+                    AND prev_tid != 0
+            );
+        END IF;
+
+        OPEN p_results FOR
+        SELECT new_tid, NULL, NULL, NULL, NULL FROM DUAL
+        UNION ALL
+        SELECT new_tid, zoid, NULL, NULL, NULL FROM temp_store;
+    END vote;
 END relstorage_op;
 /
 """ % globals()
@@ -504,6 +898,24 @@ history_free_schema = """
     oracle:
         CREATE TABLE pack_lock (dummy CHAR);
 
+# last_tid: The most recently allocated tid.  Updated while holding
+# the commit lock, so choosing a new tid touches only this row.
+
+    postgresql:
+        CREATE TABLE last_tid (
+            tid         BIGINT NOT NULL
+        );
+
+    mysql:
+        CREATE TABLE last_tid (
+            tid         BIGINT NOT NULL
+        ) ENGINE = InnoDB;
+
+    oracle:
+        CREATE TABLE last_tid (
+            tid         NUMBER(20) NOT NULL
+        );
+
 # OID allocation
 
     postgresql:
@@ -712,6 +1124,17 @@ history_free_init = """
     oracle:
         DROP SEQUENCE zoid_seq;
         CREATE SEQUENCE zoid_seq;
+
+# Reset the tid counter.
+
+    postgresql:
+        INSERT INTO last_tid (tid) VALUES (0);
+
+    mysql:
+        INSERT INTO last_tid (tid) VALUES (0);
+
+    oracle:
+        INSERT INTO last_tid (tid) VALUES (0);
 """
 
 oracle_history_free_package = """
@@ -728,6 +1151,14 @@ CREATE OR REPLACE PACKAGE relstorage_op AS
         zoids IN numlist,
         tids IN numlist,
         states IN statelist);
+    PROCEDURE vote(
+        p_tid_min IN NUMBER,
+        p_username IN RAW,
+        p_description IN RAW,
+        p_extension IN RAW,
+        p_has_blobs IN NUMBER,
+        p_keep_current_state IN NUMBER,
+        p_results OUT SYS_REFCURSOR);
 END relstorage_op;
 /
 
@@ -760,6 +1191,69 @@ CREATE OR REPLACE PACKAGE BODY relstorage_op AS
                 COALESCE(LENGTH(states(indx)), 0),
                 states(indx));
     END restore;
+
+    PROCEDURE vote(
+        p_tid_min IN NUMBER,
+        p_username IN RAW,
+        p_description IN RAW,
+        p_extension IN RAW,
+        p_has_blobs IN NUMBER,
+        p_keep_current_state IN NUMBER,
+        p_results OUT SYS_REFCURSOR) IS
+        conflicts NUMBER;
+        new_tid NUMBER(20);
+    BEGIN
+        -- The caller holds the commit lock.  Detect conflicts, choose
+        -- a tid and move the objects out of temp_store.  Opens
+        -- p_results with the same rows as the PostgreSQL
+        -- relstorage_vote function.  History-free databases do not
+        -- record the transaction metadata.
+        LOCK TABLE object_state IN SHARE MODE;
+
+        SELECT COUNT(*) INTO conflicts
+        FROM temp_store
+            JOIN object_state ON (temp_store.zoid = object_state.zoid)
+        WHERE temp_store.prev_tid != object_state.tid;
+
+        IF conflicts > 0 THEN
+            OPEN p_results FOR
+            SELECT NULL, temp_store.zoid, object_state.tid,
+                temp_store.prev_tid, temp_store.state
+            FROM temp_store
+                JOIN object_state ON (temp_store.zoid = object_state.zoid)
+            WHERE temp_store.prev_tid != object_state.tid;
+            RETURN;
+        END IF;
+
+        UPDATE last_tid SET tid = GREATEST(tid + 1, p_tid_min)
+        RETURNING tid INTO new_tid;
+
+        MERGE INTO object_state
+        USING (
+            SELECT zoid, COALESCE(LENGTH(state), 0) AS state_size, state
+            FROM temp_store
+        ) temp
+        ON (object_state.zoid = temp.zoid)
+        WHEN MATCHED THEN UPDATE SET
+            tid = new_tid,
+            state_size = temp.state_size,
+            state = temp.state
+        WHEN NOT MATCHED THEN INSERT (zoid, tid, state_size, state)
+            VALUES (temp.zoid, new_tid, temp.state_size, temp.state);
+
+        IF p_has_blobs = 1 THEN
+            DELETE FROM blob_chunk
+            WHERE zoid IN (SELECT zoid FROM temp_store);
+            INSERT INTO blob_chunk (zoid, tid, chunk_num, chunk)
+            SELECT zoid, new_tid, chunk_num, chunk
+            FROM temp_blob_chunk;
+        END IF;
+
+        OPEN p_results FOR
+        SELECT new_tid, NULL, NULL, NULL, NULL FROM DUAL
+        UNION ALL
+        SELECT new_tid, zoid, NULL, NULL, NULL FROM temp_store;
+    END vote;
 END relstorage_op;
 /
 """ % globals()
@@ -800,6 +1294,7 @@ class AbstractSchemaInstaller(object):
     all_tables = (
         'commit_lock',
         'pack_lock',
+        'last_tid',
         'transaction',
         'new_oid',
         'object_state',
@@ -818,10 +1313,12 @@ class AbstractSchemaInstaller(object):
 
     database_type = None  # provided by a subclass
 
-    def __init__(self, connmanager, runner, keep_history):
+    def __init__(self, connmanager, runner, keep_history,
+            keep_current_state=False):
         self.connmanager = connmanager
         self.runner = runner
         self.keep_history = keep_history
+        self.keep_current_state = keep_history and keep_current_state
         if keep_history:
             self.schema_script = history_preserving_schema
             self.init_script = history_preserving_init
@@ -835,6 +1332,10 @@ class AbstractSchemaInstaller(object):
     def list_sequences(self, cursor):
         raise NotImplementedError()
 
+    def list_columns(self, cursor, table):
+        """Returns the lower case column names of a table."""
+        raise NotImplementedError()
+
     def get_database_name(self, cursor):
         raise NotImplementedError()
 
@@ -844,6 +1345,8 @@ class AbstractSchemaInstaller(object):
         self.runner.run_script(cursor, script)
         script = filter_script(self.init_script, self.database_type)
         self.runner.run_script(cursor, script)
+        if self.keep_current_state:
+            self.add_current_state(cursor)
         tables = self.list_tables(cursor)
         self.check_compatibility(cursor, tables)
 
@@ -866,6 +1369,15 @@ class AbstractSchemaInstaller(object):
                     "can not connect to a history-free database. "
                     "If you need to convert, use the zodbconvert utility."
                 )
+            if (not self.keep_current_state
+                    and 'current_object' in tables
+                    and 'state' in self.list_columns(cursor, 'current_object')):
+                raise StorageError(
+                    "Schema mismatch: the current_object table contains "
+                    "object states, but the keep-current-state option "
+                    "is not enabled. Enable the option or drop the "
+                    "current_object.state column."
+                )
         else:
             if 'transaction' in tables and 'current_object' in tables:
                 raise StorageError(
@@ -874,7 +1386,16 @@ class AbstractSchemaInstaller(object):
                     "If you need to convert, use the zodbconvert utility."
                 )
 
+    def add_current_state(self, cursor):
+        """Add the state column to current_object and fill it."""
+        log.info("Adding the state column to the current_object table")
+        script = filter_script(current_state_script, self.database_type)
+        self.runner.run_script(cursor, script)
+
     def update_schema(self, cursor, tables):
+        if (self.keep_current_state
+                and 'state' not in self.list_columns(cursor, 'current_object')):
+            self.add_current_state(cursor)
         if not 'blob_chunk' in tables:
             # Add the blob_chunk table (RelStorage 1.5+)
             script = filter_script(
@@ -883,6 +1404,24 @@ class AbstractSchemaInstaller(object):
                 '\s+(temp_)?blob_chunk')
             script = filter_statements(script, re.compile(expr, re.I))
             self.runner.run_script(cursor, script)
+        if not 'last_tid' in tables:
+            # Add the last_tid table (RelStorage 1.5+)
+            script = filter_script(
+                self.schema_script, self.database_type)
+            expr = r'CREATE\s+TABLE\s+last_tid'
+            script = filter_statements(script, re.compile(expr, re.I))
+            self.runner.run_script(cursor, script)
+            if self.keep_history:
+                table = 'transaction'
+            else:
+                table = 'object_state'
+            cursor.execute(
+                "INSERT INTO last_tid (tid) SELECT COALESCE(MAX(tid), 0) "
+                "FROM %s" % table)
+            log.warning(
+                "Added the last_tid table.  RelStorage versions before "
+                "1.5 do not update it, so they must not commit to this "
+                "database any more.")
 
     def zap_all(self):
         """Clear all data out of the database."""
@@ -925,9 +1464,10 @@ class PostgreSQLSchemaInstaller(AbstractSchemaInstaller):
 
     database_type = 'postgresql'
 
-    def __init__(self, connmanager, runner, locker, keep_history):
+    def __init__(self, connmanager, runner, locker, keep_history,
+            keep_current_state=False):
         super(PostgreSQLSchemaInstaller, self).__init__(
-            connmanager, runner, keep_history)
+            connmanager, runner, keep_history, keep_current_state)
         self.locker = locker
 
     def get_database_name(self, cursor):
@@ -972,6 +1512,16 @@ class PostgreSQLSchemaInstaller(AbstractSchemaInstaller):
         cursor.execute("SELECT relname FROM pg_class WHERE relkind = 'S'")
         return [name for (name,) in cursor]
 
+    def list_columns(self, cursor, table):
+        stmt = """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+            AND table_name = %s
+        """
+        cursor.execute(stmt, (table,))
+        return [name.lower() for (name,) in cursor]
+
     def list_languages(self, cursor):
         cursor.execute("SELECT lanname FROM pg_catalog.pg_language")
         return [name for (name,) in cursor]
@@ -1008,6 +1558,7 @@ class PostgreSQLSchemaInstaller(AbstractSchemaInstaller):
         expect = [
             'blob_chunk_delete_trigger',
             'temp_blob_chunk_delete_trigger',
+            'relstorage_vote',
         ]
         current_procs = self.list_procedures(cursor)
         for proc in expect:
@@ -1047,11 +1598,63 @@ class MySQLSchemaInstaller(AbstractSchemaInstaller):
 
     database_type = 'mysql'
 
+    def __init__(self, connmanager, runner, keep_history,
+            keep_current_state=False, commit_procedure=False):
+        super(MySQLSchemaInstaller, self).__init__(
+            connmanager, runner, keep_history, keep_current_state)
+        self.commit_procedure = commit_procedure
+
     def get_database_name(self, cursor):
         cursor.execute("SELECT DATABASE()")
         for (name,) in cursor:
             return name
 
+    def prepare(self):
+        """Create the database schema if it does not already exist."""
+        def callback(conn, cursor):
+            tables = self.list_tables(cursor)
+            if not 'object_state' in tables:
+                self.create(cursor)
+            else:
+                self.check_compatibility(cursor, tables)
+                self.update_schema(cursor, tables)
+
+            # The stored procedure is optional because creating it
+            # requires the CREATE ROUTINE privilege.
+            if self.commit_procedure:
+                procs = self.list_procedures(cursor)
+                if procs.get('relstorage_vote') != mysql_proc_version:
+                    self.install_procedures(cursor)
+                    procs = self.list_procedures(cursor)
+                    if procs.get('relstorage_vote') != mysql_proc_version:
+                        raise AssertionError(
+                            "Could not get version information after "
+                            "installing the stored procedures.")
+
+        self.connmanager.open_and_call(callback)
+
+    def list_procedures(self, cursor):
+        """Returns {procedure name: version}.  version may be None."""
+        stmt = """
+        SELECT routine_name, routine_comment
+        FROM information_schema.routines
+        WHERE routine_schema = DATABASE()
+        """
+        cursor.execute(stmt)
+        res = {}
+        for (name, comment) in cursor:
+            version = None
+            match = re.search(r'Version:\s*([0-9a-zA-Z.]+)', comment or '')
+            if match is not None:
+                version = match.group(1)
+            res[name.lower()] = version
+        return res
+
+    def install_procedures(self, cursor):
+        """Install the stored procedures"""
+        cursor.execute("DROP PROCEDURE IF EXISTS relstorage_vote")
+        cursor.execute(mysql_procedures)
+
     def list_tables(self, cursor):
         cursor.execute("SHOW TABLES")
         return [name for (name,) in cursor]
@@ -1059,6 +1662,10 @@ class MySQLSchemaInstaller(AbstractSchemaInstaller):
     def list_sequences(self, cursor):
         return []
 
+    def list_columns(self, cursor, table):
+        cursor.execute("SHOW COLUMNS FROM %s" % table)
+        return [row[0].lower() for row in cursor]
+
     def check_compatibility(self, cursor, tables):
         super(MySQLSchemaInstaller, self).check_compatibility(cursor, tables)
         stmt = "SHOW TABLE STATUS LIKE 'object_state'"
@@ -1122,6 +1729,15 @@ class OracleSchemaInstaller(AbstractSchemaInstaller):
         cursor.execute("SELECT sequence_name FROM user_sequences")
         return [name.lower() for (name,) in cursor]
 
+    def list_columns(self, cursor, table):
+        stmt = """
+        SELECT column_name
+        FROM user_tab_columns
+        WHERE table_name = :1
+        """
+        cursor.execute(stmt, (table.upper(),))
+        return [name.lower() for (name,) in cursor]
+
     def list_packages(self, cursor):
         """List installed stored procedure packages.
 
@@ -192,6 +192,88 @@ class PostgreSQLRowBatcherTests(unittest.TestCase):
             ('INSERT INTO mytable (id, name) VALUES (%s, id || %s)', (2, 'b'))
             ])
 
+    def test_copy_into_below_threshold(self):
+        cursor = MockCursor()
+        batcher = self.getClass()(cursor, MockVersionDetector())
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (1, 'a'), size=1, insert_row=(1, 'A'))
+        batcher.flush()
+        self.assertEqual(cursor.executed, [
+            ('DELETE FROM mytable WHERE id IN (1)', None),
+            ('INSERT INTO mytable (id, name) VALUES\n(%s, %s)', (1, 'A')),
+            ])
+        self.assertEqual(cursor.copied, [])
+
+    def test_copy_into_above_threshold(self):
+        from relstorage.adapters.batch import postgresql_copy_header
+        from relstorage.adapters.batch import postgresql_copy_trailer
+        import struct
+        cursor = MockCursor()
+        batcher = self.getClass()(cursor, MockVersionDetector())
+        batcher.copy_threshold = 1
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (1, 'a'), size=1)
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (2, 'b'), size=1)
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (1, None), size=1)
+        self.assertEqual(cursor.copied, [])
+        batcher.flush()
+        self.assertEqual(cursor.executed, [
+            ('DELETE FROM mytable WHERE id IN (1)', None),
+            ('INSERT INTO mytable (id, name) VALUES\n(%s, %s)', (1, 'a')),
+            ('DELETE FROM mytable WHERE id = ANY(%s)', ([1, 2],)),
+            ])
+        expect = (postgresql_copy_header
+            + struct.pack('!hiqi', 2, 8, 1, -1)
+            + struct.pack('!hiqi', 2, 8, 2, 1) + 'b'
+            + postgresql_copy_trailer)
+        self.assertEqual(cursor.copied, [
+            ('COPY mytable (id, name) FROM STDIN WITH BINARY', expect),
+            ])
+
+    def test_delete_array(self):
+        cursor = MockCursor()
+        batcher = self.getClass()(cursor, MockVersionDetector((9, 4)))
+        batcher.delete_from('mytable', id=2)
+        batcher.delete_from('mytable', id=1)
+        batcher.delete_from('mytable', id=1, tid=5)
+        batcher.flush()
+        self.assertEqual(cursor.executed, [
+            ('DELETE FROM mytable WHERE id = ANY(%s)', ([1, 2],)),
+            ('DELETE FROM mytable WHERE id = 1 AND tid = 5', None),
+            ])
+
+    def test_copy_into_array(self):
+        cursor = MockCursor()
+        batcher = self.getClass()(cursor, MockVersionDetector((9, 4)))
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (2, 'b'), size=1)
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (1, 'a'), size=1)
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (2, 'c'), size=1)
+        self.assertEqual(cursor.executed, [])
+        batcher.flush()
+        self.assertEqual(cursor.executed, [
+            ('DELETE FROM mytable WHERE id = ANY(%s)', ([1, 2],)),
+            ('INSERT INTO mytable (id, name) SELECT * FROM '
+                'unnest(%s::bigint[], %s::text[])', ([1, 2], ['a', 'c'])),
+            ])
+
+    def test_copy_into_size_limit(self):
+        cursor = MockCursor()
+        batcher = self.getClass()(cursor, MockVersionDetector())
+        batcher.copy_threshold = 0
+        batcher.copy_size_limit = 10
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (1, 'a'), size=5)
+        self.assertEqual(cursor.copied, [])
+        batcher.copy_into('mytable', ('id', 'name'), ('bigint', 'text'),
+            (2, 'b'), size=5)
+        self.assertEqual(len(cursor.copied), 1)
+        self.assertEqual(batcher.copies, {})
+
 
 class OracleRowBatcherTests(unittest.TestCase):
 
@@ -294,10 +376,19 @@ class OracleRowBatcherTests(unittest.TestCase):
             })
 
 
+class MockVersionDetector:
+    def __init__(self, version=(8, 4)):
+        self.version = version
+    def get_version(self, cursor):
+        return self.version
+
 class MockCursor:
     def __init__(self):
         self.executed = []
+        self.copied = []
         self.inputsizes = {}
+    def copy_expert(self, stmt, f):
+        self.copied.append((stmt, f.read()))
     def setinputsizes(self, **kw):
         self.inputsizes.update(kw)
     def execute(self, stmt, params=None):
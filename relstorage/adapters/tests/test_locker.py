@@ -0,0 +1,58 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+class MockOptions:
+    keep_history = True
+    commit_lock_timeout = 30
+    commit_lock_id = 0
+
+class MockCursor:
+    def __init__(self):
+        self.executed = []
+    def execute(self, stmt):
+        self.executed.append(stmt)
+
+
+class LockerTests(unittest.TestCase):
+
+    def _makeOne(self, available):
+        from relstorage.adapters.locker import Locker
+        class DummyLocker(Locker):
+            def hold_commit_lock(self, cursor, ensure_current=False,
+                    nowait=False):
+                return available
+        return DummyLocker(MockOptions(), ())
+
+    def test_commit_lock_after_objects_acquired(self):
+        locker = self._makeOne(True)
+        cursor = MockCursor()
+        self.assertTrue(locker.hold_commit_lock_after_objects(cursor, 1.0))
+        self.assertEqual(cursor.executed, ["SAVEPOINT commit_lock"])
+
+    def test_commit_lock_after_objects_busy(self):
+        locker = self._makeOne(False)
+        cursor = MockCursor()
+        self.assertFalse(locker.hold_commit_lock_after_objects(cursor, 0.0))
+        self.assertEqual(cursor.executed, [
+            "SAVEPOINT commit_lock",
+            "ROLLBACK TO SAVEPOINT lock_objects",
+            ])
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(LockerTests))
+    return suite
@@ -0,0 +1,129 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+def get_references(state):
+    if state == 'bad':
+        raise ValueError("can't unpickle")
+    return set(int(oid) for oid in state.split(','))
+
+class FindReferencesInlineTests(unittest.TestCase):
+
+    def test_find(self):
+        from relstorage.adapters.refpool import find_references_inline
+        rows = [(1, 5, '2,3'), (2, 5, '3')]
+        self.assertEqual(list(find_references_inline(get_references, rows)),
+            [(1, 5, set([2, 3])), (2, 5, set([3]))])
+
+    def test_unpicklable(self):
+        from relstorage.adapters.refpool import find_references_inline
+        rows = [(1, 5, 'bad')]
+        self.assertRaises(ValueError,
+            list, find_references_inline(get_references, rows))
+
+
+class ReferenceFinderPoolTests(unittest.TestCase):
+
+    def _makeOne(self):
+        from relstorage.adapters.refpool import ReferenceFinderPool
+        return ReferenceFinderPool(2, get_references)
+
+    def test_find(self):
+        pool = self._makeOne()
+        try:
+            rows = [(oid, 5, '%d,%d' % (oid + 1, oid + 2))
+                for oid in range(1, 200)]
+            results = list(pool.find(rows))
+        finally:
+            pool.close()
+        self.assertEqual(results,
+            [(oid, 5, set([oid + 1, oid + 2])) for oid in range(1, 200)])
+
+    def test_unpicklable(self):
+        pool = self._makeOne()
+        try:
+            rows = [(1, 5, '2'), (2, 5, 'bad')]
+            self.assertRaises(ValueError, list, pool.find(rows))
+        finally:
+            pool.close()
+
+
+class AddRefsForOidsTests(unittest.TestCase):
+
+    def test_in_lists_split(self):
+        from relstorage.adapters.packundo import HistoryFreePackUndo
+        stmts = []
+        inserted = []
+        class DummyCursor:
+            rows = []
+            def __iter__(self):
+                return iter(self.rows)
+        class DummyRunner:
+            def run_script_stmt(self, cursor, stmt):
+                stmts.append(stmt)
+                if 'SELECT' in stmt:
+                    start = stmt.index('IN (') + 4
+                    oids = stmt[start:stmt.index(')', start)].split(',')
+                    cursor.rows = [(int(oid), 5, '1') for oid in oids]
+            def run_many(self, cursor, stmt, items):
+                inserted.append(items)
+        packundo = HistoryFreePackUndo(None, None, DummyRunner(), None, None)
+        packundo.in_list_size = 3
+        count = packundo._add_refs_for_oids(
+            DummyCursor(), range(10, 17), get_references)
+        self.assertEqual(count, 7)
+        # 3 IN lists, each used by a SELECT and 2 DELETEs.
+        self.assertEqual(len(stmts), 9)
+        for stmt in stmts:
+            start = stmt.index('IN (') + 4
+            in_list = stmt[start:stmt.index(')', start)]
+            self.assertTrue(len(in_list.split(',')) <= 3)
+        self.assertEqual(inserted[1], [(oid, 5) for oid in range(10, 17)])
+
+
+class AddRefsForTidsTests(unittest.TestCase):
+
+    def test_many_transactions(self):
+        from relstorage.adapters.packundo import HistoryPreservingPackUndo
+        stmts = []
+        inserted = []
+        class DummyCursor:
+            rows = [(1, 5, '2,3'), (2, 5, '3'), (1, 6, '4'), (4, 7, None)]
+            def __iter__(self):
+                return iter(self.rows)
+        class DummyRunner:
+            def run_script_stmt(self, cursor, stmt):
+                stmts.append(stmt)
+            def run_many(self, cursor, stmt, items):
+                inserted.append(items)
+        packundo = HistoryPreservingPackUndo(
+            None, None, DummyRunner(), None, None)
+        count = packundo._add_refs_for_tids(
+            DummyCursor(), [5, 6, 7], get_references)
+        self.assertEqual(count, 3)
+        self.assertEqual(len(stmts), 2)
+        self.assertTrue('IN (5,6,7)' in stmts[0])
+        self.assertTrue('IN (5,6,7)' in stmts[1])
+        self.assertEqual(sorted(inserted[0]),
+            [(1, 5, 2), (1, 5, 3), (1, 6, 4), (2, 5, 3)])
+        self.assertEqual(inserted[1], [(5,), (6,), (7,)])
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for klass in (FindReferencesInlineTests, ReferenceFinderPoolTests,
+            AddRefsForOidsTests, AddRefsForTidsTests):
+        suite.addTest(unittest.makeSuite(klass))
+    return suite
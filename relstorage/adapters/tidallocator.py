@@ -0,0 +1,87 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""ITIDAllocator implementations.
+"""
+
+# All of these allocators keep the most recently allocated tid in the
+# single row of the last_tid table.  The row is updated while holding
+# the commit lock, in the same database transaction as the commit, so
+# a rolled back commit also rolls back its tid.  Choosing a tid is
+# then a single-row update rather than a search of the transaction
+# or object_state table.  This relies on every client of the database
+# updating the row; RelStorage versions before 1.5 do not, so they
+# must not share a database with these allocators.
+
+from relstorage.adapters.interfaces import ITIDAllocator
+from zope.interface import implements
+
+class PostgreSQLTIDAllocator(object):
+    implements(ITIDAllocator)
+
+    def new_tid(self, cursor, tid_min):
+        """Return a new tid greater than any existing tid."""
+        stmt = """
+        UPDATE last_tid SET tid = GREATEST(tid + 1, %s)
+        RETURNING tid
+        """
+        cursor.execute(stmt, (tid_min,))
+        return cursor.fetchone()[0]
+
+    def set_min_tid(self, cursor, tid):
+        """Ensure the next tid is greater than the given tid."""
+        stmt = "UPDATE last_tid SET tid = %s WHERE tid < %s"
+        cursor.execute(stmt, (tid, tid))
+
+
+class MySQLTIDAllocator(object):
+    implements(ITIDAllocator)
+
+    def new_tid(self, cursor, tid_min):
+        """Return a new tid greater than any existing tid."""
+        # LAST_INSERT_ID(expr) makes the new value available through
+        # insert_id() without another round trip.
+        stmt = """
+        UPDATE last_tid SET tid = LAST_INSERT_ID(GREATEST(tid + 1, %s))
+        """
+        cursor.execute(stmt, (tid_min,))
+        return cursor.connection.insert_id()
+
+    def set_min_tid(self, cursor, tid):
+        """Ensure the next tid is greater than the given tid."""
+        stmt = "UPDATE last_tid SET tid = %s WHERE tid < %s"
+        cursor.execute(stmt, (tid, tid))
+
+
+class OracleTIDAllocator(object):
+    implements(ITIDAllocator)
+
+    def __init__(self, inputsize_NUMBER):
+        self.inputsize_NUMBER = inputsize_NUMBER
+
+    def new_tid(self, cursor, tid_min):
+        """Return a new tid greater than any existing tid."""
+        stmt = """
+        BEGIN
+            UPDATE last_tid SET tid = GREATEST(tid + 1, :tid_min)
+            RETURNING tid INTO :tid;
+        END;
+        """
+        tid_var = cursor.var(self.inputsize_NUMBER)
+        cursor.execute(stmt, tid_min=tid_min, tid=tid_var)
+        return int(tid_var.getvalue())
+
+    def set_min_tid(self, cursor, tid):
+        """Ensure the next tid is greater than the given tid."""
+        stmt = "UPDATE last_tid SET tid = :tid WHERE tid < :tid"
+        cursor.execute(stmt, tid=tid)
@@ -13,7 +13,6 @@
 ##############################################################################
 """TransactionControl implementations"""
 
-from base64 import encodestring
 from relstorage.adapters.interfaces import ITransactionControl
 from zope.interface import implements
 import logging
@@ -52,8 +51,9 @@ class TransactionControl(object):
 class PostgreSQLTransactionControl(TransactionControl):
     implements(ITransactionControl)
 
-    def __init__(self, keep_history):
+    def __init__(self, keep_history, Binary):
         self.keep_history = keep_history
+        self.Binary = Binary
 
     def get_tid(self, cursor):
         """Returns the most recent tid."""
@@ -87,13 +87,10 @@ class PostgreSQLTransactionControl(TransactionControl):
             stmt = """
             INSERT INTO transaction
                 (tid, packed, username, description, extension)
-            VALUES (%s, %s,
-                decode(%s, 'base64'), decode(%s, 'base64'),
-                decode(%s, 'base64'))
+            VALUES (%s, %s, %s, %s, %s)
             """
-            cursor.execute(stmt, (tid, packed,
-                encodestring(username), encodestring(description),
-                encodestring(extension)))
+            cursor.execute(stmt, (tid, packed, self.Binary(username),
+                self.Binary(description), self.Binary(extension)))
 
 
 class MySQLTransactionControl(TransactionControl):
@@ -115,8 +115,11 @@ class BlobHelper(object):
                     ZODB.blob.LAYOUTS['zeocache'] = BlobCacheLayout()
                 fshelper = ZODB.blob.FilesystemHelper(
                     self.blob_dir, layout_name='zeocache')
-            fshelper.create()
-            fshelper.checkSecure()
+            if not (options.read_only and self.shared_blob_dir):
+                # Read-only instances don't write to a shared
+                # blob directory, so don't create it.
+                fshelper.create()
+                fshelper.checkSecure()
         self.fshelper = fshelper
 
         if cache_checker is None:
@@ -40,9 +40,15 @@ class StorageCache(object):
     queue = None
 
     # queue_contents is a map of {oid_int: (startpos, endpos)}
-    # during transaction commit.
+    # during transaction commit.  The value is None for objects
+    # whose states are not queued.
     queue_contents = None
 
+    # queue_full is True once a transaction has queued more than
+    # queue_limit bytes of object states.  The states of large
+    # transactions are not sent to the cache.
+    queue_full = False
+
     # checkpoints, when set, is a tuple containing the integer
     # transaction ID of the two current checkpoints. checkpoint0 is
     # greater than or equal to checkpoint1.
@@ -100,6 +106,10 @@ class StorageCache(object):
         # entries in the delta_after maps.
         self.delta_size_limit = options.cache_delta_size_limit
 
+        # queue_limit is the number of bytes of object states to queue
+        # per transaction, or 0 for no limit.
+        self.queue_limit = int(1000000 * options.large_transaction_mb)
+
     def new_instance(self):
         """Return a copy of this instance sharing the same local client"""
         if self.options.share_local_cache:
@@ -284,10 +294,52 @@ class StorageCache(object):
         return state, tid_int
 
 
+    def warm(self, cursor, limit):
+        """Load the most recently changed objects into the cache.
+
+        cursor must be in the same transaction as the last poll, so
+        that the loaded states match self.checkpoints and
+        self.delta_after0.  Returns the number of objects cached.
+        """
+        if not self.checkpoints:
+            return 0
+        cp0 = self.checkpoints[0]
+        prefix = self.prefix
+        send_size = 0
+        to_send = {}
+        count = 0
+
+        for oid_int, state, tid_int in self.adapter.mover.load_recent(
+                cursor, limit):
+            if tid_int > self.current_tid:
+                # Not consistent with the last poll.
+                continue
+            # Use the same cache key load() would use.
+            if tid_int > cp0:
+                cachekey = '%s:state:%d:%d' % (prefix, tid_int, oid_int)
+            else:
+                cachekey = '%s:state:%d:%d' % (prefix, cp0, oid_int)
+            cache_data = '%s%s' % (p64(tid_int), state or '')
+            item_size = len(cache_data) + len(cachekey)
+            if send_size and send_size + item_size >= self.send_limit:
+                for client in self.clients_local_first:
+                    client.set_multi(to_send)
+                to_send.clear()
+                send_size = 0
+            to_send[cachekey] = cache_data
+            send_size += item_size
+            count += 1
+
+        if to_send:
+            for client in self.clients_local_first:
+                client.set_multi(to_send)
+        return count
+
     def tpc_begin(self):
         """Prepare temp space for objects to cache."""
         self.queue = AutoTemporaryFile()
         self.queue_contents = {}
+        self.queue_full = False
 
     def store_temp(self, oid_int, state):
         """Queue an object for caching.
@@ -296,9 +348,22 @@ class StorageCache(object):
         transaction ID is not yet chosen.
         """
         assert isinstance(state, str)
+        if self.queue_full:
+            # Remember only that the object changed.
+            self.queue_contents[oid_int] = None
+            return
         queue = self.queue
         queue.seek(0, 2)  # seek to end
         startpos = queue.tell()
+        if self.queue_limit and startpos + len(state) > self.queue_limit:
+            # This is a large transaction.  Discard the queued states
+            # rather than let the queue grow with the transaction.
+            self.queue_full = True
+            queue.close()
+            self.queue = AutoTemporaryFile()
+            self.queue_contents = dict.fromkeys(self.queue_contents)
+            self.queue_contents[oid_int] = None
+            return
         queue.write(state)
         endpos = queue.tell()
         self.queue_contents[oid_int] = (startpos, endpos)
@@ -313,8 +378,9 @@ class StorageCache(object):
         # Order the queue by file position, which should help if the
         # file is large and needs to be read sequentially from disk.
         items = [
-            (startpos, endpos, oid_int)
-            for (oid_int, (startpos, endpos)) in self.queue_contents.items()
+            (pos[0], pos[1], oid_int)
+            for (oid_int, pos) in self.queue_contents.iteritems()
+            if pos is not None
             ]
         items.sort()
 
@@ -340,6 +406,7 @@ class StorageCache(object):
 
         self.queue_contents.clear()
         self.queue.seek(0)
+        self.queue_full = False
 
     def after_tpc_finish(self, tid):
         """Update the commit count in the cache.
@@ -389,6 +456,7 @@ class StorageCache(object):
         Called after transaction finish or abort.
         """
         self.queue_contents = None
+        self.queue_full = False
         if self.queue is not None:
             self.queue.close()
             self.queue = None
@@ -404,7 +472,25 @@ class StorageCache(object):
             return True
         return False
 
-    def after_poll(self, cursor, prev_tid_int, new_tid_int, changes):
+    def get_checkpoints(self):
+        """Return the checkpoints stored in the cache, or None."""
+        for client in self.clients_global_first:
+            s = client.get(self.checkpoints_key)
+            if s:
+                try:
+                    c0, c1 = s.split()
+                    c0 = int(c0)
+                    c1 = int(c1)
+                except ValueError:
+                    # Invalid checkpoint cache value; ignore it.
+                    pass
+                else:
+                    if c0 >= c1:
+                        return (c0, c1)
+        return None
+
+    def after_poll(self, cursor, prev_tid_int, new_tid_int, changes,
+            prepared=None):
         """Update checkpoint data after a database poll.
 
         cursor is connected to a load connection.
@@ -417,22 +503,17 @@ class StorageCache(object):
 
         prev_tid_int can be None, in which case the changes
         parameter will be ignored.  new_tid_int can not be None.
+
+        prepared, if not None, is (checkpoints, tid, delta_after0,
+        delta_after1) from a poll thread: the checkpoints it read from
+        the cache and the deltas for those checkpoints up to tid.
+        It saves reading the checkpoints and, when the checkpoints
+        change, listing all the changes since checkpoint 1.
         """
-        new_checkpoints = None
-        for client in self.clients_global_first:
-            s = client.get(self.checkpoints_key)
-            if s:
-                try:
-                    c0, c1 = s.split()
-                    c0 = int(c0)
-                    c1 = int(c1)
-                except ValueError:
-                    # Invalid checkpoint cache value; ignore it.
-                    pass
-                else:
-                    if c0 >= c1:
-                        new_checkpoints = (c0, c1)
-                        break
+        if prepared is not None:
+            new_checkpoints = prepared[0]
+        else:
+            new_checkpoints = self.get_checkpoints()
 
         if not new_checkpoints:
             new_checkpoints = (new_tid_int, new_tid_int)
@@ -490,13 +571,24 @@ class StorageCache(object):
             log.debug("Using new checkpoints: %d %d", cp0, cp1)
             # Use the checkpoints specified by the cache.
             # Rebuild delta_after0 and delta_after1.
-            new_delta_after0 = {}
-            new_delta_after1 = {}
-            if cp1 < new_tid_int:
+            if (prepared is not None and prepared[0] == new_checkpoints
+                    and cp0 <= prepared[1] <= new_tid_int):
+                # Start from the deltas prepared by the poll thread.
+                # The changes listed below are all after checkpoint 0
+                # and delta_after1 is never changed in place, so it
+                # can be shared.
+                after_tid = prepared[1]
+                new_delta_after0 = dict(prepared[2])
+                new_delta_after1 = prepared[3]
+            else:
+                after_tid = cp1
+                new_delta_after0 = {}
+                new_delta_after1 = {}
+            if after_tid < new_tid_int:
                 # poller.list_changes provides an iterator of
                 # (oid, tid) where tid > after_tid and tid <= last_tid.
                 change_list = self.adapter.poller.list_changes(
-                    cursor, cp1, new_tid_int)
+                    cursor, after_tid, new_tid_int)
 
                 # Make a dictionary that contains, for each oid, the most
                 # recent tid listed in changes.
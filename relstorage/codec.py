@@ -0,0 +1,48 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Optional compression of object states.
+
+A compressed state starts with a prefix that names the codec.  Every
+prefix starts with the pickle STOP opcode, which can never begin a
+valid pickle, so compressed and uncompressed states can be told apart
+and a database can contain both.
+"""
+
+import zlib
+
+zlib_prefix = '.z'
+
+
+def encode_state(data, threshold):
+    """Compress an object state if it is at least threshold bytes.
+
+    Returns the state unchanged if threshold is 0, if the state is
+    smaller than threshold, or if compression does not make it smaller.
+    """
+    if not threshold or data is None or len(data) < threshold:
+        return data
+    compressed = zlib_prefix + zlib.compress(data)
+    if len(compressed) < len(data):
+        return compressed
+    return data
+
+
+def decode_state(data):
+    """Decompress an object state produced by encode_state().
+
+    Returns other states unchanged.
+    """
+    if data and data.startswith(zlib_prefix):
+        return zlib.decompress(data[len(zlib_prefix):])
+    return data
@@ -0,0 +1,165 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Timing of the phases of a commit.
+"""
+
+from bisect import bisect_left
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# The histogram buckets hold durations up to 1 ms, 2 ms, 4 ms, and so on,
+# doubling up to about 1 minute.  The last bucket holds anything longer.
+bucket_limits = tuple(0.001 * (2 ** i) for i in range(17))
+
+
+class NullCommitTimer(object):
+    """A commit timer that does nothing.  Used when timing is disabled."""
+
+    def mark(self, phase):
+        pass
+
+    def lock_acquired(self):
+        pass
+
+    def lock_released(self):
+        pass
+
+    def start_vote(self):
+        pass
+
+    def finish(self):
+        pass
+
+
+null_timer = NullCommitTimer()
+
+
+class CommitTimer(object):
+    """Times the phases of one commit.
+
+    Each call to mark() adds the time since the previous mark to the
+    named phase.  A phase can be marked more than once; the times
+    add up.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.phases = []  # [phase name] in order of first appearance
+        self.durations = {}  # {phase name: seconds}
+        self.last = self.started = time.time()
+        self.vote_started = None
+        self.lock_acquired_at = None
+        self.lock_held = 0.0
+
+    def mark(self, phase):
+        now = time.time()
+        durations = self.durations
+        if phase in durations:
+            durations[phase] += now - self.last
+        else:
+            self.phases.append(phase)
+            durations[phase] = now - self.last
+        self.last = now
+
+    def lock_acquired(self):
+        self.lock_acquired_at = time.time()
+
+    def lock_released(self):
+        if self.lock_acquired_at is not None:
+            self.lock_held += time.time() - self.lock_acquired_at
+            self.lock_acquired_at = None
+
+    def start_vote(self):
+        if self.vote_started is None:
+            self.vote_started = time.time()
+
+    def finish(self):
+        """Record the timings of a successful commit."""
+        now = time.time()
+        self.lock_released()
+        if self.vote_started is None:
+            self.vote_started = self.started
+        self.stats.record(self, now - self.vote_started)
+
+
+class CommitTimingStats(object):
+    """Aggregates commit timings and logs slow commits.
+
+    Shared by all storage instances created by new_instance().
+    """
+
+    def __init__(self, slow_threshold):
+        # slow_threshold: log commits whose vote and finish took
+        # longer than this many seconds.
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._histograms = {}  # {phase name: [count per bucket]}
+        self.commits = 0
+        self.slow_commits = 0
+
+    def new_timer(self):
+        return CommitTimer(self)
+
+    def _add(self, phase, seconds):
+        histogram = self._histograms.get(phase)
+        if histogram is None:
+            histogram = self._histograms[phase] = [0] * (
+                len(bucket_limits) + 1)
+        histogram[bisect_left(bucket_limits, seconds)] += 1
+
+    def record(self, timer, commit_time):
+        """Add the timings of a commit to the histograms.
+
+        commit_time is the time from the start of the vote to the end
+        of the finish.
+        """
+        slow = commit_time >= self.slow_threshold
+        self._lock.acquire()
+        try:
+            self.commits += 1
+            if slow:
+                self.slow_commits += 1
+            for phase, seconds in timer.durations.iteritems():
+                self._add(phase, seconds)
+            self._add('commit', commit_time)
+            self._add('lock_held', timer.lock_held)
+        finally:
+            self._lock.release()
+        if slow:
+            parts = ['%s=%.3f' % (phase, timer.durations[phase])
+                for phase in timer.phases]
+            log.warning(
+                "Slow commit: %.3fs from vote to finish, commit lock "
+                "held %.3fs (%s)", commit_time, timer.lock_held,
+                ', '.join(parts))
+
+    def histograms(self):
+        """Return the histograms.
+
+        Returns {phase name: [(limit, count)]}, where limit is the
+        upper bound in seconds of each bucket, or None for the last
+        bucket.  Includes the pseudo-phases 'commit' (from vote to
+        finish) and 'lock_held'.
+        """
+        limits = bucket_limits + (None,)
+        self._lock.acquire()
+        try:
+            return dict(
+                (phase, zip(limits, histogram))
+                for phase, histogram in self._histograms.iteritems())
+        finally:
+            self._lock.release()
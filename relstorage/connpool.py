@@ -0,0 +1,93 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Load connections shared by read-only storage instances.
+"""
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class LoadConnectionPool(object):
+    """Keeps idle load connections for reuse by other storage instances.
+
+    Read-only storage instances return their load connection here
+    when they are released, so the next instance to open a load
+    connection does not have to connect to the database again.
+    """
+
+    # max_idle: the maximum number of idle connections to keep.
+    max_idle = 10
+
+    def __init__(self, connmanager):
+        self.connmanager = connmanager
+        self._lock = threading.Lock()
+        self._idle = []  # [(conn, cursor)]
+        self._closed = False
+
+    def open(self):
+        """Get a load connection, reusing an idle one if possible.
+
+        Returns (conn, cursor).
+        """
+        connmanager = self.connmanager
+        while True:
+            self._lock.acquire()
+            try:
+                if not self._idle:
+                    break
+                conn, cursor = self._idle.pop()
+            finally:
+                self._lock.release()
+            try:
+                connmanager.restart_load(conn, cursor)
+            except connmanager.disconnected_exceptions, e:
+                log.debug("Discarding idle load connection: %s", e)
+                connmanager.close(conn, cursor)
+            else:
+                return conn, cursor
+        return connmanager.open_for_load()
+
+    def release(self, conn, cursor):
+        """End the transaction of a load connection and keep it.
+
+        Closes the connection instead if the pool is full or closed.
+        """
+        connmanager = self.connmanager
+        try:
+            conn.rollback()
+        except connmanager.disconnected_exceptions:
+            connmanager.close(conn, cursor)
+            return
+        self._lock.acquire()
+        try:
+            if not self._closed and len(self._idle) < self.max_idle:
+                self._idle.append((conn, cursor))
+                return
+        finally:
+            self._lock.release()
+        connmanager.close(conn, cursor)
+
+    def close(self):
+        """Close all idle connections and stop keeping released ones."""
+        self._lock.acquire()
+        try:
+            self._closed = True
+            idle = self._idle
+            self._idle = []
+        finally:
+            self._lock.release()
+        for conn, cursor in idle:
+            self.connmanager.close(conn, cursor)
@@ -44,11 +44,13 @@ class Options(object):
         self.blob_cache_size_check = 10
         self.blob_chunk_size = 1 << 20
         self.keep_history = True
+        self.keep_current_state = False
         self.replica_conf = None
         self.ro_replica_conf = None
         self.replica_timeout = 600.0
         self.revert_when_stale = False
         self.poll_interval = 0
+        self.poll_thread_interval = 0
         self.pack_gc = True
         self.pack_prepack_only = False
         self.pack_skip_prepack = False
@@ -59,9 +61,22 @@ class Options(object):
         self.cache_prefix = ''
         self.cache_local_mb = 10
         self.cache_delta_size_limit = 10000
+        self.cache_warm_count = 0
         self.commit_lock_timeout = 30
         self.commit_lock_id = 0
         self.create_schema = True
+        self.compress_threshold = 0
+        self.conflict_resolution_workers = 0
+        self.reuse_temp_tables = False
+        self.commit_procedure = False
+        self.fine_grained_locking = False
+        self.pre_lock_conflict_check = False
+        self.commit_timing = False
+        self.slow_commit_threshold = 1.0
+        self.direct_write_limit = 0
+        self.large_transaction_mb = 0
+        self.defer_serial_checks = False
+        self.pack_reference_workers = 0
         self.strict_tpc = default_strict_tpc
 
         # If share_local_cache is off, each storage instance has a private
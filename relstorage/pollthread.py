@@ -0,0 +1,237 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Background polling shared by all storage instances of a process.
+"""
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+class PollThread(object):
+    """Polls the database on a fixed cadence in a daemon thread.
+
+    The thread keeps a short history of the changes it has seen as a
+    list of segments.  A storage instance that last polled at one of
+    the segment boundaries can get the combined {oid: tid} changes
+    since that point without querying the database for the whole
+    change list.  The storage instance still has to catch up from
+    the last tid seen by this thread to its own snapshot, but that
+    is usually a tiny range.
+
+    If given a StorageCache, the thread also reads the cache
+    checkpoints and keeps the cache deltas for them up to date, so
+    storage instances don't have to read the checkpoints on every
+    poll or list all changes since checkpoint 1 when the checkpoints
+    move.
+    """
+
+    # max_segments: the number of polls to remember.  Storage
+    # instances that fall further behind than this poll the
+    # database the normal way.
+    max_segments = 100
+
+    def __init__(self, adapter, interval, cache=None):
+        self.adapter = adapter
+        self.interval = interval
+        self.cache = cache
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._conn = None
+        self._cursor = None
+
+        # polled_tid is the tid seen by the most recent poll.
+        self.polled_tid = None
+
+        # _segments contains [(after_tid, tid, {oid_int: tid_int})],
+        # oldest first.  Each segment holds the changes committed after
+        # after_tid, up to and including tid, keeping only the latest
+        # tid for each oid.
+        self._segments = []
+
+        # _prepared is (checkpoints, tid, delta_after0, delta_after1)
+        # for StorageCache.after_poll(), or None.  The dicts are
+        # replaced, never changed in place, once published.
+        self._prepared = None
+
+        self._thread = threading.Thread(
+            target=self.run, name='RelStorage poll thread')
+        self._thread.setDaemon(True)
+
+    def start(self):
+        self._thread.start()
+
+    def run(self):
+        while not self._stop_event.isSet():
+            try:
+                self.poll()
+            except Exception:
+                log.exception("Background poll failed")
+                self._drop_connection()
+                # Don't let storage instances use stale checkpoints.
+                self._lock.acquire()
+                try:
+                    self._prepared = None
+                finally:
+                    self._lock.release()
+            self._stop_event.wait(self.interval)
+        self._drop_connection()
+
+    def _drop_connection(self):
+        conn, cursor = self._conn, self._cursor
+        self._conn, self._cursor = None, None
+        self.adapter.connmanager.close(conn, cursor)
+
+    def poll(self):
+        """Poll the database once and record the changes."""
+        connmanager = self.adapter.connmanager
+        if self._cursor is None:
+            self._conn, self._cursor = connmanager.open_for_load()
+        else:
+            try:
+                connmanager.restart_load(self._conn, self._cursor)
+            except connmanager.disconnected_exceptions, e:
+                log.warning("Reconnecting poll thread: %s", e)
+                self._drop_connection()
+                self._conn, self._cursor = connmanager.open_for_load()
+
+        prev = self.polled_tid
+        changes, new_polled_tid = self.adapter.poller.poll_invalidations(
+            self._conn, self._cursor, prev, None)
+
+        change_dict = None
+        if changes is not None:
+            change_dict = {}
+            for oid_int, tid_int in changes:
+                if tid_int > change_dict.get(oid_int, 0):
+                    change_dict[oid_int] = tid_int
+
+        if self.cache is not None:
+            prepared = self._prepare_deltas(prev, new_polled_tid, change_dict)
+        else:
+            prepared = None
+        # Don't hold a snapshot open between polls.
+        self._conn.rollback()
+
+        self._lock.acquire()
+        try:
+            if changes is None:
+                # Start over.
+                del self._segments[:]
+            elif new_polled_tid != prev:
+                self._segments.append((prev, new_polled_tid, change_dict))
+                if len(self._segments) > self.max_segments:
+                    del self._segments[:-self.max_segments]
+            self.polled_tid = new_polled_tid
+            self._prepared = prepared
+        finally:
+            self._lock.release()
+
+    def _prepare_deltas(self, prev_tid, tid, change_dict):
+        """Compute the cache deltas for the current checkpoints.
+
+        change_dict holds the changes after prev_tid up to tid, or is
+        None if they are unknown.  Returns the new value of _prepared.
+        """
+        checkpoints = self.cache.get_checkpoints()
+        if checkpoints is None or checkpoints[0] > tid:
+            # Let the storage instances set the checkpoints.
+            return None
+
+        old = self._prepared
+        if (old is not None and old[0] == checkpoints
+                and old[1] == prev_tid and change_dict is not None):
+            # Same checkpoints; add the new changes, which are all
+            # after checkpoint 0.
+            delta_after0 = old[2]
+            if change_dict:
+                delta_after0 = delta_after0.copy()
+                delta_after0.update(change_dict)
+            if len(delta_after0) >= self.cache.delta_size_limit * 2:
+                # The storage instances will shift the checkpoints
+                # soon; don't keep copying a large delta until then.
+                return None
+            return checkpoints, tid, delta_after0, old[3]
+
+        # List the changes since checkpoint 1, as StorageCache.after_poll()
+        # would.
+        cp0, cp1 = checkpoints
+        delta_after0 = {}
+        delta_after1 = {}
+        if cp1 < tid:
+            change_list = list(self.adapter.poller.list_changes(
+                self._cursor, cp1, tid))
+            change_list.sort()
+            latest = {}
+            for oid_int, tid_int in change_list:
+                latest[oid_int] = tid_int
+            for oid_int, tid_int in latest.iteritems():
+                if tid_int > cp0:
+                    delta_after0[oid_int] = tid_int
+                elif tid_int > cp1:
+                    delta_after1[oid_int] = tid_int
+        return checkpoints, tid, delta_after0, delta_after1
+
+    def get_prepared(self):
+        """Get the cache deltas prepared by this thread.
+
+        Returns a value for the prepared parameter of
+        StorageCache.after_poll(), or None.
+        """
+        self._lock.acquire()
+        try:
+            return self._prepared
+        finally:
+            self._lock.release()
+
+    def get_changes(self, prev_polled_tid):
+        """Get the changes seen by this thread since prev_polled_tid.
+
+        Returns (changes, polled_tid), where changes is a list of
+        (oid_int, tid_int), or None if this thread can not provide
+        the changes since prev_polled_tid.
+        """
+        if prev_polled_tid is None:
+            return None
+        self._lock.acquire()
+        try:
+            polled_tid = self.polled_tid
+            if polled_tid is None:
+                return None
+            if polled_tid == prev_polled_tid:
+                return [], polled_tid
+            for i, (after_tid, tid, change_dict) in enumerate(self._segments):
+                if after_tid == prev_polled_tid:
+                    break
+            else:
+                return None
+            segments = self._segments[i:]
+        finally:
+            self._lock.release()
+
+        if len(segments) == 1:
+            return segments[0][2].items(), polled_tid
+        # Later segments contain later tids, so a plain update
+        # keeps the latest tid for each oid.
+        combined = {}
+        for after_tid, tid, change_dict in segments:
+            combined.update(change_dict)
+        return combined.items(), polled_tid
+
+    def close(self):
+        """Stop the thread."""
+        self._stop_event.set()
+        if self._thread.isAlive():
+            self._thread.join(self.interval + 10)
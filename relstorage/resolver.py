@@ -0,0 +1,98 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Conflict resolution in a pool of worker processes.
+"""
+
+from ZODB import ConflictResolution
+from ZODB.POSException import ConflictError
+import logging
+
+try:
+    import multiprocessing
+except ImportError:
+    # Python < 2.6
+    multiprocessing = None
+
+log = logging.getLogger(__name__)
+
+
+class PrefetchedConflictResolver(ConflictResolution.ConflictResolvingStorage):
+    """Resolves conflicts using object states loaded ahead of time.
+
+    Worker processes have no database connection, so the main process
+    loads the old and committed states and sends them along with
+    the new state.
+    """
+
+    def __init__(self, states):
+        # states: {(oid, serial): state}
+        self.states = states
+
+    def loadSerial(self, oid, serial):
+        return self.states[(oid, serial)]
+
+
+def resolve_conflict(args):
+    """Resolve one conflict.  Runs in a worker process.
+
+    args is (oid, committed_serial, old_serial, newpickle,
+    committed_data, old_data), with the states as stored.  Returns
+    (oid, resolved_data), where resolved_data is None if the conflict
+    can not be resolved.
+    """
+    (oid, committed_serial, old_serial, newpickle,
+        committed_data, old_data) = args
+    resolver = PrefetchedConflictResolver({
+        (oid, committed_serial): committed_data,
+        (oid, old_serial): old_data,
+        })
+    try:
+        # The committedData argument only exists in ZODB 3.9 and later;
+        # loadSerial() provides the committed state just as well.
+        rdata = resolver.tryToResolveConflict(
+            oid, committed_serial, old_serial, newpickle)
+    except ConflictError:
+        rdata = None
+    return oid, rdata
+
+
+class ConflictResolverPool(object):
+    """A pool of processes that resolve independent conflicts concurrently.
+
+    Shared by all storage instances created by new_instance().
+    Processes are used rather than threads because conflict resolution
+    is mostly unpickling and application code, which holds the GIL.
+    """
+
+    def __init__(self, workers):
+        if multiprocessing is None:
+            raise ValueError(
+                "conflict-resolution-workers requires Python 2.6 or later")
+        self.workers = workers
+        self._pool = multiprocessing.Pool(workers)
+
+    def resolve(self, conflicts):
+        """Resolve conflicts in the worker processes.
+
+        conflicts is a list of arguments for resolve_conflict().
+        Yields (oid, resolved_data) in the order the workers finish.
+        The caller may stop iterating early; the remaining results
+        are discarded.
+        """
+        return self._pool.imap_unordered(resolve_conflict, conflicts)
+
+    def close(self):
+        log.debug("Stopping the conflict resolution workers")
+        self._pool.terminate()
+        self._pool.join()
@@ -28,7 +28,14 @@ from persistent.TimeStamp import TimeStamp
 from relstorage.blobhelper import BlobHelper
 from relstorage.blobhelper import is_blob_record
 from relstorage.cache import StorageCache
+from relstorage.codec import decode_state
+from relstorage.codec import encode_state
+from relstorage.committiming import CommitTimingStats
+from relstorage.committiming import null_timer
+from relstorage.connpool import LoadConnectionPool
 from relstorage.options import Options
+from relstorage.pollthread import PollThread
+from relstorage.resolver import ConflictResolverPool
 from zope.interface import implements
 import ZODB.interfaces
 import base64
@@ -124,6 +131,21 @@ class RelStorage(
     # _max_new_oid is the highest OID provided by new_oid()
     _max_new_oid = 0
 
+    # _oid_blocks is the number of 16-OID blocks new_oid() allocates
+    # per database round trip.  It grows while this instance uses up
+    # its OIDs quickly and shrinks when it is idle.
+    _oid_blocks = 1
+    _max_oid_blocks = 64
+
+    # _oid_blocks_time is the time of the last OID allocation.
+    _oid_blocks_time = 0
+
+    # _row_lock_commit_wait is how many seconds a commit holding row
+    # locks (with the fine-grained-locking option) tries to get the
+    # commit lock before it releases the row locks and waits for the
+    # commit lock without them.
+    _row_lock_commit_wait = 1.0
+
     # _cache, if set, is a StorageCache object.
     _cache = None
 
@@ -137,6 +159,12 @@ class RelStorage(
     # Otherwise, blobhelper is None.
     blobhelper = None
 
+    # _direct_stores: {oid_int: (prev_tid_int, data)}; the objects
+    # stored by a small transaction that will be written directly to
+    # object_state, bypassing temp_store.  None when the transaction
+    # uses temp_store.
+    _direct_stores = None
+
     # _txn_check_serials: {oid, serial}; confirms that certain objects
     # have not changed at commit.
     _txn_check_serials = None
@@ -149,12 +177,42 @@ class RelStorage(
     # calling the database.
     _batcher_row_limit = 100
 
+    # _poll_thread, if set, is a PollThread shared by all instances
+    # created by new_instance().
+    _poll_thread = None
+
+    # _owns_poll_thread is True if this instance started _poll_thread.
+    _owns_poll_thread = False
+
+    # _load_pool, if set, is a LoadConnectionPool shared by all
+    # read-only instances created by new_instance().
+    _load_pool = None
+
+    # _owns_load_pool is True if this instance created _load_pool.
+    _owns_load_pool = False
+
+    # _resolver_pool, if set, is a ConflictResolverPool shared by all
+    # instances created by new_instance().
+    _resolver_pool = None
+
+    # _owns_resolver_pool is True if this instance created _resolver_pool.
+    _owns_resolver_pool = False
+
+    # _commit_timing, if set, is a CommitTimingStats shared by all
+    # instances created by new_instance().
+    _commit_timing = None
+
+    # _commit_timer times the phases of the current commit.
+    _commit_timer = null_timer
+
     # _stale_error is None most of the time.  It's a ReadConflictError
     # when the database connection is stale (due to async replication).
     _stale_error = None
 
     def __init__(self, adapter, name=None, create=None,
-            options=None, cache=None, blobhelper=None, **kwoptions):
+            options=None, cache=None, blobhelper=None, poll_thread=None,
+            load_pool=None, resolver_pool=None, commit_timing=None,
+            **kwoptions):
         self._adapter = adapter
 
         if options is None:
@@ -172,8 +230,19 @@ class RelStorage(
 
         self._is_read_only = options.read_only
 
+        # Fork the conflict resolution workers before this process
+        # opens database connections or starts threads, since forking
+        # can copy locks held by other threads into the workers.
+        if resolver_pool is not None:
+            self._resolver_pool = resolver_pool
+        elif options.conflict_resolution_workers and not options.read_only:
+            self._resolver_pool = ConflictResolverPool(
+                options.conflict_resolution_workers)
+            self._owns_resolver_pool = True
+
         if create is None:
-            create = options.create_schema
+            # Read-only instances never change the schema.
+            create = options.create_schema and not options.read_only
         if create:
             self._adapter.schema.prepare()
 
@@ -192,6 +261,12 @@ class RelStorage(
         # but not yet used.
         self._preallocated_oids = []
 
+        if load_pool is not None:
+            self._load_pool = load_pool
+        elif options.read_only:
+            self._load_pool = LoadConnectionPool(adapter.connmanager)
+            self._owns_load_pool = True
+
         if cache is not None:
             self._cache = cache
         else:
@@ -200,21 +275,43 @@ class RelStorage(
                 # Use the database name as the cache prefix.
                 self._open_load_connection()
                 prefix = adapter.schema.get_database_name(self._load_cursor)
-                self._drop_load_connection()
+                self._release_load_connection()
                 prefix = prefix.replace(' ', '_')
             self._cache = StorageCache(adapter, options, prefix)
+            if options.cache_warm_count:
+                self._warm_cache()
 
         if blobhelper is not None:
             self.blobhelper = blobhelper
         elif options.blob_dir:
             self.blobhelper = BlobHelper(options=options, adapter=adapter)
 
+        if poll_thread is not None:
+            self._poll_thread = poll_thread
+        elif options.poll_thread_interval:
+            self._poll_thread = PollThread(
+                adapter.new_instance(), options.poll_thread_interval,
+                self._cache.new_instance())
+            self._poll_thread.start()
+            self._owns_poll_thread = True
+
+        if commit_timing is not None:
+            self._commit_timing = commit_timing
+        elif options.commit_timing and not options.read_only:
+            self._commit_timing = CommitTimingStats(
+                options.slow_commit_threshold)
+
     def new_instance(self):
         """Creates and returns another storage instance.
 
         See ZODB.interfaces.IMVCCStorage.
         """
-        adapter = self._adapter.new_instance()
+        if self._is_read_only:
+            # Read-only instances have no per-transaction adapter
+            # state, so they share the adapter.
+            adapter = self._adapter
+        else:
+            adapter = self._adapter.new_instance()
         cache = self._cache.new_instance()
         if self.blobhelper is not None:
             blobhelper = self.blobhelper.new_instance(adapter=adapter)
@@ -222,7 +319,9 @@ class RelStorage(
             blobhelper = None
         other = RelStorage(adapter=adapter, name=self.__name__,
             create=False, options=self._options, cache=cache,
-            blobhelper=blobhelper)
+            blobhelper=blobhelper, poll_thread=self._poll_thread,
+            load_pool=self._load_pool, resolver_pool=self._resolver_pool,
+            commit_timing=self._commit_timing)
         self._instances.append(weakref.ref(other, self._instances.remove))
         return other
 
@@ -233,7 +332,10 @@ class RelStorage(
 
     def _open_load_connection(self):
         """Open the load connection to the database.  Return nothing."""
-        conn, cursor = self._adapter.connmanager.open_for_load()
+        if self._load_pool is not None:
+            conn, cursor = self._load_pool.open()
+        else:
+            conn, cursor = self._adapter.connmanager.open_for_load()
         self._drop_load_connection()
         self._load_conn, self._load_cursor = conn, cursor
         self._load_transaction_open = 'active'
@@ -245,6 +347,16 @@ class RelStorage(
         self._adapter.connmanager.close(conn, cursor)
         self._load_transaction_open = ''
 
+    def _release_load_connection(self):
+        """Return the load connection to the pool or drop it"""
+        conn, cursor = self._load_conn, self._load_cursor
+        if self._load_pool is None or conn is None:
+            self._drop_load_connection()
+            return
+        self._load_conn, self._load_cursor = None, None
+        self._load_transaction_open = ''
+        self._load_pool.release(conn, cursor)
+
     def _rollback_load_connection(self):
         if self._load_conn is not None:
             try:
@@ -333,6 +445,22 @@ class RelStorage(
             log.info("Reconnected.")
             return f(self._store_conn, self._store_cursor, *args, **kw)
 
+    def _warm_cache(self):
+        """Poll, then load recently changed objects into the cache.
+
+        Errors are logged rather than raised, since the cache
+        only affects performance.
+        """
+        try:
+            self.poll_invalidations()
+            count = self._cache.warm(
+                self._load_cursor, self._options.cache_warm_count)
+        except Exception:
+            log.exception("Failed to warm the cache")
+        else:
+            log.info("Warmed the cache with %d objects", count)
+        self._release_load_connection()
+
     def zap_all(self):
         """Clear all objects and transactions out of the database.
 
@@ -347,7 +475,7 @@ class RelStorage(
         """
         self._lock_acquire()
         try:
-            self._drop_load_connection()
+            self._release_load_connection()
             self._drop_store_connection()
         finally:
             self._lock_release()
@@ -365,6 +493,12 @@ class RelStorage(
                 instance = wref()
                 if instance is not None:
                     instance.close()
+            if self._owns_poll_thread:
+                self._poll_thread.close()
+            if self._owns_load_pool:
+                self._load_pool.close()
+            if self._owns_resolver_pool:
+                self._resolver_pool.close()
         finally:
             self._lock_release()
 
@@ -488,7 +622,7 @@ class RelStorage(
                 # an object whose creation has been undone.
                 self._log_keyerror(oid_int, "creation has been undone")
                 raise POSKeyError(oid)
-            state = str(state or '')
+            state = decode_state(str(state or ''))
             return state, p64(tid_int)
         else:
             self._log_keyerror(oid_int, "no tid found")
@@ -530,7 +664,7 @@ class RelStorage(
             state = str(state)
             if not state:
                 raise POSKeyError(oid)
-            return state
+            return decode_state(state)
         else:
             raise POSKeyError(oid)
 
@@ -550,20 +684,19 @@ class RelStorage(
             else:
                 self._before_load()
                 cursor = self._load_cursor
-            if not self._adapter.mover.exists(cursor, u64(oid)):
+            res = self._adapter.mover.load_before_with_end(
+                cursor, oid_int, u64(tid))
+            if res is None:
                 raise POSKeyError(oid)
 
-            state, start_tid = self._adapter.mover.load_before(
-                cursor, oid_int, u64(tid))
+            state, start_tid, end_int = res
             if start_tid is not None:
-                end_int = self._adapter.mover.get_object_tid_after(
-                    cursor, oid_int, start_tid)
                 if end_int is not None:
                     end = p64(end_int)
                 else:
                     end = None
                 if state is not None:
-                    state = str(state)
+                    state = decode_state(str(state))
                 return state, p64(start_tid), end
             else:
                 return None
@@ -598,9 +731,20 @@ class RelStorage(
         self._lock_acquire()
         try:
             self._max_stored_oid = max(self._max_stored_oid, oid_int)
+            encoded = encode_state(data, self._options.compress_threshold)
+            direct = self._direct_stores
+            if direct is not None:
+                if (oid_int in direct
+                        or len(direct) < self._options.direct_write_limit):
+                    # keep the data in memory until the vote
+                    direct[oid_int] = (prev_tid_int, encoded)
+                    cache.store_temp(oid_int, data)
+                    return None
+                # too big for the direct write path
+                self._spill_direct_stores()
             # save the data in a temporary table
             adapter.mover.store_temp(
-                cursor, self._batcher, oid_int, prev_tid_int, data)
+                cursor, self._batcher, oid_int, prev_tid_int, encoded)
             cache.store_temp(oid_int, data)
             return None
         finally:
@@ -633,7 +777,8 @@ class RelStorage(
             self._max_stored_oid = max(self._max_stored_oid, oid_int)
             # save the data.  Note that data can be None.
             adapter.mover.restore(
-                cursor, self._batcher, oid_int, tid_int, data)
+                cursor, self._batcher, oid_int, tid_int,
+                encode_state(data, self._options.compress_threshold))
         finally:
             self._lock_release()
 
@@ -643,10 +788,12 @@ class RelStorage(
         if transaction is not self._transaction:
             raise POSException.StorageTransactionError(self, transaction)
 
-        _, committed_tid = self.load(oid, '')
-        if committed_tid != serial:
-            raise POSException.ReadConflictError(
-                oid=oid, serials=(committed_tid, serial))
+        if not self._options.defer_serial_checks:
+            _, committed_tid = self.load(oid, '')
+            if committed_tid != serial:
+                raise POSException.ReadConflictError(
+                    oid=oid, serials=(committed_tid, serial))
+        # else all serials are checked together in _vote().
 
         if self._txn_check_serials is None:
             self._txn_check_serials = {}
@@ -676,6 +823,8 @@ class RelStorage(
             self._lock_acquire()
             self._clear_temp()
             self._transaction = transaction
+            if self._commit_timing is not None:
+                self._commit_timer = self._commit_timing.new_timer()
 
             user = str(transaction.user)
             desc = str(transaction.description)
@@ -692,19 +841,32 @@ class RelStorage(
             self._cache.tpc_begin()
             self._batcher = self._adapter.mover.make_batcher(
                 self._store_cursor, self._batcher_row_limit)
+            timer = self._commit_timer
+            timer.mark('begin')
+
+            options = self._options
+            if (tid is None and options.direct_write_limit
+                    and not options.commit_procedure
+                    and not options.fine_grained_locking
+                    and not options.pre_lock_conflict_check):
+                self._direct_stores = {}
 
             if tid is not None:
                 # hold the commit lock and add the transaction now
                 cursor = self._store_cursor
                 packed = (status == 'p')
                 adapter.locker.hold_commit_lock(cursor, ensure_current=True)
+                timer.mark('lock_wait')
+                timer.lock_acquired()
                 tid_int = u64(tid)
                 try:
+                    adapter.tidallocator.set_min_tid(cursor, tid_int)
                     adapter.txncontrol.add_transaction(
                         cursor, tid_int, user, desc, ext, packed)
                 except:
                     self._drop_store_connection()
                     raise
+                timer.mark('tid')
             # else choose the tid later
             self._tid = tid
 
@@ -714,11 +876,12 @@ class RelStorage(
     def tpc_transaction(self):
         return self._transaction
 
-    def _prepare_tid(self):
+    def _prepare_tid(self, locked=False):
         """Choose a tid for the current transaction.
 
         This should be done as late in the commit as possible, since
-        it must hold an exclusive commit lock.
+        it must hold an exclusive commit lock.  If locked is true,
+        the caller already holds the commit lock.
         """
         if self._tid is not None:
             return
@@ -727,22 +890,26 @@ class RelStorage(
 
         adapter = self._adapter
         cursor = self._store_cursor
-        adapter.locker.hold_commit_lock(cursor, ensure_current=True)
+        timer = self._commit_timer
+        if not locked:
+            timer.mark('prepare')
+            adapter.locker.hold_commit_lock(cursor, ensure_current=True)
+            timer.mark('lock_wait')
+            timer.lock_acquired()
         user, desc, ext = self._ude
 
         # Choose a transaction ID.
         # Base the transaction ID on the current time,
         # but ensure that the tid of this transaction
         # is greater than any existing tid.
-        last_tid = adapter.txncontrol.get_tid(cursor)
         now = time.time()
         stamp = TimeStamp(*(time.gmtime(now)[:5] + (now % 60,)))
-        stamp = stamp.laterThan(TimeStamp(p64(last_tid)))
-        tid = repr(stamp)
+        tid_int = adapter.tidallocator.new_tid(cursor, u64(repr(stamp)))
+        tid = p64(tid_int)
 
-        tid_int = u64(tid)
         adapter.txncontrol.add_transaction(cursor, tid_int, user, desc, ext)
         self._tid = tid
+        timer.mark('tid')
 
     def _clear_temp(self):
         # Clear all attributes used for transaction commit.
@@ -755,56 +922,152 @@ class RelStorage(
         self._max_stored_oid = 0
         self._batcher = None
         self._txn_check_serials = None
+        self._direct_stores = None
+        self._commit_timer = null_timer
         self._cache.clear_temp()
         blobhelper = self.blobhelper
         if blobhelper is not None:
             blobhelper.clear_temp()
 
-    def _finish_store(self):
+    def _spill_direct_stores(self):
+        """Move the objects kept for the direct write path to temp_store.
+
+        Used when the transaction turns out not to qualify for the
+        direct write path.
+        """
+        direct = self._direct_stores
+        self._direct_stores = None
+        if direct:
+            mover = self._adapter.mover
+            cursor = self._store_cursor
+            for oid_int, (prev_tid_int, data) in sorted(direct.iteritems()):
+                mover.store_temp(
+                    cursor, self._batcher, oid_int, prev_tid_int, data)
+
+    def _finish_direct_store(self):
+        """Write the objects of a small transaction without temp_store.
+
+        The commit lock must be held.  Checks for conflicts with one
+        lookup of the current tids, then writes the object_state rows
+        directly.  Returns a list of (oid, tid) to be received by
+        Connection._handle_serial(), or None if there are conflicts,
+        in which case the objects are moved to temp_store so the
+        conflicts can be resolved as usual.
+        """
+        assert self._tid is not None
+        direct = self._direct_stores
+        mover = self._adapter.mover
+        cursor = self._store_cursor
+        oid_ints = sorted(direct)
+        current = mover.current_object_tids(cursor, oid_ints)
+        for oid_int in oid_ints:
+            if current.get(oid_int, 0) != direct[oid_int][0]:
+                self._spill_direct_stores()
+                self._batcher.flush()
+                return None
+
+        # No other transaction can change these objects while the
+        # commit lock is held, so the states can be written the same
+        # way restore() writes them, without further conflict detection.
+        tid_int = u64(self._tid)
+        for oid_int in oid_ints:
+            prev_tid_int, data = direct[oid_int]
+            mover.restore(cursor, self._batcher, oid_int, tid_int, data)
+        self._batcher.flush()
+        self._direct_stores = None
+        self._commit_timer.mark('direct_write')
+        return [(p64(oid_int), self._tid) for oid_int in oid_ints]
+
+    def _finish_store(self, resolved=(), verify=True):
         """Move stored objects from the temporary table to final storage.
 
         Returns a list of (oid, tid) to be received by
-        Connection._handle_serial().
+        Connection._handle_serial().  resolved is the set of OIDs whose
+        conflicts were resolved before the commit lock was acquired.
+        verify is False if no other transaction can have changed the
+        objects since then.
         """
         assert self._tid is not None
         cursor = self._store_cursor
         adapter = self._adapter
-        cache = self._cache
 
-        # Detect conflicting changes.
-        # Try to resolve the conflicts.
-        resolved = set()  # a set of OIDs
-        while True:
-            conflict = adapter.mover.detect_conflict(cursor)
-            if conflict is None:
-                break
+        resolved = set(resolved)
+        if verify:
+            # Detect conflicting changes.
+            # Try to resolve the conflicts.
+            resolved.update(self._resolve_conflicts(
+                adapter.mover.detect_conflicts(cursor)))
+
+        # Move the new states into the permanent table
+        tid_int = u64(self._tid)
+        if self.blobhelper is not None:
+            txn_has_blobs = self.blobhelper.txn_has_blobs
+        else:
+            txn_has_blobs = False
+        oid_ints = adapter.mover.move_from_temp(cursor, tid_int, txn_has_blobs)
+        self._commit_timer.mark('move')
+        return self._make_serials(oid_ints, resolved)
+
+    def _resolve_conflicts(self, rows, replacements=None):
+        """Resolve the conflicts found by the object mover.
 
+        rows contains (oid_int, prev_tid_int, serial_int, data).
+        Replaces the conflicting states in the temporary table with
+        the resolved states and returns the set of resolved OIDs.
+        Raises ConflictError if a conflict can not be resolved.
+
+        If replacements is a list, the (oid_int, prev_tid_int, data)
+        to write to the temporary table are added to it instead.
+        """
+        timer = self._commit_timer
+        timer.mark('detect')
+        cache = self._cache
+        resolved = set()  # a set of OIDs
+        if replacements is None:
+            write = True
+            replacements = []  # [(oid_int, prev_tid_int, data)]
+        else:
+            write = False
+        conflicts = []  # [(oid, prev_tid, serial, data)]
+        for conflict in rows:
             oid_int, prev_tid_int, serial_int, data = conflict
-            oid = p64(oid_int)
-            prev_tid = p64(prev_tid_int)
-            serial = p64(serial_int)
+            if data is not None:
+                data = decode_state(str(data))
+            conflicts.append(
+                (p64(oid_int), p64(prev_tid_int), p64(serial_int), data))
+
+        if (self._resolver_pool is not None and len(conflicts) > 1
+                and not self._has_record_transforms()):
+            results = self._resolve_in_pool(conflicts)
+        else:
+            results = self._resolve_inline(conflicts)
 
-            rdata = self.tryToResolveConflict(oid, prev_tid, serial, data)
+        for oid, prev_tid, serial, data, rdata in results:
             if rdata is None:
-                # unresolvable; kill the whole transaction
+                # unresolvable; kill the whole transaction.  Give up
+                # the commit lock now rather than waiting for tpc_abort,
+                # so other transactions can commit in the meantime.
+                self._release_commit_lock_early()
                 raise POSException.ConflictError(
                     oid=oid, serials=(prev_tid, serial), data=data)
             else:
                 # resolved
-                data = rdata
-                self._adapter.mover.replace_temp(
-                    cursor, oid_int, prev_tid_int, data)
+                oid_int = u64(oid)
+                replacements.append((oid_int, u64(prev_tid),
+                    encode_state(rdata, self._options.compress_threshold)))
                 resolved.add(oid)
-                cache.store_temp(oid_int, data)
+                cache.store_temp(oid_int, rdata)
 
-        # Move the new states into the permanent table
-        tid_int = u64(self._tid)
+        if write and replacements:
+            self._adapter.mover.replace_temps(
+                self._store_cursor, replacements)
+
+        timer.mark('resolve')
+        return resolved
+
+    def _make_serials(self, oid_ints, resolved):
+        """Returns a list of (oid, tid) for Connection._handle_serial()."""
         serials = []
-        if self.blobhelper is not None:
-            txn_has_blobs = self.blobhelper.txn_has_blobs
-        else:
-            txn_has_blobs = False
-        oid_ints = adapter.mover.move_from_temp(cursor, tid_int, txn_has_blobs)
         for oid_int in oid_ints:
             oid = p64(oid_int)
             if oid in resolved:
@@ -815,6 +1078,84 @@ class RelStorage(
 
         return serials
 
+    def _resolve_inline(self, conflicts):
+        """Resolve conflicts one at a time in this thread.
+
+        Yields (oid, prev_tid, serial, data, resolved_data), where
+        resolved_data is None if the conflict could not be resolved.
+        """
+        for oid, prev_tid, serial, data in conflicts:
+            try:
+                rdata = self.tryToResolveConflict(oid, prev_tid, serial, data)
+            except POSException.ConflictError:
+                rdata = None
+            yield oid, prev_tid, serial, data, rdata
+
+    def _has_record_transforms(self):
+        """Return true if a wrapping storage transforms record data.
+
+        ZODB 3.10 storage wrappers set the _crs_*_record_data
+        functions on the instance.  The resolver workers can not apply
+        them, so conflicts are then resolved in this thread.
+        """
+        d = self.__dict__
+        return ('_crs_transform_record_data' in d
+            or '_crs_untransform_record_data' in d)
+
+    def _resolve_in_pool(self, conflicts):
+        """Resolve conflicts concurrently using _resolver_pool.
+
+        The worker processes can not use the database, so this loads
+        the old and committed states first.  The states are sent as
+        stored; the workers do any unpickling.  Yields the same tuples
+        as _resolve_inline, in the order the workers finish.
+        """
+        # Load all the committed and old states in a few queries.
+        mover = self._adapter.mover
+        cursor = self._store_cursor
+        states = {}  # {(oid_int, tid_int): state}
+        oid_ints = [u64(oid) for oid, prev_tid, serial, data in conflicts]
+        for oid_int, state, tid_int in mover.load_current_multi(
+                cursor, oid_ints):
+            if state is not None:
+                # A None state (a deleted object) is left to loadSerial.
+                states[(oid_int, tid_int)] = decode_state(str(state))
+        revisions = [(u64(oid), u64(serial))
+            for oid, prev_tid, serial, data in conflicts]
+        for oid_int, tid_int, state in mover.load_revisions(
+                cursor, revisions):
+            if state:
+                states[(oid_int, tid_int)] = decode_state(state)
+
+        args = []
+        by_oid = {}  # {oid: (oid, prev_tid, serial, data)}
+        for conflict in conflicts:
+            oid, prev_tid, serial, data = conflict
+            by_oid[oid] = conflict
+            oid_int = u64(oid)
+            committed_data = states.get((oid_int, u64(prev_tid)))
+            if committed_data is None:
+                committed_data = self.loadSerial(oid, prev_tid)
+            old_data = states.get((oid_int, u64(serial)))
+            if old_data is None:
+                # loadSerial raises the usual POSKeyError.
+                old_data = self.loadSerial(oid, serial)
+            args.append(
+                (oid, prev_tid, serial, data, committed_data, old_data))
+
+        for oid, rdata in self._resolver_pool.resolve(args):
+            yield by_oid[oid] + (rdata,)
+
+    def _release_commit_lock_early(self):
+        """Roll back the store connection and release the commit lock.
+
+        Used when the transaction is certain to fail.  tpc_abort
+        repeats these steps harmlessly.
+        """
+        self._adapter.txncontrol.abort(
+            self._store_conn, self._store_cursor, self._prepared_txn)
+        self._adapter.locker.release_commit_lock(self._store_cursor)
+
     def tpc_vote(self, transaction):
         self._lock_acquire()
         try:
@@ -849,38 +1190,147 @@ class RelStorage(
         cursor = self._store_cursor
         assert cursor is not None
         conn = self._store_conn
+        timer = self._commit_timer
+        timer.mark('store')
+        timer.start_vote()
+
+        if (self._direct_stores is not None and self.blobhelper is not None
+                and self.blobhelper.txn_has_blobs):
+            # Blob chunks are moved from temp_blob_chunk along with
+            # temp_store, so use temp_store for the objects as well.
+            self._spill_direct_stores()
 
         # execute all remaining batch store operations
         self._batcher.flush()
+        timer.mark('flush')
 
         # Reserve all OIDs used by this transaction
         if self._max_stored_oid > self._max_new_oid:
             self._adapter.oidallocator.set_min_oid(
                 cursor, self._max_stored_oid + 1)
 
-        self._prepare_tid()
-        tid_int = u64(self._tid)
-
-        if self._txn_check_serials:
-            oid_ints = [u64(oid) for oid in self._txn_check_serials.iterkeys()]
-            current = self._adapter.mover.current_object_tids(cursor, oid_ints)
-            for oid, expect in self._txn_check_serials.iteritems():
-                oid_int = u64(oid)
-                actual = p64(current.get(oid_int, 0))
-                if actual != expect:
-                    raise POSException.ReadConflictError(
-                        oid=oid, serials=(actual, expect))
+        resolved = set()
+        locked = False
+        if self._options.fine_grained_locking and self._tid is None:
+            # Lock the rows of the objects being written, in OID order,
+            # and resolve conflicts before taking the commit lock.
+            # Transactions that write other objects can do the same
+            # at the same time, so the commit lock only has to cover
+            # the choice of tid and the move to permanent storage.
+            locker = self._adapter.locker
+            locker.lock_objects(cursor)
+            timer.mark('lock_objects')
+            replacements = []
+            resolved = self._resolve_conflicts(
+                self._adapter.mover.detect_conflicts(cursor), replacements)
+            timer.mark('prepare')
+            locked = locker.hold_commit_lock_after_objects(
+                cursor, self._row_lock_commit_wait)
+            timer.mark('lock_wait')
+            if locked:
+                timer.lock_acquired()
+                if replacements:
+                    self._adapter.mover.replace_temps(cursor, replacements)
+                verify = False
+            else:
+                # The commit lock holder may be waiting for the rows
+                # locked above: it may be an undo, an import, or a
+                # storage without this option.  The row locks are
+                # gone now, so commit the usual way.
+                log.debug("Commit lock busy; committing without "
+                    "fine-grained locking")
+                resolved = set()
+                verify = True
+        else:
+            verify = True
+            if self._options.pre_lock_conflict_check and self._tid is None:
+                # Resolve conflicts before taking the commit lock.
+                # Objects changed after this check are found and
+                # resolved again under the lock; usually there are none.
+                resolved = self._resolve_conflicts(
+                    self._adapter.mover.detect_conflicts(
+                        cursor, locked=False))
+
+        if (self._options.commit_procedure and self._tid is None
+                and not self._txn_check_serials and not locked):
+            serials = self._vote_with_procedure(resolved)
+            tid_int = u64(self._tid)
+        else:
+            self._prepare_tid(locked)
+            tid_int = u64(self._tid)
+
+            if self._txn_check_serials:
+                oid_ints = [
+                    u64(oid) for oid in self._txn_check_serials.iterkeys()]
+                current = self._adapter.mover.current_object_tids(
+                    cursor, oid_ints)
+                for oid, expect in self._txn_check_serials.iteritems():
+                    oid_int = u64(oid)
+                    actual = p64(current.get(oid_int, 0))
+                    if actual != expect:
+                        raise POSException.ReadConflictError(
+                            oid=oid, serials=(actual, expect))
+                timer.mark('check_serials')
+
+            serials = None
+            if self._direct_stores is not None:
+                serials = self._finish_direct_store()
+            if serials is None:
+                serials = self._finish_store(resolved, verify)
+            self._adapter.mover.update_current(cursor, tid_int)
+            timer.mark('update_current')
 
-        serials = self._finish_store()
-        self._adapter.mover.update_current(cursor, tid_int)
         self._prepared_txn = self._adapter.txncontrol.commit_phase1(
             conn, cursor, tid_int)
+        timer.mark('phase1')
 
         if self.blobhelper is not None:
             self.blobhelper.vote(self._tid)
+            timer.mark('blobs')
 
         return serials
 
+    def _vote_with_procedure(self, resolved=None):
+        """Choose a tid and move the stored objects in a stored procedure.
+
+        Returns to Python only to resolve conflicts.  Returns a list
+        of (oid, tid) to be received by Connection._handle_serial().
+        resolved is the set of OIDs whose conflicts have already been
+        resolved, if any.
+        """
+        mover = self._adapter.mover
+        cursor = self._store_cursor
+        user, desc, ext = self._ude
+        if self.blobhelper is not None:
+            txn_has_blobs = self.blobhelper.txn_has_blobs
+        else:
+            txn_has_blobs = False
+
+        # The procedure chooses a tid greater than both this
+        # and any existing tid.
+        now = time.time()
+        stamp = TimeStamp(*(time.gmtime(now)[:5] + (now % 60,)))
+        tid_min = u64(repr(stamp))
+
+        # The procedure waits for the commit lock, so its time
+        # includes the wait.
+        timer = self._commit_timer
+        timer.mark('prepare')
+        timer.lock_acquired()
+        resolved = set(resolved or ())
+        while True:
+            tid_int, oid_ints, conflicts = mover.vote(
+                cursor, tid_min, user, desc, ext, txn_has_blobs)
+            timer.mark('procedure')
+            if not conflicts:
+                break
+            # The commit lock is held now, so no new conflicts
+            # can arise after these are resolved.
+            resolved.update(self._resolve_conflicts(conflicts))
+
+        self._tid = p64(tid_int)
+        return self._make_serials(oid_ints, resolved)
+
     def tpc_finish(self, transaction, f=None):
         self._lock_acquire()
         try:
@@ -907,17 +1357,24 @@ class RelStorage(
         # It is assumed that self._lock_acquire was called before this
         # method was called.
         assert self._tid is not None
+        timer = self._commit_timer
+        timer.mark('vote_to_finish')
         self._rollback_load_connection()
         txn = self._prepared_txn
         assert txn is not None
         self._adapter.txncontrol.commit_phase2(
             self._store_conn, self._store_cursor, txn)
+        timer.mark('phase2')
         self._adapter.locker.release_commit_lock(self._store_cursor)
+        timer.lock_released()
+        timer.mark('release')
         self._cache.after_tpc_finish(self._tid)
+        timer.mark('cache')
 
         # N.B. only set _ltid after the commit succeeds,
         # including cache updates.
         self._ltid = self._tid
+        timer.finish()
 
     def tpc_abort(self, transaction):
         self._lock_acquire()
@@ -951,6 +1408,16 @@ class RelStorage(
         finally:
             self._lock_release()
 
+    def get_commit_timing(self):
+        """Return histograms of the time spent in each phase of commit.
+
+        Returns {phase name: [(limit, count)]}, or None if the
+        commit-timing option is not enabled.
+        """
+        if self._commit_timing is None:
+            return None
+        return self._commit_timing.histograms()
+
     def new_oid(self):
         if self._stale_error is not None:
             raise self._stale_error
@@ -961,8 +1428,10 @@ class RelStorage(
             if self._preallocated_oids:
                 oid_int = self._preallocated_oids.pop()
             else:
+                blocks = self._next_oid_blocks()
                 def f(conn, cursor):
-                    return list(self._adapter.oidallocator.new_oids(cursor))
+                    return list(self._adapter.oidallocator.new_oids(
+                        cursor, blocks))
                 preallocated = self._with_store(f)
                 preallocated.sort(reverse=True)
                 oid_int = preallocated.pop()
@@ -972,6 +1441,24 @@ class RelStorage(
         finally:
             self._lock_release()
 
+    def _next_oid_blocks(self):
+        """Choose the number of OID blocks to allocate next.
+
+        Doubles the number when the previous allocation was used up
+        within a second, and halves it when more than ten seconds
+        have passed.
+        """
+        now = time.time()
+        elapsed = now - self._oid_blocks_time
+        blocks = self._oid_blocks
+        if elapsed < 1.0:
+            blocks = min(blocks * 2, self._max_oid_blocks)
+        elif elapsed > 10.0:
+            blocks = max(blocks // 2, 1)
+        self._oid_blocks = blocks
+        self._oid_blocks_time = now
+        return blocks
+
     def cleanup(self):
         pass
 
@@ -1123,7 +1610,7 @@ class RelStorage(
             """Return the set of OIDs the given state refers to."""
             refs = set()
             if state:
-                for oid in referencesf(str(state)):
+                for oid in referencesf(decode_state(str(state))):
                     refs.add(u64(oid))
             return refs
 
@@ -1234,6 +1721,34 @@ class RelStorage(
 
         return False
 
+    def _poll_with_thread(self, conn, cursor, prev_polled_tid, ignore_tid):
+        """Poll for invalidations using the changes found by _poll_thread.
+
+        The poll thread has already listed the changes up to the tid
+        it last saw, so only the changes committed since then need to
+        be listed here.  Falls back to a complete poll if the poll
+        thread can't help.
+        """
+        poller = self._adapter.poller
+        ready = self._poll_thread.get_changes(prev_polled_tid)
+        if ready is not None:
+            changes, ready_tid = ready
+            try:
+                more, new_polled_tid = poller.poll_invalidations(
+                    conn, cursor, ready_tid, ignore_tid)
+            except POSException.ReadConflictError:
+                # This connection can't see ready_tid yet.
+                more = None
+            if more is not None:
+                if ignore_tid is not None:
+                    changes = [(oid_int, tid_int)
+                        for (oid_int, tid_int) in changes
+                        if tid_int != ignore_tid]
+                changes.extend(more)
+                return changes, new_polled_tid
+        return poller.poll_invalidations(
+            conn, cursor, prev_polled_tid, ignore_tid)
+
     def _restart_load_and_poll(self):
         """Call _restart_load, poll for changes, and update self._cache.
         """
@@ -1245,10 +1760,17 @@ class RelStorage(
             ignore_tid = None
         prev = self._prev_polled_tid
 
+        if self._poll_thread is not None:
+            poll = self._poll_with_thread
+            prepared = self._poll_thread.get_prepared()
+        else:
+            poll = self._adapter.poller.poll_invalidations
+            prepared = None
+
         # get a list of changed OIDs and the most recent tid
         try:
             changes, new_polled_tid = self._restart_load_and_call(
-                self._adapter.poller.poll_invalidations, prev, ignore_tid)
+                poll, prev, ignore_tid)
         except POSException.ReadConflictError, e:
             # The database connection is stale, but postpone this
             # error until the application tries to read or write something.
@@ -1260,7 +1782,7 @@ class RelStorage(
 
         # Inform the cache of the changes.
         self._cache.after_poll(
-            self._load_cursor, prev, new_polled_tid, changes)
+            self._load_cursor, prev, new_polled_tid, changes, prepared)
 
         return changes, new_polled_tid
 
@@ -1577,6 +2099,6 @@ class Record(DataRecord):
         self.tid = tid
         self.oid = p64(oid_int)
         if data is not None:
-            self.data = str(data)
+            self.data = decode_state(str(data))
         else:
             self.data = None
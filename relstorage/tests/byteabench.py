@@ -0,0 +1,128 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Compare base64 and binary bytea transfer of object states in PostgreSQL.
+
+Usage: python byteabench.py [dsn [object_count [state_size]]]
+
+Stores object_count states of about state_size bytes in the temp_store
+table of a store connection, then loads them one at a time, first
+using the base64 encoding that RelStorage used to use, then using
+binary bytea parameters and results.  Nothing is committed.
+"""
+
+from base64 import decodestring
+from base64 import encodestring
+from relstorage.adapters.postgresql import PostgreSQLAdapter
+from relstorage.options import Options
+import cPickle
+import random
+import sys
+import time
+
+
+def make_state(size):
+    obj = {'title': 'x' * (size / 2), 'ints': []}
+    while len(cPickle.dumps(obj, 1)) < size:
+        obj['ints'].append(random.randint(0, 1 << 30))
+    return cPickle.dumps(obj, 1)
+
+
+def store_base64(cursor, batcher, oid, data):
+    batcher.insert_into(
+        "temp_store (zoid, prev_tid, md5, state)",
+        "%s, %s, %s, decode(%s, 'base64')",
+        (oid, 0, None, encodestring(data)),
+        rowkey=oid,
+        size=len(data),
+    )
+
+
+def store_binary(cursor, batcher, oid, data, Binary):
+    batcher.insert_into(
+        "temp_store (zoid, prev_tid, md5, state)",
+        "%s, %s, %s, %s",
+        (oid, 0, None, Binary(data)),
+        rowkey=oid,
+        size=len(data),
+    )
+
+
+def load_base64(cursor, oid):
+    cursor.execute(
+        "SELECT encode(state, 'base64') FROM temp_store WHERE zoid = %s",
+        (oid,))
+    (state64,) = cursor.fetchone()
+    return decodestring(state64)
+
+
+def load_binary(cursor, oid):
+    cursor.execute("SELECT state FROM temp_store WHERE zoid = %s", (oid,))
+    (state,) = cursor.fetchone()
+    return str(state)
+
+
+def run(adapter, count, size):
+    import psycopg2
+    states = [make_state(size) for i in range(100)]
+    total_bytes = sum(len(states[i % 100]) for i in range(count))
+    conn, cursor = adapter.connmanager.open_for_store()
+    try:
+        for name in ('base64', 'binary'):
+            cursor.execute("DELETE FROM temp_store")
+
+            start = time.time()
+            batcher = adapter.mover.make_batcher(cursor, 100)
+            for oid in xrange(1, count + 1):
+                data = states[oid % 100]
+                if name == 'base64':
+                    store_base64(cursor, batcher, oid, data)
+                else:
+                    store_binary(cursor, batcher, oid, data, psycopg2.Binary)
+            batcher.flush()
+            store_time = time.time() - start
+
+            start = time.time()
+            for oid in xrange(1, count + 1):
+                if name == 'base64':
+                    state = load_base64(cursor, oid)
+                else:
+                    state = load_binary(cursor, oid)
+                assert state == states[oid % 100]
+            load_time = time.time() - start
+
+            for label, elapsed in (('store', store_time), ('load', load_time)):
+                print '%-6s %-5s: %8.0f objects/s %8.2f MB/s' % (
+                    name, label, count / elapsed,
+                    total_bytes / elapsed / 1e6)
+    finally:
+        adapter.connmanager.close(conn, cursor)
+
+
+def main(argv=sys.argv):
+    dsn = "dbname='relstoragetest' user='relstoragetest' " \
+        "password='relstoragetest'"
+    count = 10000
+    size = 1000
+    if len(argv) > 1:
+        dsn = argv[1]
+    if len(argv) > 2:
+        count = int(argv[2])
+    if len(argv) > 3:
+        size = int(argv[3])
+    adapter = PostgreSQLAdapter(dsn=dsn, options=Options(keep_history=False))
+    run(adapter, count, size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Measure the commit rate of small transactions.
+
+Usage: python commitbench.py [database [txn_count [object_count]]]
+
+database is postgresql (the default), mysql, or oracle.
+
+Commits txn_count transactions that each change object_count objects,
+first through the temporary tables, then with the direct-write-limit
+option, and prints the commit rate of each mode.  The database is
+cleared first.  The connection parameters are the ones used by the
+RelStorage test suite.
+"""
+
+from persistent.mapping import PersistentMapping
+from relstorage.options import Options
+from relstorage.storage import RelStorage
+import ZODB
+import sys
+import time
+import transaction
+
+
+def make_adapter(database, options):
+    if database == 'mysql':
+        from relstorage.adapters.mysql import MySQLAdapter
+        return MySQLAdapter(options=options, db='relstoragetest',
+            user='relstoragetest', passwd='relstoragetest')
+    elif database == 'oracle':
+        from relstorage.adapters.oracle import OracleAdapter
+        return OracleAdapter(user='relstoragetest',
+            password='relstoragetest', dsn='XE', options=options)
+    else:
+        from relstorage.adapters.postgresql import PostgreSQLAdapter
+        dsn = "dbname='relstoragetest' user='relstoragetest' " \
+            "password='relstoragetest'"
+        return PostgreSQLAdapter(dsn=dsn, options=options)
+
+
+def run(database, direct_write_limit, txn_count, object_count):
+    options = Options(direct_write_limit=direct_write_limit)
+    adapter = make_adapter(database, options)
+    storage = RelStorage(adapter, options=options)
+    storage.zap_all()
+    db = ZODB.DB(storage)
+    try:
+        conn = db.open()
+        root = conn.root()
+        objects = [PersistentMapping() for i in range(object_count)]
+        root['objects'] = objects
+        transaction.commit()
+        start = time.time()
+        for i in xrange(txn_count):
+            for obj in objects:
+                obj['count'] = i
+            transaction.commit()
+        elapsed = time.time() - start
+        conn.close()
+        return txn_count / elapsed
+    finally:
+        db.close()
+
+
+def main(argv=sys.argv):
+    database = 'postgresql'
+    txn_count = 1000
+    object_count = 3
+    if len(argv) > 1:
+        database = argv[1]
+    if len(argv) > 2:
+        txn_count = int(argv[2])
+    if len(argv) > 3:
+        object_count = int(argv[3])
+    results = {}
+    for limit in (0, object_count):
+        results[limit] = run(database, limit, txn_count, object_count)
+        print '%-20s %8.1f commits/second' % (
+            limit and 'direct-write-limit' or 'temp tables',
+            results[limit])
+    print '%-20s %8.1f%%' % (
+        'improvement',
+        (results[object_count] / results[0] - 1.0) * 100)
+
+
+if __name__ == '__main__':
+    main()
@@ -26,6 +26,7 @@ from ZODB.tests import StorageTestBase
 from ZODB.tests import Synchronization
 from ZODB.tests.StorageTestBase import zodb_pickle
 from ZODB.tests.StorageTestBase import zodb_unpickle
+from ZODB.utils import z64
 from persistent import Persistent
 from persistent.mapping import PersistentMapping
 from relstorage.tests import fakecache
@@ -37,6 +38,7 @@ import transaction
 class RelStorageTestBase(StorageTestBase.StorageTestBase):
 
     keep_history = None  # Override
+    storage_options = {}  # Override to test with other option values
     _storage_created = None
 
     def setUp(self):
@@ -71,7 +73,9 @@ class RelStorageTestBase(StorageTestBase.StorageTestBase):
     def make_storage(self, zap=True, **kw):
         from relstorage.options import Options
         from relstorage.storage import RelStorage
-        options = Options(keep_history=self.keep_history, **kw)
+        params = dict(self.storage_options)
+        params.update(kw)
+        options = Options(keep_history=self.keep_history, **params)
         adapter = self.make_adapter(options)
         storage = RelStorage(adapter, options=options)
         storage._batcher_row_limit = 1
@@ -232,6 +236,80 @@ class GenericRelStorageTests(
         finally:
             self._storage = root_storage
 
+    def checkFineGrainedLockingWithBusyCommitLock(self):
+        # If the commit lock stays busy after a fine-grained commit has
+        # locked its rows, the commit releases the row locks, commits
+        # the usual way and resolves its conflicts again.
+        import threading
+        obj = ConflictResolution.PCounter()
+        obj.inc()
+        oid = self._storage.new_oid()
+        revid1 = self._dostoreNP(oid, data=zodb_pickle(obj))
+        obj.inc()
+        self._dostoreNP(oid, revid=revid1, data=zodb_pickle(obj))
+
+        fine = self.make_storage(zap=False, fine_grained_locking=True)
+        fine._row_lock_commit_wait = 0.1
+        locker = fine._adapter.locker
+        orig_hold = locker.hold_commit_lock_after_objects
+        attempts = []
+        fell_back = threading.Event()
+
+        def hold_commit_lock_after_objects(cursor, timeout):
+            locked = orig_hold(cursor, timeout)
+            attempts.append(locked)
+            if not locked:
+                fell_back.set()
+            return locked
+
+        locker.hold_commit_lock_after_objects = hold_commit_lock_after_objects
+
+        holder = self._storage.new_instance()
+        errors = []
+
+        def commit():
+            # Store a change based on revid1, which conflicts with the
+            # second revision.
+            try:
+                t = transaction.Transaction()
+                fine.tpc_begin(t)
+                fine.store(oid, revid1, zodb_pickle(obj), '', t)
+                fine.tpc_vote(t)
+                fine.tpc_finish(t)
+            except Exception, e:
+                errors.append(e)
+                fell_back.set()
+
+        try:
+            # Hold the commit lock with a transaction that changes
+            # another object.
+            t = transaction.Transaction()
+            holder.tpc_begin(t)
+            holder.store(holder.new_oid(), z64,
+                zodb_pickle(ConflictResolution.PCounter()), '', t)
+            holder.tpc_vote(t)
+
+            committer = threading.Thread(target=commit)
+            committer.start()
+            try:
+                fell_back.wait(30)
+            finally:
+                holder.tpc_finish(t)
+                committer.join(60)
+            self.assertFalse(committer.isAlive())
+            self.assertEqual(errors, [])
+            self.assertEqual(attempts, [False])
+        finally:
+            holder.close()
+            fine.close()
+
+        reader = self._storage.new_instance()
+        try:
+            data, serial = reader.load(oid, '')
+            self.assertEqual(zodb_unpickle(data)._value, 3)
+        finally:
+            reader.close()
+
     def check16KObject(self):
         # Store 16 * 1024 bytes in an object, then retrieve it
         data = 'a 16 byte string' * 1024
@@ -0,0 +1,84 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+"""Measure the per-commit cost of creating the temporary tables.
+
+Usage: python tempbench.py [postgresql|mysql [txn_count [object_count]]]
+
+Runs txn_count store transactions of object_count small objects in
+the temp_store table, first creating the temporary tables for every
+transaction, then reusing them (the reuse-temp-tables option), and
+prints the time per transaction for each mode.  The transactions are
+rolled back, so nothing is written to the database.  The connection
+parameters are the ones used by the RelStorage test suite.
+"""
+
+from relstorage.options import Options
+import sys
+import time
+
+
+def make_adapter(database, reuse):
+    options = Options(keep_history=False, reuse_temp_tables=reuse)
+    if database == 'mysql':
+        from relstorage.adapters.mysql import MySQLAdapter
+        return MySQLAdapter(options=options, db='relstoragetest_hf',
+            user='relstoragetest', passwd='relstoragetest')
+    else:
+        from relstorage.adapters.postgresql import PostgreSQLAdapter
+        dsn = "dbname='relstoragetest_hf' user='relstoragetest' " \
+            "password='relstoragetest'"
+        return PostgreSQLAdapter(dsn=dsn, options=options)
+
+
+def run(adapter, txn_count, object_count):
+    connmanager = adapter.connmanager
+    conn, cursor = connmanager.open_for_store()
+    try:
+        data = 'x' * 100
+        start = time.time()
+        for i in xrange(txn_count):
+            connmanager.restart_store(conn, cursor)
+            batcher = adapter.mover.make_batcher(cursor, 100)
+            for oid in xrange(1, object_count + 1):
+                adapter.mover.store_temp(cursor, batcher, oid, 0, data)
+            batcher.flush()
+        conn.rollback()
+        return (time.time() - start) / txn_count
+    finally:
+        connmanager.close(conn, cursor)
+
+
+def main(argv=sys.argv):
+    database = 'postgresql'
+    txn_count = 1000
+    object_count = 10
+    if len(argv) > 1:
+        database = argv[1]
+    if len(argv) > 2:
+        txn_count = int(argv[2])
+    if len(argv) > 3:
+        object_count = int(argv[3])
+    results = {}
+    for reuse in (False, True):
+        adapter = make_adapter(database, reuse)
+        results[reuse] = run(adapter, txn_count, object_count)
+        print '%-20s %8.3f ms/transaction' % (
+            reuse and 'reuse-temp-tables' or 'create per txn',
+            results[reuse] * 1000)
+    print '%-20s %8.3f ms/transaction' % (
+        'saving', (results[False] - results[True]) * 1000)
+
+
+if __name__ == '__main__':
+    main()
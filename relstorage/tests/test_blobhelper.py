@@ -52,7 +52,7 @@ class BlobHelperTest(unittest.TestCase):
         return self._class()(*args, **kw)
 
     def _make_default(self, shared=True, cache_size=None,
-            download_action='write', keep_history=True):
+            download_action='write', keep_history=True, read_only=False):
         test = self
 
         class DummyOptions:
@@ -77,7 +77,9 @@ class BlobHelperTest(unittest.TestCase):
             def __init__(self):
                 self.keep_history = keep_history
 
-        obj = self._make(DummyOptions(), DummyAdapter())
+        options = DummyOptions()
+        options.read_only = read_only
+        obj = self._make(options, DummyAdapter())
         return obj
 
     def test_ctor_with_shared_blob_dir(self):
@@ -87,6 +89,13 @@ class BlobHelperTest(unittest.TestCase):
         from ZODB.blob import LAYOUTS
         self.assertEqual(obj.fshelper.layout, LAYOUTS['bushy'])
 
+    def test_ctor_read_only_does_not_create_blob_dir(self):
+        os.rmdir(self.blob_dir)
+        obj = self._make_default(read_only=True)
+        self.assertTrue(obj.fshelper is not None)
+        self.assertFalse(os.path.exists(self.blob_dir))
+        os.mkdir(self.blob_dir)
+
     def test_ctor_with_private_blob_dir(self):
         if support_blob_cache:
             obj = self._make_default(shared=False)
@@ -185,6 +185,32 @@ class StorageCacheTests(unittest.TestCase):
         self.assertEqual(res, ('123', 35))
         self.assertEqual(data.get('myprefix:state:50:2'), p64(35) + '123')
 
+    def test_warm_without_checkpoints(self):
+        from relstorage.tests.fakecache import data
+        c = self._makeOne()
+        c.adapter.mover.data[2] = ('abc', 45)
+        self.assertEqual(c.warm(None, 10), 0)
+        self.assertEqual(data, {})
+
+    def test_warm(self):
+        from relstorage.tests.fakecache import data
+        from ZODB.utils import p64
+        adapter = MockAdapter()
+        c = self.getClass()(adapter, MockOptionsWithFakeCache(), 'myprefix')
+        c.current_tid = 60
+        c.checkpoints = (50, 40)
+        c.delta_after0[2] = 55
+        adapter.mover.data[2] = ('abc', 55)
+        adapter.mover.data[3] = ('def', 45)
+        adapter.mover.data[4] = ('ghi', 65)
+        self.assertEqual(c.warm(None, 10), 2)
+        self.assertEqual(data, {
+            'myprefix:state:55:2': p64(55) + 'abc',
+            'myprefix:state:50:3': p64(45) + 'def',
+            })
+        self.assertEqual(c.load(None, 2), ('abc', 55))
+        self.assertEqual(c.load(None, 3), ('def', 45))
+
     def test_store_temp(self):
         c = self._makeOne()
         c.tpc_begin()
@@ -224,6 +250,25 @@ class StorageCacheTests(unittest.TestCase):
             'myprefix:state:55:3': tid + ('def' * 100),
             })
 
+    def test_store_temp_large_transaction(self):
+        from relstorage.tests.fakecache import data
+        from ZODB.utils import p64
+        c = self._makeOne()
+        c.queue_limit = 5
+        c.tpc_begin()
+        c.store_temp(2, 'abc')
+        c.store_temp(3, 'def')
+        self.assertTrue(c.queue_full)
+        c.store_temp(4, 'ghi')
+        self.assertEqual(c.queue_contents, {2: None, 3: None, 4: None})
+        c.queue.seek(0)
+        self.assertEqual(c.queue.read(), '')
+        c.checkpoints = (50, 50)
+        c.after_tpc_finish(p64(55))
+        self.assertEqual(c.delta_after0, {2: 55, 3: 55, 4: 55})
+        self.assertFalse('myprefix:state:55:2' in data)
+        self.assertFalse(c.queue_full)
+
     def test_send_queue_none(self):
         from relstorage.tests.fakecache import data
         from ZODB.utils import p64
@@ -367,6 +412,27 @@ class StorageCacheTests(unittest.TestCase):
         self.assertEqual(c.delta_after0, {2: 45, 3: 42})
         self.assertEqual(c.delta_after1, {1: 35})
 
+    def test_after_poll_new_checkpoints_prepared(self):
+        from relstorage.tests.fakecache import data
+        data['myprefix:checkpoints'] = '60 50'
+        adapter = MockAdapter()
+        c = self.getClass()(adapter, MockOptionsWithFakeCache(), 'myprefix')
+        # The poll thread has listed the changes up to tid 52.
+        # Only the changes after that need to be listed.
+        adapter.poller.changes = [(1, 35), (2, 45), (5, 51), (3, 53),
+            (4, 55)]
+        prepared = ((50, 40), 52, {5: 51}, {2: 45})
+        c.checkpoints = (40, 30)
+        c.current_tid = 40
+        c.after_poll(None, 40, 55, [(2, 45), (5, 51), (3, 53)], prepared)
+        # The checkpoints come from the poll thread, not the cache.
+        self.assertEqual(c.checkpoints, (50, 40))
+        self.assertEqual(c.delta_after0, {3: 53, 4: 55, 5: 51})
+        self.assertEqual(c.delta_after1, {2: 45})
+        # The prepared deltas are not changed.
+        self.assertEqual(prepared[2], {5: 51})
+        self.assertEqual(prepared[3], {2: 45})
+
     def test_after_poll_shift_checkpoints(self):
         from relstorage.tests.fakecache import data
         data['myprefix:checkpoints'] = '40 30'
@@ -543,12 +609,14 @@ class MockOptions:
     cache_servers = ''
     cache_local_mb = 1
     cache_delta_size_limit = 10000
+    large_transaction_mb = 0
 
 class MockOptionsWithFakeCache:
     cache_module_name = 'relstorage.tests.fakecache'
     cache_servers = 'host:9999'
     cache_local_mb = 1
     cache_delta_size_limit = 10000
+    large_transaction_mb = 0
 
 class MockAdapter:
     def __init__(self):
@@ -560,6 +628,12 @@ class MockObjectMover:
         self.data = {}  # {oid_int: (state, tid_int)}
     def load_current(self, cursor, oid_int):
         return self.data.get(oid_int, (None, None))
+    def load_recent(self, cursor, limit):
+        items = [(tid_int, oid_int, state)
+            for (oid_int, (state, tid_int)) in self.data.items()]
+        items.sort(reverse=True)
+        return [(oid_int, state, tid_int)
+            for (tid_int, oid_int, state) in items[:limit]]
 
 class MockPoller:
     def __init__(self):
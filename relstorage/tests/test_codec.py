@@ -0,0 +1,58 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import cPickle
+import unittest
+
+class CodecTests(unittest.TestCase):
+
+    def test_encode_disabled(self):
+        from relstorage.codec import encode_state
+        data = 'x' * 1000
+        self.assertEqual(encode_state(data, 0), data)
+        self.assertEqual(encode_state(None, 100), None)
+
+    def test_encode_below_threshold(self):
+        from relstorage.codec import encode_state
+        data = 'x' * 99
+        self.assertEqual(encode_state(data, 100), data)
+
+    def test_encode_incompressible(self):
+        from relstorage.codec import encode_state
+        import os
+        data = os.urandom(200)
+        self.assertEqual(encode_state(data, 100), data)
+
+    def test_round_trip(self):
+        from relstorage.codec import decode_state
+        from relstorage.codec import encode_state
+        data = cPickle.dumps({'x': 'y' * 1000}, 1)
+        encoded = encode_state(data, 100)
+        self.assertTrue(encoded.startswith('.z'))
+        self.assertTrue(len(encoded) < len(data))
+        self.assertEqual(decode_state(encoded), data)
+
+    def test_decode_uncompressed(self):
+        from relstorage.codec import decode_state
+        for protocol in (0, 1, 2):
+            data = cPickle.dumps(('x', 1), protocol)
+            self.assertEqual(decode_state(data), data)
+        self.assertEqual(decode_state(''), '')
+        self.assertEqual(decode_state(None), None)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CodecTests))
+    return suite
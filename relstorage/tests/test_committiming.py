@@ -0,0 +1,90 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+class CommitTimerTests(unittest.TestCase):
+
+    def _makeOne(self, slow_threshold=1000.0):
+        from relstorage.committiming import CommitTimingStats
+        return CommitTimingStats(slow_threshold)
+
+    def test_marks_accumulate(self):
+        stats = self._makeOne()
+        timer = stats.new_timer()
+        timer.mark('flush')
+        timer.mark('resolve')
+        timer.mark('flush')
+        self.assertEqual(timer.phases, ['flush', 'resolve'])
+        self.assertEqual(sorted(timer.durations), ['flush', 'resolve'])
+
+    def test_finish_records_histograms(self):
+        stats = self._makeOne()
+        timer = stats.new_timer()
+        timer.start_vote()
+        timer.mark('flush')
+        timer.lock_acquired()
+        timer.mark('move')
+        timer.finish()
+        self.assertEqual(stats.commits, 1)
+        self.assertEqual(stats.slow_commits, 0)
+        histograms = stats.histograms()
+        self.assertEqual(sorted(histograms),
+            ['commit', 'flush', 'lock_held', 'move'])
+        for histogram in histograms.values():
+            self.assertEqual(sum(count for limit, count in histogram), 1)
+            # These phases take much less than a millisecond.
+            self.assertEqual(histogram[0], (0.001, 1))
+        self.assertEqual(histograms['commit'][-1][0], None)
+
+    def test_long_phase_goes_in_last_bucket(self):
+        stats = self._makeOne()
+        timer = stats.new_timer()
+        timer.durations['move'] = 3600.0
+        timer.phases.append('move')
+        timer.finish()
+        self.assertEqual(stats.histograms()['move'][-1], (None, 1))
+
+    def test_slow_commit_logged(self):
+        from relstorage import committiming
+        logged = []
+        class DummyLog:
+            def warning(self, msg, *args):
+                logged.append(msg % args)
+        stats = self._makeOne(slow_threshold=0.0)
+        timer = stats.new_timer()
+        timer.mark('flush')
+        orig_log = committiming.log
+        committiming.log = DummyLog()
+        try:
+            timer.finish()
+        finally:
+            committiming.log = orig_log
+        self.assertEqual(stats.slow_commits, 1)
+        self.assertEqual(len(logged), 1)
+        self.assertTrue('flush=' in logged[0])
+
+    def test_null_timer(self):
+        from relstorage.committiming import null_timer
+        null_timer.mark('flush')
+        null_timer.lock_acquired()
+        null_timer.lock_released()
+        null_timer.start_vote()
+        null_timer.finish()
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(CommitTimerTests))
+    return suite
@@ -0,0 +1,107 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+class LoadConnectionPoolTests(unittest.TestCase):
+
+    def getClass(self):
+        from relstorage.connpool import LoadConnectionPool
+        return LoadConnectionPool
+
+    def _makeOne(self):
+        return self.getClass()(MockConnectionManager())
+
+    def test_open_new(self):
+        pool = self._makeOne()
+        conn, cursor = pool.open()
+        self.assertEqual(pool.connmanager.opened, 1)
+        self.assertEqual(cursor, 'cursor')
+
+    def test_reuse_released(self):
+        pool = self._makeOne()
+        conn, cursor = pool.open()
+        pool.release(conn, cursor)
+        self.assertEqual(conn.rollbacks, 1)
+        conn2, cursor2 = pool.open()
+        self.assertTrue(conn2 is conn)
+        self.assertEqual(pool.connmanager.opened, 1)
+        self.assertEqual(pool.connmanager.restarted, 1)
+
+    def test_discard_disconnected(self):
+        pool = self._makeOne()
+        conn, cursor = pool.open()
+        pool.release(conn, cursor)
+        conn.broken = True
+        conn2, cursor2 = pool.open()
+        self.assertFalse(conn2 is conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.connmanager.opened, 2)
+
+    def test_max_idle(self):
+        pool = self._makeOne()
+        pool.max_idle = 1
+        conns = [pool.open() for i in range(2)]
+        for conn, cursor in conns:
+            pool.release(conn, cursor)
+        self.assertFalse(conns[0][0].closed)
+        self.assertTrue(conns[1][0].closed)
+
+    def test_close(self):
+        pool = self._makeOne()
+        conn, cursor = pool.open()
+        pool.release(conn, cursor)
+        pool.close()
+        self.assertTrue(conn.closed)
+        pool.open()
+        self.assertEqual(pool.connmanager.opened, 2)
+
+    def test_release_after_close(self):
+        pool = self._makeOne()
+        conn, cursor = pool.open()
+        pool.close()
+        pool.release(conn, cursor)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool._idle, [])
+
+
+class MockDisconnected(Exception):
+    pass
+
+class MockConnection:
+    rollbacks = 0
+    broken = False
+    closed = False
+    def rollback(self):
+        if self.broken:
+            raise MockDisconnected()
+        self.rollbacks += 1
+
+class MockConnectionManager:
+    disconnected_exceptions = (MockDisconnected,)
+    opened = 0
+    restarted = 0
+    def open_for_load(self):
+        self.opened += 1
+        return MockConnection(), 'cursor'
+    def restart_load(self, conn, cursor):
+        conn.rollback()
+        self.restarted += 1
+    def close(self, conn, cursor):
+        conn.closed = True
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(LoadConnectionPoolTests))
+    return suite
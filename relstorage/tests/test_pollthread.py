@@ -0,0 +1,174 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+import unittest
+
+class PollThreadTests(unittest.TestCase):
+
+    def getClass(self):
+        from relstorage.pollthread import PollThread
+        return PollThread
+
+    def _makeOne(self):
+        return self.getClass()(MockAdapter(), 1.0)
+
+    def test_get_changes_before_first_poll(self):
+        t = self._makeOne()
+        self.assertEqual(t.get_changes(None), None)
+        self.assertEqual(t.get_changes(40), None)
+
+    def test_first_poll(self):
+        t = self._makeOne()
+        t.adapter.poller.results.append((None, 50))
+        t.poll()
+        self.assertEqual(t.polled_tid, 50)
+        self.assertEqual(t.get_changes(50), ([], 50))
+        self.assertEqual(t.get_changes(40), None)
+        self.assertEqual(t.get_changes(None), None)
+        self.assertEqual(t.adapter.connmanager.rollbacks, 1)
+
+    def test_combine_segments(self):
+        t = self._makeOne()
+        t.adapter.poller.results.extend([
+            (None, 50),
+            ([(1, 55), (2, 52), (1, 53)], 55),
+            ((), 55),
+            ([(2, 58), (3, 57)], 60),
+            ])
+        for i in range(4):
+            t.poll()
+        changes, tid = t.get_changes(50)
+        changes.sort()
+        self.assertEqual(changes, [(1, 55), (2, 58), (3, 57)])
+        self.assertEqual(tid, 60)
+        changes, tid = t.get_changes(55)
+        changes.sort()
+        self.assertEqual(changes, [(2, 58), (3, 57)])
+        self.assertEqual(tid, 60)
+        self.assertEqual(t.get_changes(52), None)
+
+    def test_max_segments(self):
+        t = self._makeOne()
+        t.max_segments = 2
+        t.adapter.poller.results.extend([
+            (None, 50),
+            ([(1, 51)], 51),
+            ([(1, 52)], 52),
+            ([(1, 53)], 53),
+            ])
+        for i in range(4):
+            t.poll()
+        self.assertEqual(t.get_changes(50), None)
+        self.assertEqual(t.get_changes(51), ([(1, 53)], 53))
+
+    def test_reset_when_changes_unknown(self):
+        t = self._makeOne()
+        t.adapter.poller.results.extend([
+            (None, 50),
+            ([(1, 51)], 51),
+            (None, 60),
+            ])
+        for i in range(3):
+            t.poll()
+        self.assertEqual(t.get_changes(50), None)
+        self.assertEqual(t.get_changes(60), ([], 60))
+
+    def test_prepare_deltas(self):
+        cache = MockCache((50, 40))
+        t = self.getClass()(MockAdapter(), 1.0, cache)
+        poller = t.adapter.poller
+        poller.changes = [(1, 45), (2, 51), (2, 52), (3, 38)]
+        poller.results.extend([
+            (None, 52),
+            ([(4, 53), (2, 54)], 54),
+            ])
+        t.poll()
+        self.assertEqual(t.get_prepared(),
+            ((50, 40), 52, {2: 52}, {1: 45}))
+        first = t.get_prepared()
+        t.poll()
+        self.assertEqual(t.get_prepared(),
+            ((50, 40), 54, {2: 54, 4: 53}, {1: 45}))
+        # The published dicts are not changed in place.
+        self.assertEqual(first[2], {2: 52})
+        self.assertEqual(poller.list_changes_calls, 1)
+
+    def test_prepare_deltas_new_checkpoints(self):
+        cache = MockCache((50, 40))
+        t = self.getClass()(MockAdapter(), 1.0, cache)
+        poller = t.adapter.poller
+        poller.changes = [(1, 45), (2, 52), (3, 55)]
+        poller.results.extend([
+            (None, 52),
+            ([(3, 55)], 55),
+            ])
+        t.poll()
+        cache.checkpoints = (55, 50)
+        t.poll()
+        self.assertEqual(t.get_prepared(),
+            ((55, 50), 55, {}, {2: 52, 3: 55}))
+        self.assertEqual(poller.list_changes_calls, 2)
+
+    def test_no_prepared_deltas_without_checkpoints(self):
+        cache = MockCache(None)
+        t = self.getClass()(MockAdapter(), 1.0, cache)
+        t.adapter.poller.results.append((None, 50))
+        t.poll()
+        self.assertEqual(t.get_prepared(), None)
+
+
+class MockCache:
+    delta_size_limit = 100
+    def __init__(self, checkpoints):
+        self.checkpoints = checkpoints
+    def get_checkpoints(self):
+        return self.checkpoints
+
+class MockAdapter:
+    def __init__(self):
+        self.connmanager = MockConnectionManager()
+        self.poller = MockPoller()
+
+class MockConnection:
+    def __init__(self, connmanager):
+        self.connmanager = connmanager
+    def rollback(self):
+        self.connmanager.rollbacks += 1
+
+class MockConnectionManager:
+    disconnected_exceptions = ()
+    rollbacks = 0
+    def open_for_load(self):
+        return MockConnection(self), 'cursor'
+    def restart_load(self, conn, cursor):
+        pass
+    def close(self, conn, cursor):
+        pass
+
+class MockPoller:
+    list_changes_calls = 0
+    def __init__(self):
+        self.results = []  # [(changes, new_polled_tid)]
+        self.changes = []  # [(oid, tid)]
+    def poll_invalidations(self, conn, cursor, prev_polled_tid, ignore_tid):
+        return self.results.pop(0)
+    def list_changes(self, cursor, after_tid, last_tid):
+        self.list_changes_calls += 1
+        return ((oid, tid) for (oid, tid) in self.changes
+                if tid > after_tid and tid <= last_tid)
+
+def test_suite():
+    suite = unittest.TestSuite()
+    suite.addTest(unittest.makeSuite(PollThreadTests))
+    return suite
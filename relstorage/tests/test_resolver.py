@@ -0,0 +1,85 @@
+##############################################################################
+#
+# Copyright (c) 2009 Zope Foundation and Contributors.
+# All Rights Reserved.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+
+from persistent import Persistent
+from ZODB.utils import p64
+import cPickle
+import unittest
+
+class Counter(Persistent):
+    def _p_resolveConflict(self, old, committed, new):
+        return committed + new - old
+
+class Unresolvable(Persistent):
+    pass
+
+def make_record(klass, state):
+    from cStringIO import StringIO
+    f = StringIO()
+    pickler = cPickle.Pickler(f, 1)
+    pickler.dump((klass, None))
+    pickler.dump(state)
+    return f.getvalue()
+
+def read_state(data):
+    from cStringIO import StringIO
+    unpickler = cPickle.Unpickler(StringIO(data))
+    unpickler.load()
+    return unpickler.load()
+
+def counter_args(oid_int, old, committed, new):
+    return (p64(oid_int), p64(2), p64(1), make_record(Counter, new),
+        make_record(Counter, committed), make_record(Counter, old))
+
+
+class ResolveConflictTests(unittest.TestCase):
+
+    def test_resolved(self):
+        from relstorage.resolver import resolve_conflict
+        oid, rdata = resolve_conflict(counter_args(1, 10, 15, 12))
+        self.assertEqual(oid, p64(1))
+        self.assertEqual(read_state(rdata), 17)
+
+    def test_unresolvable(self):
+        from relstorage.resolver import resolve_conflict
+        args = (p64(1), p64(2), p64(1), make_record(Unresolvable, {'a': 1}),
+            make_record(Unresolvable, {'a': 2}),
+            make_record(Unresolvable, {}))
+        oid, rdata = resolve_conflict(args)
+        self.assertEqual(oid, p64(1))
+        self.assertEqual(rdata, None)
+
+
+class ConflictResolverPoolTests(unittest.TestCase):
+
+    def test_resolve(self):
+        from relstorage.resolver import ConflictResolverPool
+        pool = ConflictResolverPool(2)
+        try:
+            args = [counter_args(oid_int, 10, 10 + oid_int, 11)
+                for oid_int in range(1, 5)]
+            results = dict(pool.resolve(args))
+        finally:
+            pool.close()
+        self.assertEqual(sorted(results.keys()),
+            [p64(oid_int) for oid_int in range(1, 5)])
+        for oid_int in range(1, 5):
+            self.assertEqual(read_state(results[p64(oid_int)]), 11 + oid_int)
+
+
+def test_suite():
+    suite = unittest.TestSuite()
+    for klass in (ResolveConflictTests, ConflictResolverPoolTests):
+        suite.addTest(unittest.makeSuite(klass))
+    return suite
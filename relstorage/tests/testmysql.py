@@ -130,6 +130,27 @@ class HFMySQLToFile(UseMySQLAdapter, HistoryFreeToFileStorage):
 class HFMySQLFromFile(UseMySQLAdapter, HistoryFreeFromFileStorage):
     pass
 
+class HPMySQLProcedureTests(UseMySQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HFMySQLProcedureTests(UseMySQLAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HPMySQLFineGrainedTests(UseMySQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HFMySQLFineGrainedTests(UseMySQLAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HPMySQLPreLockCheckTests(UseMySQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
+class HFMySQLPreLockCheckTests(UseMySQLAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
 db_names = {
     'data': base_dbname,
     '1': base_dbname,
@@ -153,6 +174,12 @@ def test_suite():
             HFMySQLTests,
             HFMySQLToFile,
             HFMySQLFromFile,
+            HPMySQLProcedureTests,
+            HFMySQLProcedureTests,
+            HPMySQLFineGrainedTests,
+            HFMySQLFineGrainedTests,
+            HPMySQLPreLockCheckTests,
+            HFMySQLPreLockCheckTests,
             ]:
         suite.addTest(unittest.makeSuite(klass, "check"))
 
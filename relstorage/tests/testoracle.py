@@ -139,6 +139,27 @@ class HFOracleToFile(UseOracleAdapter, HistoryFreeToFileStorage):
 class HFOracleFromFile(UseOracleAdapter, HistoryFreeFromFileStorage):
     pass
 
+class HPOracleProcedureTests(UseOracleAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HFOracleProcedureTests(UseOracleAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HPOracleFineGrainedTests(UseOracleAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HFOracleFineGrainedTests(UseOracleAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HPOraclePreLockCheckTests(UseOracleAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
+class HFOraclePreLockCheckTests(UseOracleAdapter, HistoryFreeRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
 db_names = {
     'data': base_dbname,
     '1': base_dbname,
@@ -162,6 +183,12 @@ def test_suite():
             HFOracleTests,
             HFOracleToFile,
             HFOracleFromFile,
+            HPOracleProcedureTests,
+            HFOracleProcedureTests,
+            HPOracleFineGrainedTests,
+            HFOracleFineGrainedTests,
+            HPOraclePreLockCheckTests,
+            HFOraclePreLockCheckTests,
             ]:
         suite.addTest(unittest.makeSuite(klass, "check"))
 
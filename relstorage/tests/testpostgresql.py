@@ -126,6 +126,30 @@ class HFPostgreSQLToFile(UsePostgreSQLAdapter, HistoryFreeToFileStorage):
 class HFPostgreSQLFromFile(UsePostgreSQLAdapter, HistoryFreeFromFileStorage):
     pass
 
+class HPPostgreSQLProcedureTests(UsePostgreSQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HFPostgreSQLProcedureTests(UsePostgreSQLAdapter,
+        HistoryFreeRelStorageTests):
+    storage_options = {'commit_procedure': True}
+
+class HPPostgreSQLFineGrainedTests(UsePostgreSQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HFPostgreSQLFineGrainedTests(UsePostgreSQLAdapter,
+        HistoryFreeRelStorageTests):
+    storage_options = {'fine_grained_locking': True}
+
+class HPPostgreSQLPreLockCheckTests(UsePostgreSQLAdapter,
+        HistoryPreservingRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
+class HFPostgreSQLPreLockCheckTests(UsePostgreSQLAdapter,
+        HistoryFreeRelStorageTests):
+    storage_options = {'pre_lock_conflict_check': True}
+
 db_names = {
     'data': base_dbname,
     '1': base_dbname,
@@ -150,6 +174,12 @@ def test_suite():
             HFPostgreSQLTests,
             HFPostgreSQLToFile,
             HFPostgreSQLFromFile,
+            HPPostgreSQLProcedureTests,
+            HFPostgreSQLProcedureTests,
+            HPPostgreSQLFineGrainedTests,
+            HFPostgreSQLFineGrainedTests,
+            HPPostgreSQLPreLockCheckTests,
+            HFPostgreSQLPreLockCheckTests,
             ]:
         suite.addTest(unittest.makeSuite(klass, "check"))
 
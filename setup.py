@@ -74,7 +74,7 @@ setup(
     ],
     extras_require={
         'mysql':      ['MySQL-python>=1.2.2'],
-        'postgresql': ['psycopg2>=2.0'],
+        'postgresql': ['psycopg2>=2.4.1'],
         'oracle':     ['cx_Oracle>=4.3.1'],
     },
     entry_points = {'console_scripts': [